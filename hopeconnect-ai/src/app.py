@@ -2,6 +2,9 @@
 
 import sys
 import os
+import json
+import time
+import itertools
 import joblib # Ensure this is at the top with other standard imports
 
 # --- Start of Path Handling for app.py ---
@@ -11,24 +14,51 @@ if PROJECT_ROOT not in sys.path:
     sys.path.append(PROJECT_ROOT)
 # --- End of Path Handling for app.py ---
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS # Import CORS
 import pandas as pd
 import numpy as np
 
 # Corrected imports to be absolute from 'src'
-from src.matching_engine.weighted_scorer import calculate_match_score
-from src.matching_engine.risk_scorer import assess_donor_health_for_incentives
+from src.matching_engine.fused_scorer import (
+    FUSED_MATCH_SCORER, warm_up as warm_up_fused_scorer, active_backend as active_fused_backend
+)
+from src.matching_engine.risk_scorer import assess_donor_health_for_incentives, assess_donor_health_batch, parse_comorbidities_counts
+from src.matching_engine.donor_health_rules import get_donor_health_rules, donor_health_rules_status, DonorHealthRuleError
+from src.matching_engine.static_components import StaticComponentStore
+from src.matching_engine.center_distances import get_center_distance_table, center_distance_stats
+from src.matching_engine.shadow_scoring import create_shadow_scorer
+from src.matching_engine.offer_session import OfferSessionRegistry, OfferSessionError, DEFAULT_TOP_K
+from src.matching_engine.match_jobs import MatchJobManager, JobQueueFull, DEFAULT_RESULTS_PAGE_SIZE
+from src.matching_engine.scatter_gather import ScatterGatherCoordinator, DEFAULT_SCATTER_TOP_K
+from src.matching_engine.kidney_exchange import (
+    solve_exchange, missing_exchange_fields, KidneyExchangeError, REQUIRED_EXCHANGE_PAIR_FIELDS, REQUIRED_ALTRUIST_FIELDS
+)
+from src.matching_engine.weight_sweep import run_weight_sweep, normalize_sweep_options, WeightSweepError
+from src.matching_engine.match_pipeline import (
+    REQUIRED_ORGAN_FIELDS, REQUIRED_RECIPIENT_FIELDS, missing_recipient_fields, missing_fields_result,
+    parse_estimated_cit, predict_pairs_viability, build_match_result, score_recipient_columns,
+    recipient_columns_from_records, iter_ranked_match_results, explain_match_pairs, DEFAULT_EXPLAIN_TOP_K,
+    MAX_EXPLAIN_TOP_K
+)
 from src.prediction_models.viability_predictor import (
     predict_graft_survival,
+    predict_graft_survival_batch,
     predict_organ_cold_survival_duration,
-    GRAFT_VIABILITY_MODEL_PATH,
-    get_max_cold_ischemia_time
+    predict_organ_cold_survival_durations,
+    GRAFT_VIABILITY_MODEL_PATH
 )
 from src.prediction_models.feature_engineering import VIABILITY_PREPROCESSOR_PATH
-from src.matching_engine.distance_calculator import calculate_distance_km
-# Import calculate_hla_mismatch from preprocessor at the top level if it's a core part of matching logic
-from src.matching_engine.preprocessor import calculate_hla_mismatch as global_calculate_hla_mismatch
+from src.prediction_models.prediction_cache import ViabilityPredictionCache
+from src.prediction_models.cit_curves import ViabilityCurveCache
+from src.prediction_models.micro_batcher import ViabilityMicroBatcher, MicroBatchTimeout
+from src.prediction_models.viability_surrogate import SURROGATE_MODEL_PATH, QUALITY_TIERS, DEFAULT_QUALITY_TIER
+from src.utils.arrow_io import (
+    ArrowFormatError, ARROW_STREAM_MIMETYPE, arrow_available, is_arrow_request, wants_arrow_response,
+    read_arrow_table, table_metadata_json, table_to_columns, columns_to_arrow_bytes, records_to_arrow_bytes,
+    null_mask
+)
+from src.utils.memory_diagnostics import MemoryDiagnostics, MemoryDiagnosticsError, DEFAULT_TOP_SITES
 
 
 app = Flask(__name__)
@@ -36,6 +66,27 @@ CORS(app) # Enable CORS for all routes from all origins.
           # For production, restrict origins:
           # CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+NDJSON_CHUNK_ROWS = 500 # Result lines serialized per streamed chunk
+
+VIABILITY_REQUIRED_FEATURES = [
+    'donor_age', 'organ_type', 'donor_comorbidities', 'cold_ischemia_time_hours',
+    'distance_km', 'donor_blood_type', 'recipient_blood_type', 'hla_mismatches_count',
+    'recipient_age', 'recipient_comorbidities'
+]
+
+# Recipient-only and donor-only score terms, reused across offers until the waitlist changes
+static_component_store = StaticComponentStore()
+# Open organ offers kept up to date incrementally (see /api/offer_sessions)
+offer_sessions = OfferSessionRegistry()
+# Graft viability predictions for repeated feature rows, shared across requests
+viability_cache = ViabilityPredictionCache()
+# Per-pair viability-vs-CIT curves answering offer session CIT updates (OFFER_SESSION_CIT_CURVES)
+viability_curves = ViabilityCurveCache()
+# Coalesces concurrent single-record /api/predict_viability calls into one model batch
+# (VIABILITY_MICROBATCH_WINDOW_MS > 0 enables it; see /api/viability_microbatch/stats)
+viability_batcher = ViabilityMicroBatcher()
+
 # Initialize model variables
 graft_viability_model = None
 viability_preprocessor = None
@@ -65,36 +116,209 @@ except Exception as e:
     print("Ensure models are trained and paths are correctly defined in their respective modules.")
     print("AI service may not function correctly.")
 
+# Fused single-pass scoring kernel for the columnar match path (FUSED_MATCH_SCORER; off by default).
+# Compiling the Numba kernel takes a moment, so it happens here rather than on the first request.
+if FUSED_MATCH_SCORER != 'off':
+    try:
+        warm_up_fused_scorer()
+        print(f"Fused match scorer enabled ({active_fused_backend()} backend).")
+    except Exception as e:
+        print(f"Warning: fused match scorer warm-up failed: {e}")
+
+# Optional distilled model serving the "fast" quality tier (train_viability_model.py --distill)
+fast_viability_model = None
+if os.path.exists(SURROGATE_MODEL_PATH):
+    try:
+        fast_viability_model = joblib.load(SURROGATE_MODEL_PATH)
+        print(f"Fast tier viability model loaded from {SURROGATE_MODEL_PATH}.")
+    except Exception as e:
+        print(f"Warning: could not load fast tier viability model from {SURROGATE_MODEL_PATH}: {e}")
+
+
+def _viability_model_for(quality):
+    """Viability model for a request's quality tier; 'fast' falls back to the full model if none is trained."""
+    if quality == "fast":
+        if fast_viability_model is not None:
+            return fast_viability_model
+        app.logger.warning("'fast' quality tier requested but no distilled model is loaded. Using the full model.")
+    return graft_viability_model
+
+
+def _invalid_quality_response(quality):
+    if quality in QUALITY_TIERS:
+        return None
+    return jsonify({"error": f"Invalid quality '{quality}'. Expected one of: {', '.join(QUALITY_TIERS)}."}), 400
+
+
+VIABILITY_JOB_CHUNK_ROWS = 10000 # Rows predicted between cancellation checks in predict_viability jobs
+
+
+def _run_match_job(payload, running_job):
+    """
+    'match' job: the /api/match_organs body, or the same with an "organs" list to rank one waitlist
+    for several organs (entries then carry "organ_index"). Entries equal the synchronous ranking.
+    """
+    viability_model = _viability_model_for(payload.get("quality", DEFAULT_QUALITY_TIER))
+    recipients_list = payload["recipients"]
+    logistics_info = payload.get("logistics", {})
+    multi_organ = "organs" in payload
+    recipient_ids = [r.get("recipient_id", f"Recipient_{np.random.randint(1000, 9999)}") if isinstance(r, dict)
+                     else f"Recipient_{np.random.randint(1000, 9999)}" for r in recipients_list]
+    for organ_index, organ_info in enumerate(payload["organs"] if multi_organ else [payload["organ"]]):
+        running_job.checkpoint()
+        organ_info = dict(organ_info)
+        organ_info.setdefault('donor_comorbidities', 0)
+        recipients = recipient_columns_from_records(recipients_list, recipient_ids, logistics_info, app.logger)
+        scored = score_recipient_columns(organ_info, recipients, len(recipient_ids), viability_model,
+                                         viability_preprocessor, viability_cache, app.logger)
+        for entry in iter_ranked_match_results(recipient_ids, scored):
+            yield dict(entry, organ_index=organ_index) if multi_organ else entry
+
+
+def _run_predict_viability_job(payload, running_job):
+    """'predict_viability' job: {"rows": [feature dicts], "quality"}; one /api/predict_viability result per row."""
+    viability_model = _viability_model_for(payload.get("quality", DEFAULT_QUALITY_TIER))
+    rows = payload["rows"]
+    for start in range(0, len(rows), VIABILITY_JOB_CHUNK_ROWS):
+        running_job.checkpoint()
+        input_df = pd.DataFrame([{f: row[f] for f in VIABILITY_REQUIRED_FEATURES}
+                                 for row in rows[start:start + VIABILITY_JOB_CHUNK_ROWS]])
+        probs = predict_graft_survival_batch(input_df, model=viability_model, preprocessor=viability_preprocessor)
+        durations = predict_organ_cold_survival_durations(
+            input_df['organ_type'].to_numpy(), input_df['donor_age'].to_numpy(), input_df['donor_comorbidities'].to_numpy())
+        cit = input_df['cold_ischemia_time_hours'].to_numpy(dtype=np.float64)
+        for prob, duration, hours in zip(probs.tolist(), durations.tolist(), cit.tolist()):
+            yield {"graft_survival_probability": prob, "estimated_max_cold_survival_duration_hours": duration,
+                   "input_cold_ischemia_time_hours": hours}
+
+
+JOB_RUNNERS = {"match": _run_match_job, "predict_viability": _run_predict_viability_job}
+# Asynchronous match/prediction jobs persisted in SQLite (see /api/jobs). The worker pool starts on
+# first use, which also resumes jobs interrupted by a restart.
+match_jobs = MatchJobManager(JOB_RUNNERS, logger=app.logger)
+
+
+def _invalid_job_payload(kind, payload):
+    """Error message for a job payload that cannot run, or None."""
+    if not isinstance(payload, dict):
+        return "'payload' must be an object."
+    if payload.get("quality", DEFAULT_QUALITY_TIER) not in QUALITY_TIERS:
+        return f"Invalid quality '{payload.get('quality')}'. Expected one of: {', '.join(QUALITY_TIERS)}."
+    if kind == "match":
+        organs = payload.get("organs", [payload["organ"]] if "organ" in payload else None)
+        if not isinstance(organs, list) or not organs or not isinstance(payload.get("recipients"), list):
+            return "'organ' (or a non-empty 'organs' list) and a 'recipients' list are required."
+        for organ_index, organ_info in enumerate(organs):
+            missing = [f for f in REQUIRED_ORGAN_FIELDS if not isinstance(organ_info, dict) or f not in organ_info]
+            if missing:
+                return f"Missing field in organ data (organ {organ_index}): {', '.join(missing)}"
+    elif kind == "predict_viability":
+        if not isinstance(payload.get("rows"), list):
+            return "'rows' list is required."
+        for index, row in enumerate(payload["rows"]):
+            missing = [f for f in VIABILITY_REQUIRED_FEATURES if not isinstance(row, dict) or f not in row]
+            if missing:
+                return f"Missing feature in row {index}: {', '.join(missing)}"
+    return None
+
+
+def _explain_options(data):
+    """("explain", "explain_top_k") from a JSON body -> (explain, top_k, error_response)."""
+    explain = bool(data.get("explain", False))
+    top_k = data.get("explain_top_k", DEFAULT_EXPLAIN_TOP_K)
+    if explain and (not isinstance(top_k, int) or isinstance(top_k, bool) or not 1 <= top_k <= MAX_EXPLAIN_TOP_K):
+        return explain, top_k, (jsonify({"error": f"'explain_top_k' must be an integer between 1 and {MAX_EXPLAIN_TOP_K}."}), 400)
+    return explain, top_k, None
+
+
+# Coordinator mode: /api/coordinator/match_organs scatters a waitlist over the AI worker nodes in
+# AI_WORKER_NODES and merges their local top-K (disabled when no nodes are configured)
+coordinator = ScatterGatherCoordinator(logger=app.logger)
+
+
+# Optional A/B engine re-ranking a sample of /api/match_organs traffic in the background
+# (SHADOW_ENGINE, SHADOW_SAMPLE_RATE; off by default, see /api/shadow_scoring)
+shadow_scorer = create_shadow_scorer(graft_viability_model, viability_preprocessor, logger=app.logger)
+
+# Opt-in per-request memory accounting and allocation tracing (MEMORY_DIAGNOSTICS=rss|trace; see /api/memory/*)
+memory_diagnostics = MemoryDiagnostics()
+
+
+@app.before_request
+def _begin_memory_accounting():
+    if not request.path.startswith('/api/memory/'): # Snapshots would be billed to themselves
+        g.memory_token = memory_diagnostics.begin_request()
+
+
+@app.after_request
+def _end_memory_accounting(response):
+    # Runs once the view has built its response, so jsonify's buffer is part of the peak
+    # (streamed NDJSON bodies are generated later and are not)
+    token = g.pop('memory_token', None)
+    peak = memory_diagnostics.end_request(token, request.url_rule.rule if request.url_rule else request.path)
+    if peak is not None:
+        response.headers['X-Memory-Peak-Bytes'] = str(peak)
+    return response
+
+
+@app.teardown_request
+def _close_memory_accounting(error=None):
+    token = g.pop('memory_token', None) # Only left over when the view raised
+    if token is not None:
+        memory_diagnostics.end_request(token, request.url_rule.rule if request.url_rule else request.path)
+
+
+def _resident_objects():
+    """Models and long-lived caches whose resident size /api/memory/stats reports."""
+    return {
+        "graft_viability_model": graft_viability_model,
+        "viability_preprocessor": viability_preprocessor,
+        "fast_viability_model": fast_viability_model,
+        "static_component_store": static_component_store,
+        "viability_cache": viability_cache,
+        "viability_curves": viability_curves,
+        "offer_sessions": offer_sessions,
+    }
+
 
 @app.route('/api/health', methods=['GET']) # Standardized prefix
 def health_check():
     model_status = "loaded" if graft_viability_model and viability_preprocessor else "not loaded or error during load"
-    return jsonify({"status": "AI service is healthy", "model_status": model_status}), 200
+    fast_tier_status = "loaded" if fast_viability_model is not None else "not trained (falls back to full)"
+    return jsonify({"status": "AI service is healthy", "model_status": model_status,
+                    "fast_tier_status": fast_tier_status}), 200
 
 @app.route('/api/predict_viability', methods=['POST'])
 def handle_predict_viability():
     if not graft_viability_model or not viability_preprocessor:
         return jsonify({"error": "Viability model or preprocessor not loaded. Service may be impaired."}), 503
 
+    if is_arrow_request(request):
+        return _predict_viability_arrow()
+
     data = request.get_json()
     if not data:
         return jsonify({"error": "Invalid input: No JSON data provided."}), 400
+    quality = data.get("quality", DEFAULT_QUALITY_TIER) # "fast" uses the distilled model
+    invalid_quality = _invalid_quality_response(quality)
+    if invalid_quality:
+        return invalid_quality
+    explain = bool(data.get("explain", False)) # Adds per-feature contributions (log-odds) to the result
 
     try:
-        required_features = [
-            'donor_age', 'organ_type', 'donor_comorbidities', 'cold_ischemia_time_hours',
-            'distance_km', 'donor_blood_type', 'recipient_blood_type', 'hla_mismatches_count',
-            'recipient_age', 'recipient_comorbidities'
-        ]
-        for feature in required_features:
+        for feature in VIABILITY_REQUIRED_FEATURES:
             if feature not in data:
                 return jsonify({"error": f"Missing feature: {feature}"}), 400
             # Consider adding type checks for numeric fields here if they cause downstream issues
             # For example, ensuring 'donor_age' is a number before passing to the model.
 
-        # predict_graft_survival expects a DataFrame. Create it from the single data dict.
-        input_df = pd.DataFrame([data])
-        prob = predict_graft_survival(input_df, model=graft_viability_model, preprocessor=viability_preprocessor)
+        if viability_batcher.enabled:
+            row = {feature: data[feature] for feature in VIABILITY_REQUIRED_FEATURES}
+            prob = viability_batcher.predict(row, _viability_model_for(quality), viability_preprocessor)
+        else:
+            # predict_graft_survival expects a DataFrame. Create it from the single data dict.
+            input_df = pd.DataFrame([data])
+            prob = predict_graft_survival(input_df, model=_viability_model_for(quality), preprocessor=viability_preprocessor)
 
         organ_info_for_cold_survival = {
             'organ_type': data['organ_type'],
@@ -103,11 +327,21 @@ def handle_predict_viability():
         }
         max_survival_duration = predict_organ_cold_survival_duration(organ_info_for_cold_survival)
 
-        return jsonify({
+        result = {
             "graft_survival_probability": float(prob),
             "estimated_max_cold_survival_duration_hours": float(max_survival_duration),
             "input_cold_ischemia_time_hours": float(data.get('cold_ischemia_time_hours', 0)) # Use .get for safety
-        }), 200
+        }
+        if explain:
+            explanation_input = pd.DataFrame([{feature: data[feature] for feature in VIABILITY_REQUIRED_FEATURES}])
+            result["explanation"] = viability_cache.explain_frame(
+                explanation_input, _viability_model_for(quality), viability_preprocessor)[0]
+        if wants_arrow_response(request):
+            return _arrow_response(records_to_arrow_bytes([result]))
+        return jsonify(result), 200
+    except MicroBatchTimeout as e:
+        app.logger.warning(f"predict_viability timed out in the micro-batch queue: {e}")
+        return jsonify({"error": str(e)}), 503
     except ValueError as e: # Catches errors from pd.DataFrame or model prediction due to bad data
         app.logger.error(f"ValueError in predict_viability: {e}")
         return jsonify({"error": f"Invalid input data or model error: {str(e)}"}), 400
@@ -125,6 +359,10 @@ def handle_match_organs():
         # Allow to proceed but with default viability, or return 503 like above.
         # For now, proceeding with default.
 
+    if is_arrow_request(request):
+        return _match_organs_arrow()
+
+    started = time.perf_counter()
     data = request.get_json()
     if not data or "organ" not in data or "recipients" not in data:
         return jsonify({"error": "Invalid input: 'organ' and 'recipients' keys are required."}), 400
@@ -132,105 +370,650 @@ def handle_match_organs():
     organ_info = data["organ"]
     recipients_list = data["recipients"]
     logistics_info = data.get("logistics", {})
+    quality = data.get("quality", DEFAULT_QUALITY_TIER) # "fast" uses the distilled model for huge candidate lists
+    invalid_quality = _invalid_quality_response(quality)
+    if invalid_quality:
+        return invalid_quality
+    viability_model = _viability_model_for(quality)
+    # "explain": true adds score components and viability feature contributions to the top entries
+    explain, explain_top_k, invalid_explain = _explain_options(data)
+    if invalid_explain:
+        return invalid_explain
+    top_k = data.get("top_k") # Optional: only the best top_k entries are returned (coordinator shards use it)
+    if top_k is not None and not _is_positive_int(top_k):
+        return jsonify({"error": "'top_k' must be a positive integer."}), 400
 
-    required_organ_fields = ['organ_type', 'donor_age', 'donor_blood_type',
-                             'donor_hla_a1', 'donor_hla_a2', 'donor_hla_b1', 'donor_hla_b2',
-                             'donor_location_lat', 'donor_location_lon']
-    for field in required_organ_fields:
+    for field in REQUIRED_ORGAN_FIELDS:
         if field not in organ_info:
             return jsonify({"error": f"Missing field in organ data: {field}"}), 400
     organ_info.setdefault('donor_comorbidities', 0)
+    if _wants_ndjson():
+        recipient_ids = [r.get("recipient_id", f"Recipient_{np.random.randint(1000, 9999)}") if isinstance(r, dict)
+                         else f"Recipient_{np.random.randint(1000, 9999)}" for r in recipients_list]
+        recipients = recipient_columns_from_records(recipients_list, recipient_ids, logistics_info, app.logger)
+        scored = score_recipient_columns(organ_info, recipients, len(recipient_ids), viability_model,
+                                         viability_preprocessor, viability_cache, app.logger)
+        results = iter_ranked_match_results(recipient_ids, scored)
+        if explain:
+            results = _explained_stream(organ_info, recipients_list, scored, results, viability_model, explain_top_k)
+        return _ndjson_response(results if top_k is None else itertools.islice(results, top_k))
+    waitlist_version = data.get("waitlist_version") # Optional: a new version drops the cached recipient terms
+    donor_components = static_component_store.get_donor_components(organ_info, offer_id=data.get("offer_id"))
 
     match_results = []
+    scorable = [] # (recipient_id, recipient_info, estimated_cit), in request order
+    recipient_ids = []
+    explainable = {} # id(result entry) -> (recipient_info, estimated_cit, graft survival probability)
 
     for recipient_info in recipients_list:
         recipient_id = recipient_info.get("recipient_id", f"Recipient_{np.random.randint(1000, 9999)}")
+        recipient_ids.append(recipient_id)
 
-        required_recipient_fields = ['recipient_age', 'recipient_blood_type',
-                                     'recipient_hla_a1', 'recipient_hla_a2', 'recipient_hla_b1', 'recipient_hla_b2',
-                                     'recipient_location_lat', 'recipient_location_lon', 'urgency_score']
-        missing_fields = [field for field in required_recipient_fields if field not in recipient_info]
+        missing_fields = missing_recipient_fields(recipient_info)
         if missing_fields:
-            match_results.append({
-                "recipient_id": recipient_id, "score": 0.0,
-                "error": f"Missing fields for recipient: {', '.join(missing_fields)}"
-            })
+            match_results.append(missing_fields_result(recipient_id, missing_fields))
             continue
         recipient_info.setdefault('recipient_comorbidities', 0)
 
-        estimated_cit_str = logistics_info.get(recipient_id, {}).get("estimated_cold_ischemia_hours")
-        estimated_cit = None
-        if estimated_cit_str is not None:
-            try:
-                estimated_cit = float(estimated_cit_str)
-            except ValueError:
-                app.logger.warning(f"Invalid CIT format '{estimated_cit_str}' for recipient {recipient_id}. Treating as unknown.")
-
-
-        graft_survival_prob = 0.5 # Default viability if not calculated
-
-        # Attempt to calculate viability only if models are loaded and CIT is known
-        can_predict_viability = graft_viability_model and viability_preprocessor and estimated_cit is not None
-
-        if can_predict_viability:
-            donor_hlas_list = [organ_info.get(f'donor_hla_{la}{n}', '') for la in ['a','b'] for n in ['1','2']]
-            rec_hlas_list = [recipient_info.get(f'recipient_hla_{la}{n}', '') for la in ['a','b'] for n in ['1','2']]
-            hla_mismatches_count = global_calculate_hla_mismatch(donor_hlas_list, rec_hlas_list)
-
-            try: # Wrap float conversions in try-except
-                dist_km = calculate_distance_km(
-                    float(organ_info['donor_location_lat']), float(organ_info['donor_location_lon']),
-                    float(recipient_info['recipient_location_lat']), float(recipient_info['recipient_location_lon'])
-                )
-                dist_km = 9999.0 if dist_km == np.inf else float(dist_km)
-
-                viability_input_data = {
-                    'donor_age': float(organ_info['donor_age']), 'organ_type': organ_info['organ_type'],
-                    'donor_comorbidities': int(organ_info['donor_comorbidities']),
-                    'cold_ischemia_time_hours': float(estimated_cit), 'distance_km': dist_km,
-                    'donor_blood_type': organ_info['donor_blood_type'],
-                    'recipient_blood_type': recipient_info['recipient_blood_type'],
-                    'hla_mismatches_count': int(hla_mismatches_count),
-                    'recipient_age': float(recipient_info['recipient_age']),
-                    'recipient_comorbidities': int(recipient_info['recipient_comorbidities'])
-                }
-                viability_input_df = pd.DataFrame([viability_input_data])
-                graft_survival_prob = predict_graft_survival(viability_input_df, graft_viability_model, viability_preprocessor)
-            except ValueError as ve:
-                app.logger.error(f"ValueError preparing data or predicting viability for {recipient_id}: {ve}")
-                graft_survival_prob = 0.0 # Penalize if data is bad for prediction
-            except Exception as e:
-                app.logger.error(f"Error predicting viability for recipient {recipient_id}: {e}")
-                graft_survival_prob = 0.0 # Penalize on generic error
-        elif estimated_cit is None:
-             app.logger.warning(f"Estimated CIT not available for recipient {recipient_id}. Using default viability (0.5).")
-        else: # Models not loaded
-            app.logger.warning(f"Viability model/preprocessor not available. Using default viability (0.5) for {recipient_id}.")
-
-
-        max_cit = get_max_cold_ischemia_time(organ_info['organ_type'])
-        effective_cit_for_score = (max_cit + 1.0) if estimated_cit is None else float(estimated_cit)
-
-        score = calculate_match_score(
-            organ_data=organ_info, recipient_data=recipient_info,
-            graft_survival_prob=float(graft_survival_prob),
-            estimated_cold_ischemia_hours=effective_cit_for_score,
-            max_allowable_cold_ischemia=float(max_cit)
-        )
+        estimated_cit = parse_estimated_cit(
+            logistics_info.get(recipient_id, {}).get("estimated_cold_ischemia_hours"), recipient_id, app.logger)
+        scorable.append((recipient_id, recipient_info, estimated_cit))
+        match_results.append(None) # Filled in once viability is predicted for the whole batch
 
-        match_results.append({
-            "recipient_id": recipient_id, "score": float(score),
-            "details": {
-                "predicted_graft_survival_prob": float(graft_survival_prob),
-                "estimated_cold_ischemia_hours": float(estimated_cit) if estimated_cit is not None else "N/A",
-                "max_allowable_cold_ischemia_hours": float(max_cit)
-            }
-        })
+    # Viability is only predicted when models are loaded and CIT is known (default 0.5 otherwise).
+    # Identical feature rows are evaluated once and reused across requests.
+    graft_survival_probs = iter(predict_pairs_viability(
+        organ_info, scorable, viability_model, viability_preprocessor, viability_cache, app.logger))
+    pending = iter(scorable)
+    for index, result in enumerate(match_results):
+        if result is not None:
+            continue
+        recipient_id, recipient_info, estimated_cit = next(pending)
+        graft_survival_prob = next(graft_survival_probs)
+        match_results[index] = build_match_result(
+            organ_info, recipient_info, recipient_id, graft_survival_prob, estimated_cit,
+            recipient_components=static_component_store.get_recipient_components(recipient_id, recipient_info, waitlist_version),
+            donor_components=donor_components
+        )
+        if explain:
+            explainable[id(match_results[index])] = (recipient_info, estimated_cit, graft_survival_prob)
 
     sorted_matches = sorted(match_results, key=lambda x: x.get("score", 0.0), reverse=True)
+    if viability_model is graft_viability_model: # Shadow comparisons are against the full model only
+        shadow_scorer.maybe_submit(organ_info, recipients_list, logistics_info, recipient_ids, sorted_matches,
+                                   time.perf_counter() - started)
+    if top_k is not None:
+        sorted_matches = sorted_matches[:top_k]
+    if explain:
+        top = [m for m in sorted_matches[:explain_top_k] if id(m) in explainable]
+        explanations = explain_match_pairs(organ_info, [explainable[id(m)] for m in top], viability_model,
+                                           viability_preprocessor, viability_cache, app.logger)
+        for match, explanation in zip(top, explanations):
+            match["explanation"] = explanation
+    if wants_arrow_response(request):
+        return _arrow_response(records_to_arrow_bytes([_flatten_match_result(m) for m in sorted_matches]))
     return jsonify(sorted_matches), 200
 
 
+def _arrow_response(body):
+    return app.response_class(body, status=200, mimetype=ARROW_STREAM_MIMETYPE)
+
+
+def _wants_ndjson():
+    """Streamed ranking requested with ?stream=ndjson or 'Accept: application/x-ndjson'."""
+    return request.args.get('stream') == 'ndjson' or NDJSON_MIMETYPE in request.headers.get('Accept', '')
+
+
+def _ndjson_response(results):
+    """
+    Streams result entries as newline-delimited JSON in chunks of NDJSON_CHUNK_ROWS lines, so the
+    client gets the best matches first and the serialized body is never held in memory as a whole.
+    """
+    def generate():
+        lines = []
+        for result in results:
+            lines.append(json.dumps(result))
+            if len(lines) >= NDJSON_CHUNK_ROWS:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+    return app.response_class(generate(), status=200, mimetype=NDJSON_MIMETYPE)
+
+
+def _with_default_comorbidities(recipient_info):
+    comorbidities = recipient_info.get('recipient_comorbidities')
+    return dict(recipient_info, recipient_comorbidities=0 if comorbidities is None else comorbidities)
+
+
+def _explained_stream(organ_info, recipients_list, scored, results, viability_model, top_k):
+    """Adds explanations to the first top_k scorable entries of a ranked result stream (score_recipient_columns output)."""
+    order = np.argsort(-scored["scores"], kind='stable')[:top_k].tolist() # Same order as iter_ranked_match_results
+    explained = [i for i in order if scored["valid"][i]]
+    cit = scored["cit"]
+    explanations = dict(zip(explained, explain_match_pairs(
+        organ_info,
+        [(_with_default_comorbidities(recipients_list[i]), None if np.isnan(cit[i]) else float(cit[i]),
+          scored["graft_survival_probs"][i]) for i in explained],
+        viability_model, viability_preprocessor, viability_cache, app.logger)))
+    for index, result in zip(order, results):
+        if index in explanations:
+            result["explanation"] = explanations[index]
+        yield result
+    yield from results
+
+
+def _flatten_match_result(match):
+    """Flat, Arrow-friendly row for one match result ("N/A" CIT becomes null)."""
+    details = match.get("details", {})
+    cit = details.get("estimated_cold_ischemia_hours")
+    return {
+        "recipient_id": str(match["recipient_id"]),
+        "score": float(match["score"]),
+        "predicted_graft_survival_prob": details.get("predicted_graft_survival_prob"),
+        "estimated_cold_ischemia_hours": cit if isinstance(cit, float) else None,
+        "max_allowable_cold_ischemia_hours": details.get("max_allowable_cold_ischemia_hours"),
+        "error": match.get("error")
+    }
+
+
+def _read_arrow_body():
+    """Returns (table, error_response)."""
+    if not arrow_available():
+        return None, (jsonify({"error": "Arrow payloads are not supported: pyarrow is not installed."}), 415)
+    try:
+        return read_arrow_table(request.get_data()), None
+    except ArrowFormatError as e:
+        return None, (jsonify({"error": f"Invalid input: {e}"}), 400)
+
+
+def _predict_viability_arrow():
+    """
+    Batch form of /api/predict_viability. The body is an Arrow IPC stream with one row per
+    prediction and one column per feature in VIABILITY_REQUIRED_FEATURES. ?quality=fast selects the
+    distilled model.
+    """
+    quality = request.args.get("quality", DEFAULT_QUALITY_TIER)
+    invalid_quality = _invalid_quality_response(quality)
+    if invalid_quality:
+        return invalid_quality
+    table, error_response = _read_arrow_body()
+    if error_response:
+        return error_response
+
+    columns = table_to_columns(table)
+    missing = [f for f in VIABILITY_REQUIRED_FEATURES if f not in columns]
+    if missing:
+        return jsonify({"error": f"Missing feature columns: {', '.join(missing)}"}), 400
+
+    try:
+        input_df = pd.DataFrame({f: columns[f] for f in VIABILITY_REQUIRED_FEATURES})
+        probs = predict_graft_survival_batch(input_df, model=_viability_model_for(quality), preprocessor=viability_preprocessor)
+        durations = predict_organ_cold_survival_durations(
+            columns['organ_type'], columns['donor_age'], columns['donor_comorbidities'])
+    except ValueError as e:
+        app.logger.error(f"ValueError in predict_viability (arrow): {e}")
+        return jsonify({"error": f"Invalid input data or model error: {str(e)}"}), 400
+
+    result_columns = {
+        "graft_survival_probability": probs,
+        "estimated_max_cold_survival_duration_hours": durations,
+        "input_cold_ischemia_time_hours": np.asarray(columns['cold_ischemia_time_hours'], dtype=np.float64)
+    }
+    if wants_arrow_response(request):
+        return _arrow_response(columns_to_arrow_bytes(result_columns))
+    return jsonify([
+        dict(zip(result_columns, values)) for values in zip(*(c.tolist() for c in result_columns.values()))
+    ]), 200
+
+
+def _match_organs_arrow():
+    """
+    Columnar form of /api/match_organs. The body is an Arrow IPC stream with one row per recipient
+    (the JSON recipient fields as columns, plus an optional 'estimated_cold_ischemia_hours' column
+    replacing the logistics map). The organ is a JSON object in the schema metadata under 'organ'.
+    Scoring reads the column buffers directly; no per-recipient dicts are built.
+    ?quality=fast selects the distilled viability model; ?stream=ndjson streams the ranking.
+    """
+    quality = request.args.get("quality", DEFAULT_QUALITY_TIER)
+    invalid_quality = _invalid_quality_response(quality)
+    if invalid_quality:
+        return invalid_quality
+    table, error_response = _read_arrow_body()
+    if error_response:
+        return error_response
+
+    try:
+        organ_info = table_metadata_json(table, 'organ')
+    except ArrowFormatError as e:
+        return jsonify({"error": f"Invalid input: {e}"}), 400
+    if not organ_info:
+        return jsonify({"error": "Invalid input: 'organ' schema metadata is required."}), 400
+    for field in REQUIRED_ORGAN_FIELDS:
+        if field not in organ_info:
+            return jsonify({"error": f"Missing field in organ data: {field}"}), 400
+    organ_info.setdefault('donor_comorbidities', 0)
+
+    recipients = table_to_columns(table)
+    missing_columns = [f for f in REQUIRED_RECIPIENT_FIELDS if f not in recipients]
+    if missing_columns:
+        return jsonify({"error": f"Missing recipient columns: {', '.join(missing_columns)}"}), 400
+
+    n = table.num_rows
+    recipient_ids = recipients.get('recipient_id', np.full(n, None, dtype=object)).astype(object)
+    unnamed = null_mask(recipient_ids)
+    recipient_ids[unnamed] = [f"Recipient_{np.random.randint(1000, 9999)}" for _ in range(int(unnamed.sum()))]
+
+    scored = score_recipient_columns(organ_info, recipients, n, _viability_model_for(quality), viability_preprocessor,
+                                     viability_cache, app.logger)
+    if _wants_ndjson():
+        return _ndjson_response(iter_ranked_match_results(recipient_ids.astype(str).tolist(), scored))
+
+    if wants_arrow_response(request):
+        scores, graft_survival_probs, cit = scored["scores"], scored["graft_survival_probs"], scored["cit"]
+        valid, missing_matrix, max_cit = scored["valid"], scored["missing_matrix"], scored["max_cit"]
+        order = np.argsort(-scores, kind='stable') # Same tie order as sorted(..., reverse=True)
+
+        errors = np.full(n, None, dtype=object)
+        for i in np.flatnonzero(~valid):
+            missing_fields = [f for f, is_missing in zip(REQUIRED_RECIPIENT_FIELDS, missing_matrix[i]) if is_missing]
+            errors[i] = f"Missing fields for recipient: {', '.join(missing_fields)}"
+
+        result_columns = {
+            "recipient_id": recipient_ids[order].astype(str),
+            "score": scores[order],
+            "predicted_graft_survival_prob": np.where(valid, graft_survival_probs, np.nan)[order],
+            "estimated_cold_ischemia_hours": cit[order],
+            "max_allowable_cold_ischemia_hours": np.full(n, max_cit),
+            "error": errors[order]
+        }
+        return _arrow_response(columns_to_arrow_bytes(result_columns))
+    return jsonify(list(iter_ranked_match_results(recipient_ids.astype(str).tolist(), scored))), 200
+
+
+def _is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+
+def _top_k_arg(default=DEFAULT_TOP_K):
+    try:
+        return max(0, int(request.args.get('k', default)))
+    except ValueError:
+        return default
+
+
+@app.route('/api/offer_sessions', methods=['POST'])
+def handle_create_offer_session():
+    """Opens a stateful offer. Same body as /api/match_organs, plus optional 'top_k'."""
+    data = request.get_json()
+    if not data or "organ" not in data or "recipients" not in data:
+        return jsonify({"error": "Invalid input: 'organ' and 'recipients' keys are required."}), 400
+
+    organ_info = data["organ"]
+    for field in REQUIRED_ORGAN_FIELDS:
+        if field not in organ_info:
+            return jsonify({"error": f"Missing field in organ data: {field}"}), 400
+    organ_info.setdefault('donor_comorbidities', 0)
+    top_k = data.get("top_k", DEFAULT_TOP_K)
+    if not _is_positive_int(top_k):
+        return jsonify({"error": "'top_k' must be a positive integer."}), 400
+
+    try:
+        session = offer_sessions.create(
+            organ_info=organ_info, recipients_list=data["recipients"], logistics_info=data.get("logistics", {}),
+            model=graft_viability_model, preprocessor=viability_preprocessor,
+            component_store=static_component_store, logger=app.logger, prediction_cache=viability_cache,
+            curve_cache=viability_curves)
+    except OfferSessionError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(session.summary(top_k)), 201
+
+
+@app.route('/api/offer_sessions/<session_id>', methods=['GET'])
+def handle_get_offer_session(session_id):
+    session = offer_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": f"Offer session {session_id} not found or expired."}), 404
+    return jsonify(session.summary(_top_k_arg())), 200
+
+
+@app.route('/api/offer_sessions/<session_id>/deltas', methods=['POST'])
+def handle_offer_session_deltas(session_id):
+    """
+    Applies deltas to an open offer. Body: {"deltas": [...], "top_k": 10}, each delta one of
+    {"op": "update_cit", "recipient_id", "estimated_cold_ischemia_hours"},
+    {"op": "update_urgency", "recipient_id", "urgency_score"},
+    {"op": "withdraw_recipient", "recipient_id"},
+    {"op": "add_recipient", "recipient": {...}, "estimated_cold_ischemia_hours"}.
+    """
+    session = offer_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": f"Offer session {session_id} not found or expired."}), 404
+    data = request.get_json()
+    if not data or not isinstance(data.get("deltas"), list):
+        return jsonify({"error": "Invalid input: 'deltas' list is required."}), 400
+    top_k = data.get("top_k", DEFAULT_TOP_K)
+    if not _is_positive_int(top_k):
+        return jsonify({"error": "'top_k' must be a positive integer."}), 400
+
+    applied, errors = session.apply_deltas(data["deltas"])
+    response = session.summary(top_k)
+    response.update({"applied": applied, "errors": errors})
+    return jsonify(response), 200
+
+
+@app.route('/api/offer_sessions/<session_id>', methods=['DELETE'])
+def handle_close_offer_session(session_id):
+    if not offer_sessions.close(session_id):
+        return jsonify({"error": f"Offer session {session_id} not found or expired."}), 404
+    return jsonify({"session_id": session_id, "status": "closed"}), 200
+
+
+@app.route('/api/coordinator/match_organs', methods=['POST'])
+def handle_coordinator_match_organs():
+    """
+    /api/match_organs over a waitlist sharded across the worker nodes. Body: the match_organs body plus
+    "top_k" (default 10) and an optional "deadline_ms". Returns the merged top_k with a per-shard report;
+    "partial" is true when some shards failed or missed the deadline.
+    """
+    if not coordinator.enabled:
+        return jsonify({"error": "Coordinator mode is not configured (set AI_WORKER_NODES)."}), 503
+    data = request.get_json()
+    if not data or "organ" not in data or not isinstance(data.get("recipients"), list):
+        return jsonify({"error": "Invalid input: 'organ' and 'recipients' keys are required."}), 400
+    organ_info = data["organ"]
+    for field in REQUIRED_ORGAN_FIELDS:
+        if field not in organ_info:
+            return jsonify({"error": f"Missing field in organ data: {field}"}), 400
+    quality = data.get("quality", DEFAULT_QUALITY_TIER)
+    invalid_quality = _invalid_quality_response(quality)
+    if invalid_quality:
+        return invalid_quality
+    top_k = data.get("top_k", DEFAULT_SCATTER_TOP_K)
+    deadline_ms = data.get("deadline_ms")
+    if not _is_positive_int(top_k):
+        return jsonify({"error": "'top_k' must be a positive integer."}), 400
+    if deadline_ms is not None and (not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0):
+        return jsonify({"error": "'deadline_ms' must be a positive number."}), 400
+
+    recipients_list = []
+    for recipient_info in data["recipients"]:
+        recipient_info = dict(recipient_info) if isinstance(recipient_info, dict) else {}
+        recipient_info.setdefault("recipient_id", f"Recipient_{np.random.randint(1000, 9999)}") # Ids must survive the round trip
+        recipients_list.append(recipient_info)
+    response = coordinator.match(organ_info, recipients_list, data.get("logistics", {}), quality=quality,
+                                 top_k=top_k, deadline_ms=deadline_ms)
+    if response["recipients_ranked"] == 0 and recipients_list:
+        response["error"] = "No worker node returned a ranking before the deadline."
+        return jsonify(response), 503
+    return jsonify(response), 200
+
+
+@app.route('/api/coordinator/nodes', methods=['GET'])
+def handle_coordinator_nodes():
+    """Worker node health; ?probe=1 checks every node's /api/health first."""
+    if request.args.get("probe") in ("1", "true"):
+        coordinator.probe()
+    return jsonify(coordinator.stats()), 200
+
+
+@app.route('/api/weight_sweep', methods=['POST'])
+def handle_weight_sweep():
+    """
+    Ranks one organ's candidates under many score weight vectors at once. Body: the /api/match_organs
+    fields ("organ", "recipients", "logistics", "quality") plus "weight_vectors" (lists in SCORE_COMPONENTS
+    order or {"name", "weights"} overrides), "perturb" {"count", "scale", "seed"} and "top_k".
+    Returns each vector's top-K and its rank stability against the current WEIGHTS.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("organ"), dict) or not isinstance(data.get("recipients"), list):
+        return jsonify({"error": "Invalid input: 'organ' and 'recipients' keys are required."}), 400
+    organ_info, recipients_list = data["organ"], data["recipients"]
+    logistics_info = data.get("logistics") or {}
+    quality = data.get("quality", DEFAULT_QUALITY_TIER)
+    invalid_quality = _invalid_quality_response(quality)
+    if invalid_quality:
+        return invalid_quality
+    for field in REQUIRED_ORGAN_FIELDS:
+        if field not in organ_info:
+            return jsonify({"error": f"Missing field in organ data: {field}"}), 400
+    organ_info.setdefault('donor_comorbidities', 0)
+    try:
+        vectors, top_k = normalize_sweep_options(data)
+    except WeightSweepError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = run_weight_sweep(organ_info, recipients_list, logistics_info, _viability_model_for(quality),
+                                  viability_preprocessor, viability_cache, vectors, top_k, app.logger)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid organ or recipient data: {e}"}), 400
+    return jsonify(result), 200
+
+
+@app.route('/api/kidney_exchange', methods=['POST'])
+def handle_kidney_exchange():
+    """
+    Paired kidney exchange over a pool. Body: {"pairs": [donor + recipient fields with a "pair_id"],
+    "altruistic_donors": [donor fields with a "donor_id"], "options": {max_cycle_length, max_chain_length,
+    max_edges_per_vertex, max_hla_mismatches, min_edge_score, objective, time_limit_s}}. ?quality=fast selects
+    the distilled viability model for the edge scores.
+    """
+    quality = request.args.get("quality", DEFAULT_QUALITY_TIER)
+    invalid_quality = _invalid_quality_response(quality)
+    if invalid_quality:
+        return invalid_quality
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("pairs"), list):
+        return jsonify({"error": "A 'pairs' list is required."}), 400
+    pairs, altruists = data["pairs"], data.get("altruistic_donors", [])
+    if not isinstance(altruists, list) or not all(isinstance(r, dict) for r in pairs + altruists):
+        return jsonify({"error": "'pairs' and 'altruistic_donors' must be lists of objects."}), 400
+    for records, required, id_field in ((pairs, REQUIRED_EXCHANGE_PAIR_FIELDS, "pair_id"),
+                                        (altruists, REQUIRED_ALTRUIST_FIELDS, "donor_id")):
+        problems = missing_exchange_fields(records, required, id_field)
+        if problems:
+            record_id, missing = problems[0]
+            return jsonify({"error": f"Missing fields for {record_id}: {', '.join(missing)}",
+                            "records_with_missing_fields": len(problems)}), 400
+    ids = [r["pair_id"] for r in pairs] + [r["donor_id"] for r in altruists]
+    if len(set(map(str, ids))) != len(ids):
+        return jsonify({"error": "'pair_id' and 'donor_id' values must be unique."}), 400
+
+    try:
+        result = solve_exchange(pairs, altruists, _viability_model_for(quality), viability_preprocessor,
+                                data.get("options"), app.logger)
+    except (KidneyExchangeError, ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid exchange pool or options: {e}"}), 400
+    return jsonify(result), 200
+
+
+@app.route('/api/jobs', methods=['POST'])
+def handle_submit_job():
+    """
+    Submits an asynchronous job. Body: {"kind": "match" | "predict_viability", "payload": {...}}.
+    An identical job that is still queued or running is returned instead of a new one.
+    """
+    data = request.get_json()
+    if not data or data.get("kind") not in JOB_RUNNERS:
+        return jsonify({"error": f"Invalid input: 'kind' must be one of: {', '.join(JOB_RUNNERS)}."}), 400
+    invalid_payload = _invalid_job_payload(data["kind"], data.get("payload"))
+    if invalid_payload:
+        return jsonify({"error": f"Invalid input: {invalid_payload}"}), 400
+    if data["kind"] == "predict_viability" and (not graft_viability_model or not viability_preprocessor):
+        return jsonify({"error": "Viability model or preprocessor not loaded. Service may be impaired."}), 503
+
+    try:
+        job, deduplicated = match_jobs.submit(data["kind"], data["payload"])
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    job["deduplicated"] = deduplicated
+    return jsonify(job), 200 if deduplicated else 202
+
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def handle_job_stats():
+    return jsonify(match_jobs.stats()), 200
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def handle_get_job(job_id):
+    """Job status. ?wait=<seconds> long-polls until the job has finished (at most 30 s)."""
+    try:
+        wait_seconds = float(request.args.get("wait", 0))
+    except ValueError:
+        return jsonify({"error": "'wait' must be a number of seconds."}), 400
+    job = match_jobs.get(job_id, wait_seconds)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found."}), 404
+    return jsonify(job), 200
+
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def handle_get_job_results(job_id):
+    """A page of a finished job's result entries: ?offset=0&limit=100 (at most 1000)."""
+    job = match_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found."}), 404
+    if job["status"] != "succeeded":
+        return jsonify({"error": f"Job {job_id} has no results (status: {job['status']}).", "status": job["status"]}), 409
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", DEFAULT_RESULTS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "'offset' and 'limit' must be integers."}), 400
+
+    results = match_jobs.results(job_id, offset, limit)
+    next_offset = max(offset, 0) + len(results)
+    return jsonify({"job_id": job_id, "total": job["result_count"], "offset": max(offset, 0), "results": results,
+                    "next_offset": next_offset if next_offset < job["result_count"] else None}), 200
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def handle_cancel_job(job_id):
+    """Cancels a job: queued jobs at once, running jobs at their next checkpoint."""
+    job = match_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found."}), 404
+    return jsonify(job), 200
+
+
+@app.route('/api/static_components/stats', methods=['GET'])
+def handle_static_component_stats():
+    return jsonify(static_component_store.stats()), 200
+
+
+@app.route('/api/viability_cache/stats', methods=['GET'])
+def handle_viability_cache_stats():
+    return jsonify(viability_cache.stats()), 200
+
+
+@app.route('/api/viability_curves/stats', methods=['GET'])
+def handle_viability_curve_stats():
+    return jsonify(viability_curves.stats()), 200
+
+
+@app.route('/api/viability_microbatch/stats', methods=['GET'])
+def handle_viability_microbatch_stats():
+    """Batch size histogram, queue-to-result latency and timeouts of the predict_viability micro-batcher."""
+    return jsonify(viability_batcher.stats()), 200
+
+
+@app.route('/api/viability_fast_tier', methods=['GET'])
+def handle_viability_fast_tier():
+    """Whether the distilled "fast" tier is available, and its agreement with the full model at training time."""
+    if fast_viability_model is None:
+        return jsonify({"loaded": False, "model_path": SURROGATE_MODEL_PATH}), 200
+    return jsonify({"loaded": True, "model_path": SURROGATE_MODEL_PATH,
+                    "agreement": fast_viability_model.agreement}), 200
+
+
+@app.route('/api/shadow_scoring', methods=['GET'])
+def handle_shadow_scoring_stats():
+    """Rank agreement (Spearman, top-k overlap) and latency of the shadow engine versus the live ranking."""
+    return jsonify(shadow_scorer.stats()), 200
+
+
+@app.route('/api/shadow_scoring', methods=['POST'])
+def handle_shadow_scoring_config():
+    """Body: {"sample_rate": 0..1, "reset": bool}. Adjusts sampling without a restart."""
+    data = request.get_json() or {}
+    if "sample_rate" in data:
+        try:
+            sample_rate = float(data["sample_rate"])
+        except (TypeError, ValueError):
+            sample_rate = -1.0
+        if not 0.0 <= sample_rate <= 1.0:
+            return jsonify({"error": "'sample_rate' must be a number between 0 and 1."}), 400
+        shadow_scorer.sample_rate = sample_rate
+    if data.get("reset"):
+        shadow_scorer.reset()
+    return jsonify(shadow_scorer.stats()), 200
+
+
+@app.route('/api/center_distances/stats', methods=['GET'])
+def handle_center_distance_stats():
+    return jsonify(center_distance_stats()), 200
+
+
+@app.route('/api/center_distances/reload', methods=['POST'])
+def handle_center_distance_reload():
+    """Re-maps the table after scripts/build_center_distance_table.py has written a new version."""
+    get_center_distance_table(force_reload=True)
+    return jsonify(center_distance_stats()), 200
+
+
+@app.route('/api/memory/stats', methods=['GET'])
+def handle_memory_stats():
+    """
+    RSS, traced allocation, per-endpoint request peaks and resident size of the models and caches.
+    ?collect=1 runs a full garbage collection first; ?resident=0 skips the (slower) resident size walk.
+    """
+    resident = request.args.get('resident', '1') != '0'
+    return jsonify(memory_diagnostics.stats(_resident_objects() if resident else None,
+                                            collect=request.args.get('collect') == '1')), 200
+
+
+@app.route('/api/memory/top_allocations', methods=['GET'])
+def handle_memory_top_allocations():
+    """?limit=20&group_by=lineno|filename|traceback&compare=1 (growth since the baseline snapshot)."""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_TOP_SITES))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer."}), 400
+    try:
+        return jsonify(memory_diagnostics.top_allocations(max(limit, 1), request.args.get('group_by', 'lineno'),
+                                                          compare=request.args.get('compare') == '1')), 200
+    except MemoryDiagnosticsError as e:
+        return jsonify({"error": str(e)}), 409
+
+
+@app.route('/api/memory/tracing', methods=['POST'])
+def handle_memory_tracing():
+    """
+    Body: {"enabled": bool, "baseline": bool, "reset": bool}. Starts/stops tracemalloc without a restart.
+    Refused (403) unless the service was started with MEMORY_DIAGNOSTICS=rss or trace.
+    """
+    if not memory_diagnostics.enabled:
+        return jsonify({"error": "Memory diagnostics are disabled (start the service with MEMORY_DIAGNOSTICS=rss or trace)."}), 403
+    data = request.get_json(silent=True) or {}
+    if "enabled" in data:
+        if not isinstance(data["enabled"], bool):
+            return jsonify({"error": "'enabled' must be a boolean."}), 400
+        if data["enabled"]:
+            memory_diagnostics.start_tracing()
+        elif memory_diagnostics.tracing:
+            memory_diagnostics.stop_tracing()
+    if data.get("reset"):
+        memory_diagnostics.reset()
+    if data.get("baseline"):
+        try:
+            memory_diagnostics.take_baseline()
+        except MemoryDiagnosticsError as e:
+            return jsonify({"error": str(e)}), 409
+    return jsonify(memory_diagnostics.stats()), 200
+
+
 @app.route('/api/assess_donor_health', methods=['POST'])
 def handle_assess_donor_health():
     data = request.get_json()
@@ -264,6 +1047,94 @@ def handle_assess_donor_health():
         traceback.print_exc()
         return jsonify({"error": "An unexpected error occurred during donor health assessment."}), 500
 
+DONOR_HEALTH_LIFESTYLE_FIELDS = ['smoker', 'alcohol_consumption', 'bmi']
+DONOR_HEALTH_LAB_FIELDS = ['creatinine', 'gfr']
+
+
+@app.route('/api/assess_donor_health_batch', methods=['POST'])
+def handle_assess_donor_health_batch():
+    """
+    Scores many donors in one call with the vectorized rules.
+    JSON body: {"donors": [{"donor_id", "donor_age", "organ_type", "comorbidities_count",
+    "lifestyle_factors": {...}, "lab_results": {...}}, ...]}.
+    Arrow body: one row per donor with flat columns donor_id, donor_age, organ_type, comorbidities_count,
+    smoker, alcohol_consumption, bmi, creatinine, gfr.
+    """
+    if is_arrow_request(request):
+        table, error_response = _read_arrow_body()
+        if error_response:
+            return error_response
+        columns = table_to_columns(table)
+        n = table.num_rows
+        donor_ids = columns.get('donor_id', np.arange(n)).astype(object)
+    else:
+        data = request.get_json()
+        if not data or not isinstance(data.get("donors"), list):
+            return jsonify({"error": "Invalid input: 'donors' list is required."}), 400
+        donors = data["donors"]
+        n = len(donors)
+        donor_ids = np.array([d.get('donor_id', i) if isinstance(d, dict) else i for i, d in enumerate(donors)], dtype=object)
+        donors = [d if isinstance(d, dict) else {} for d in donors]
+        columns = {
+            'donor_age': [d.get('donor_age') for d in donors],
+            'organ_type': [d.get('organ_type') for d in donors],
+            'comorbidities_count': [d.get('comorbidities_count') for d in donors],
+        }
+        for field in DONOR_HEALTH_LIFESTYLE_FIELDS:
+            columns[field] = [(d.get('lifestyle_factors') or {}).get(field) for d in donors]
+        for field in DONOR_HEALTH_LAB_FIELDS:
+            columns[field] = [(d.get('lab_results') or {}).get(field) for d in donors]
+
+    if 'donor_age' not in columns or 'organ_type' not in columns:
+        return jsonify({"error": "Missing required columns: 'donor_age' and 'organ_type'."}), 400
+
+    donor_ages = pd.to_numeric(pd.Series(columns['donor_age'], dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+    comorbidities = parse_comorbidities_counts(np.asarray(columns.get('comorbidities_count', np.zeros(n)), dtype=object))
+    organ_types = np.asarray(columns['organ_type'], dtype=object)
+    # Per-donor errors are the single-donor endpoint's messages
+    missing = null_mask(np.asarray(columns['donor_age'], dtype=object)) | null_mask(organ_types)
+    valid = ~missing & ~np.isnan(donor_ages) & ~np.isnan(comorbidities)
+
+    scores = np.full(n, np.nan)
+    if valid.any():
+        optional = {f: np.asarray(columns[f], dtype=object)[valid] if f in columns else None
+                    for f in DONOR_HEALTH_LIFESTYLE_FIELDS + DONOR_HEALTH_LAB_FIELDS}
+        scores[valid] = assess_donor_health_batch(donor_ages[valid], organ_types[valid], comorbidities[valid], **optional)
+
+    if wants_arrow_response(request):
+        return _arrow_response(columns_to_arrow_bytes({"donor_id": donor_ids.astype(str), "donor_health_score": scores}))
+
+    results = []
+    for donor_id, score, is_valid, is_missing in zip(donor_ids.tolist(), scores.tolist(), valid.tolist(), missing.tolist()):
+        if is_valid:
+            results.append({"donor_id": donor_id, "donor_health_score": score})
+        elif is_missing:
+            results.append({"donor_id": donor_id, "error": "Missing required fields: 'donor_age' and 'organ_type'."})
+        else:
+            results.append({"donor_id": donor_id,
+                            "error": "'donor_age' must be a number and 'comorbidities_count' must be an integer."})
+    return jsonify({"results": results, "scored": int(valid.sum()), "failed": int(n - valid.sum())}), 200
+
+
+@app.route('/api/donor_health_rules', methods=['GET'])
+def handle_donor_health_rules_status():
+    """Active donor-health rule table version, source and last load error (if a bad edit was rejected)."""
+    try:
+        get_donor_health_rules() # Picks up a changed file before reporting
+    except DonorHealthRuleError:
+        pass # Reported through last_error
+    return jsonify(donor_health_rules_status()), 200
+
+
+@app.route('/api/donor_health_rules/reload', methods=['POST'])
+def handle_donor_health_rules_reload():
+    try:
+        get_donor_health_rules(force_reload=True)
+    except (DonorHealthRuleError, FileNotFoundError) as e:
+        return jsonify({"error": f"Rule table rejected, previous version kept: {e}", **donor_health_rules_status()}), 400
+    return jsonify(donor_health_rules_status()), 200
+
+
 if __name__ == '__main__':
     print("Starting Flask AI service...")
 
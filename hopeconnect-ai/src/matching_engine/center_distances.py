@@ -0,0 +1,145 @@
+# hopeconnect-ai/src/matching_engine/center_distances.py
+
+import json
+import threading
+import numpy as np
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.distance_calculator import calculate_distance_km
+
+# Optional precomputed center-to-center distance table. Offers between transplant centers we serve
+# (organ 'donor_center_id', recipient 'recipient_center_id') read the geodesic distance from a
+# memory-mapped matrix built by scripts/build_center_distance_table.py; anything else (unknown center,
+# ad-hoc coordinates, coordinates that differ from the center's registered location) is computed live.
+
+CENTER_DISTANCE_TABLE_DIR = os.environ.get(
+    'CENTER_DISTANCE_TABLE_DIR', os.path.join(PROJECT_ROOT, 'models', 'center_distances'))
+CENTERS_FILENAME = 'centers.json'
+DISTANCES_FILENAME = 'distances_km.npy'
+
+
+class CenterDistanceTable:
+    """
+    Row = donor center, column = recipient center, values exactly as calculate_distance_km returns them.
+    The matrix is memory-mapped, so worker processes share the pages and startup does not read it.
+    """
+
+    def __init__(self, table_dir=CENTER_DISTANCE_TABLE_DIR):
+        with open(os.path.join(table_dir, CENTERS_FILENAME)) as f:
+            meta = json.load(f)
+        self.table_dir = table_dir
+        self.version = meta.get('version')
+        self.center_ids = [str(c['center_id']) for c in meta['centers']]
+        self.index = {center_id: i for i, center_id in enumerate(self.center_ids)}
+        self.lats = np.array([c['lat'] for c in meta['centers']], dtype=np.float64)
+        self.lons = np.array([c['lon'] for c in meta['centers']], dtype=np.float64)
+        self.distances = np.load(os.path.join(table_dir, DISTANCES_FILENAME), mmap_mode='r')
+        if self.distances.shape != (len(self.center_ids), len(self.center_ids)):
+            raise ValueError(f"Distance matrix shape {self.distances.shape} does not match {len(self.center_ids)} centers.")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+
+    def _center_row(self, center_id, lat, lon):
+        """Table index of a center, or None if unknown or the given coordinates are not the center's."""
+        if center_id is None:
+            return None
+        i = self.index.get(str(center_id))
+        if i is None:
+            return None
+        try:
+            if float(lat) != self.lats[i] or float(lon) != self.lons[i]:
+                return None
+        except (TypeError, ValueError):
+            return None
+        return i
+
+    def lookup(self, donor_center_id, donor_lat, donor_lon, recipient_center_id, recipient_lat, recipient_lon):
+        """Tabulated distance (km) for a center pair, or None when it has to be computed live."""
+        i = self._center_row(donor_center_id, donor_lat, donor_lon)
+        j = self._center_row(recipient_center_id, recipient_lat, recipient_lon) if i is not None else None
+        with self._lock:
+            if j is None:
+                self.fallbacks += 1
+                return None
+            self.hits += 1
+        return float(self.distances[i, j])
+
+    def lookup_many(self, donor_center_id, donor_lat, donor_lon, recipient_center_ids, recipient_lats, recipient_lons):
+        """Vectorized lookup for one donor; NaN where the pair has to be computed live."""
+        n = len(recipient_center_ids)
+        out = np.full(n, np.nan)
+        i = self._center_row(donor_center_id, donor_lat, donor_lon)
+        if i is not None:
+            cols = np.array([self.index.get(str(c), -1) if c is not None else -1 for c in recipient_center_ids], dtype=np.int64)
+            known = cols >= 0
+            lats = np.asarray(recipient_lats, dtype=np.float64)
+            lons = np.asarray(recipient_lons, dtype=np.float64)
+            known[known] &= (lats[known] == self.lats[cols[known]]) & (lons[known] == self.lons[cols[known]])
+            out[known] = self.distances[i, cols[known]]
+        hits = int((~np.isnan(out)).sum())
+        with self._lock:
+            self.hits += hits
+            self.fallbacks += n - hits
+        return out
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.fallbacks
+            return {"loaded": True, "version": self.version, "table_dir": self.table_dir, "centers": len(self.center_ids),
+                    "hits": self.hits, "fallbacks": self.fallbacks,
+                    "hit_rate": (self.hits / lookups) if lookups else 0.0}
+
+
+_table_state = {"table": None, "loaded": False}
+_table_lock = threading.Lock()
+
+
+def get_center_distance_table(table_dir=CENTER_DISTANCE_TABLE_DIR, force_reload=False):
+    """The loaded table, or None when no table has been built (everything is then computed live)."""
+    if _table_state["loaded"] and not force_reload:
+        return _table_state["table"]
+    with _table_lock:
+        if not _table_state["loaded"] or force_reload:
+            table = None
+            if os.path.exists(os.path.join(table_dir, DISTANCES_FILENAME)):
+                try:
+                    table = CenterDistanceTable(table_dir)
+                    print(f"Center distance table loaded from {table_dir} ({len(table.center_ids)} centers).")
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Warning: could not load center distance table from {table_dir}: {e}. Using live distances.")
+            _table_state.update(table=table, loaded=True)
+        return _table_state["table"]
+
+
+def center_distance_km(donor_center_id, donor_lat, donor_lon, recipient_center_id, recipient_lat, recipient_lon):
+    """
+    calculate_distance_km, served from the center table when both sides are known centers at their
+    registered coordinates.
+    """
+    table = get_center_distance_table()
+    if table is not None:
+        dist_km = table.lookup(donor_center_id, donor_lat, donor_lon, recipient_center_id, recipient_lat, recipient_lon)
+        if dist_km is not None:
+            return dist_km
+    return calculate_distance_km(donor_lat, donor_lon, recipient_lat, recipient_lon)
+
+
+def pair_distance_km(organ_data, recipient_data):
+    """Donor->recipient distance (km) for an organ/recipient record pair, see center_distance_km."""
+    return center_distance_km(
+        organ_data.get('donor_center_id'), organ_data.get('donor_location_lat'), organ_data.get('donor_location_lon'),
+        recipient_data.get('recipient_center_id'), recipient_data.get('recipient_location_lat'),
+        recipient_data.get('recipient_location_lon'))
+
+
+def center_distance_stats():
+    table = get_center_distance_table()
+    return table.stats() if table is not None else {"loaded": False, "table_dir": CENTER_DISTANCE_TABLE_DIR}
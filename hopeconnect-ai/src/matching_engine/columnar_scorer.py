@@ -0,0 +1,240 @@
+# hopeconnect-ai/src/matching_engine/columnar_scorer.py
+
+import numpy as np
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.preprocessor import get_blood_type_compatibility, calculate_hla_mismatch, HLA_FEATURES_RECIPIENT
+from src.matching_engine.risk_scorer import get_donor_risk_profile, calculate_basic_risk_scores
+from src.matching_engine.distance_calculator import calculate_distance_km
+from src.matching_engine.center_distances import get_center_distance_table
+from src.matching_engine.weighted_scorer import WEIGHTS, SCORE_COMPONENTS, normalize_risk_score
+
+# Columnar (one array per field) counterpart of weighted_scorer.calculate_match_score.
+# Scores a whole recipient list against one organ without building a dict per recipient.
+# Every term is computed with the same float operations, in the same order, as the
+# scalar scorer so that both paths produce identical scores.
+
+DONOR_HLA_KEYS = ['donor_hla_a1', 'donor_hla_a2', 'donor_hla_b1', 'donor_hla_b2']
+RECIPIENT_HLA_KEYS = HLA_FEATURES_RECIPIENT
+
+
+def _column(recipients, name, default=None):
+    """Returns a column of `recipients` (DataFrame or dict of arrays) as a numpy array."""
+    if name in recipients:
+        return np.asarray(recipients[name])
+    n = len(next(iter(recipients.values()))) if isinstance(recipients, dict) else len(recipients)
+    return np.full(n, default, dtype=object)
+
+
+def compute_pair_distances_km(organ_info, recipients):
+    """
+    Geodesic donor->recipient distances (km), np.inf where coordinates are missing or invalid.
+    Geodesic distance has no closed form, so this is the one per-pair loop left in the columnar path;
+    pairs of known transplant centers are read from the center distance table instead.
+    """
+    donor_lat = organ_info.get('donor_location_lat')
+    donor_lon = organ_info.get('donor_location_lon')
+    lat_column = _column(recipients, 'recipient_location_lat')
+    lon_column = _column(recipients, 'recipient_location_lon')
+    lats, lons = lat_column.tolist(), lon_column.tolist()
+    distances = np.full(len(lats), np.nan)
+
+    table = get_center_distance_table()
+    if table is not None and organ_info.get('donor_center_id') is not None and 'recipient_center_id' in recipients:
+        try:
+            distances = table.lookup_many(organ_info['donor_center_id'], donor_lat, donor_lon,
+                                          _column(recipients, 'recipient_center_id').tolist(), lat_column, lon_column)
+        except (TypeError, ValueError):
+            pass # Non-numeric coordinates: everything goes through the live path below
+
+    for i in np.flatnonzero(np.isnan(distances)).tolist():
+        lat, lon = lats[i], lons[i]
+        # Arrow/pandas nulls arrive as NaN or None; calculate_distance_km expects None for "unknown"
+        lat = None if lat is None or lat != lat else lat
+        lon = None if lon is None or lon != lon else lon
+        distances[i] = calculate_distance_km(donor_lat, donor_lon, lat, lon)
+    return distances
+
+
+def distance_factors(distances_km, max_effective_distance=1000):
+    """Vectorized distance_calculator.distance_factor."""
+    distances_km = np.asarray(distances_km, dtype=np.float64)
+    factors = np.clip(1.0 - (distances_km / max_effective_distance), 0.0, 1.0)
+    factors[distances_km <= 0] = 1.0
+    factors[np.isinf(distances_km)] = 0.0
+    return factors
+
+
+def count_hla_mismatches(organ_info, recipients, skip_empty=False):
+    """
+    Positional HLA mismatch counts for every recipient.
+    skip_empty=False matches calculate_hla_mismatch on the raw 4-allele lists (viability model input).
+    skip_empty=True matches weighted_scorer, which drops empty alleles before comparing.
+    """
+    donor_hlas = [organ_info.get(k, '') for k in DONOR_HLA_KEYS]
+    rec_matrix = np.column_stack([_column(recipients, k, '').astype(object) for k in RECIPIENT_HLA_KEYS])
+    if len(rec_matrix) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if not skip_empty:
+        return (rec_matrix != np.array(donor_hlas, dtype=object)).sum(axis=1).astype(np.int64)
+
+    donor_filtered = [h for h in donor_hlas if h]
+    rec_present = np.vectorize(bool, otypes=[bool])(rec_matrix)
+    complete_rows = rec_present.all(axis=1)
+    mismatches = np.empty(len(rec_matrix), dtype=np.int64)
+
+    if len(donor_filtered) == len(donor_hlas):
+        mismatches[complete_rows] = (rec_matrix[complete_rows] != np.array(donor_hlas, dtype=object)).sum(axis=1)
+    else:
+        # Donor alleles missing: a complete recipient list never has the same length
+        mismatches[complete_rows] = len(RECIPIENT_HLA_KEYS)
+    # Rows with missing recipient alleles compress positions; defer to the scalar rule for exactness
+    for i in np.flatnonzero(~complete_rows):
+        rec_filtered = [h for h in rec_matrix[i] if h]
+        mismatches[i] = calculate_hla_mismatch(donor_filtered, rec_filtered)
+    return mismatches
+
+
+def calculate_score_components(organ_info, recipients, graft_survival_probs, estimated_cold_ischemia_hours,
+                               max_allowable_cold_ischemia, distances_km=None, recipient_components=None,
+                               donor_components=None):
+    """
+    Unweighted terms of calculate_match_scores: ({component: value}, eligible), keyed like SCORE_COMPONENTS.
+    Values are per-recipient arrays, except donor_risk (a scalar, constant for the organ).
+    eligible marks blood type compatible recipients with CIT within the limit (NaN CIT is not).
+    """
+    graft_survival_probs = np.asarray(graft_survival_probs, dtype=np.float64)
+    cit = np.asarray(estimated_cold_ischemia_hours, dtype=np.float64)
+    if distances_km is None:
+        distances_km = compute_pair_distances_km(organ_info, recipients)
+
+    # 1 + 2. Prerequisites: blood type compatibility and CIT within limit (NaN compares False)
+    compatible_types = get_blood_type_compatibility().get(organ_info['donor_blood_type'], [])
+    eligible = np.isin(_column(recipients, 'recipient_blood_type').astype(object), compatible_types)
+    eligible &= cit <= max_allowable_cold_ischemia
+
+    # 3. HLA
+    hla_score = np.maximum(0, 1 - (count_hla_mismatches(organ_info, recipients, skip_empty=True) / 4))
+
+    # 4. Donor risk is constant for the organ
+    if donor_components is not None:
+        donor_risk_factor = donor_components["donor_risk_factor"]
+    else:
+        donor_risk_factor = normalize_risk_score(
+            get_donor_risk_profile(organ_info['donor_age'], organ_info.get('donor_comorbidities', 0)))
+
+    # 5 + 8. Recipient risk and urgency
+    if recipient_components is not None:
+        recipient_risk_factor = recipient_components["recipient_risk_factor"]
+        urgency_score = recipient_components["urgency_score"]
+    else:
+        recipient_risk_factor = 1 - calculate_basic_risk_scores(
+            _column(recipients, 'recipient_age').astype(np.float64),
+            _column(recipients, 'recipient_comorbidities', 0).astype(np.float64))
+        urgency_score = _column(recipients, 'urgency_score', 0.5).astype(np.float64)
+
+    # 6. Distance
+    dist_score = distance_factors(distances_km)
+
+    terms = {
+        "hla_mismatch": hla_score, "donor_risk": donor_risk_factor, "recipient_risk": recipient_risk_factor,
+        "distance": dist_score, "graft_viability": graft_survival_probs, "recipient_urgency": urgency_score
+    }
+    return terms, eligible
+
+
+def calculate_match_scores(organ_info, recipients, graft_survival_probs, estimated_cold_ischemia_hours,
+                           max_allowable_cold_ischemia, distances_km=None, recipient_components=None,
+                           donor_components=None, weights=None):
+    """
+    Scores every recipient in `recipients` (DataFrame or dict of column arrays) for one organ.
+    estimated_cold_ischemia_hours: array of CIT values, NaN where unknown (scored as exceeding the limit).
+    recipient_components / donor_components: optional precomputed single-side terms
+    (static_components.compute_recipient_static_arrays / compute_donor_static_components).
+    weights: optional replacement for WEIGHTS (same keys), e.g. a candidate allocation policy.
+    Returns a float64 array of scores identical to calculate_match_score applied row by row.
+    """
+    weights = WEIGHTS if weights is None else weights
+    terms, eligible = calculate_score_components(
+        organ_info, recipients, graft_survival_probs, estimated_cold_ischemia_hours, max_allowable_cold_ischemia,
+        distances_km, recipient_components, donor_components)
+
+    score = (
+        weights["hla_mismatch"] * terms["hla_mismatch"] +
+        weights["donor_risk"] * terms["donor_risk"] +
+        weights["recipient_risk"] * terms["recipient_risk"] +
+        weights["distance"] * terms["distance"] +
+        weights["graft_viability"] * terms["graft_viability"] +
+        weights["recipient_urgency"] * terms["recipient_urgency"]
+    )
+    active_weights_sum = sum(weights[k] for k in SCORE_COMPONENTS)
+    if active_weights_sum != 0 and active_weights_sum != 1.0:
+        score = score / active_weights_sum
+
+    return np.where(eligible, np.clip(score, 0.0, 1.0), 0.0)
+
+
+def count_pair_hla_mismatches(pairs, skip_empty=False):
+    """
+    count_hla_mismatches for rows that each carry their own donor (one donor x recipient pair per row,
+    e.g. historical transplant records), with the same semantics for skip_empty.
+    """
+    donor_matrix = np.column_stack([_column(pairs, k, '').astype(object) for k in DONOR_HLA_KEYS])
+    rec_matrix = np.column_stack([_column(pairs, k, '').astype(object) for k in RECIPIENT_HLA_KEYS])
+    if len(rec_matrix) == 0:
+        return np.zeros(0, dtype=np.int64)
+    mismatches = (donor_matrix != rec_matrix).sum(axis=1).astype(np.int64)
+    if not skip_empty:
+        return mismatches
+
+    present = np.vectorize(bool, otypes=[bool])(np.hstack([donor_matrix, rec_matrix]))
+    for i in np.flatnonzero(~present.all(axis=1)):
+        mismatches[i] = calculate_hla_mismatch([h for h in donor_matrix[i] if h], [h for h in rec_matrix[i] if h])
+    return mismatches
+
+
+def calculate_pair_match_scores(pairs, graft_survival_probs, estimated_cold_ischemia_hours,
+                                max_allowable_cold_ischemia, distances_km):
+    """
+    calculate_match_score over rows that each carry their own donor and recipient fields.
+    max_allowable_cold_ischemia and distances_km are per-row arrays (NaN CIT scores as exceeding the limit).
+    Same float operations as the scalar scorer, so scores are identical.
+    """
+    graft_survival_probs = np.asarray(graft_survival_probs, dtype=np.float64)
+    cit = np.asarray(estimated_cold_ischemia_hours, dtype=np.float64)
+
+    compatibility = get_blood_type_compatibility()
+    eligible = np.array([recipient_bt in compatibility.get(donor_bt, []) for donor_bt, recipient_bt in
+                         zip(_column(pairs, 'donor_blood_type').tolist(), _column(pairs, 'recipient_blood_type').tolist())],
+                        dtype=bool)
+    eligible &= cit <= np.asarray(max_allowable_cold_ischemia, dtype=np.float64)
+
+    hla_score = np.maximum(0, 1 - (count_pair_hla_mismatches(pairs, skip_empty=True) / 4))
+    donor_risk_factor = 1 - calculate_basic_risk_scores(
+        _column(pairs, 'donor_age').astype(np.float64), _column(pairs, 'donor_comorbidities', 0).astype(np.float64))
+    recipient_risk_factor = 1 - calculate_basic_risk_scores(
+        _column(pairs, 'recipient_age').astype(np.float64), _column(pairs, 'recipient_comorbidities', 0).astype(np.float64))
+    urgency_score = _column(pairs, 'urgency_score', 0.5).astype(np.float64)
+    dist_score = distance_factors(distances_km)
+
+    score = (
+        WEIGHTS["hla_mismatch"] * hla_score +
+        WEIGHTS["donor_risk"] * donor_risk_factor +
+        WEIGHTS["recipient_risk"] * recipient_risk_factor +
+        WEIGHTS["distance"] * dist_score +
+        WEIGHTS["graft_viability"] * graft_survival_probs +
+        WEIGHTS["recipient_urgency"] * urgency_score
+    )
+    active_weights_sum = sum(WEIGHTS[k] for k in SCORE_COMPONENTS)
+    if active_weights_sum != 0 and active_weights_sum != 1.0:
+        score = score / active_weights_sum
+
+    return np.where(eligible, np.clip(score, 0.0, 1.0), 0.0)
@@ -0,0 +1,333 @@
+# hopeconnect-ai/src/matching_engine/donor_health_rules.py
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+
+# Declarative donor-health policy. The thresholds used by assess_donor_health_for_incentives live in a
+# versioned JSON rule table (config/donor_health_rules.json by default), validated and compiled at load
+# time into flat interval tables, and hot-reloaded when the file changes.
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+DONOR_HEALTH_RULES_PATH = os.environ.get(
+    'DONOR_HEALTH_RULES_PATH', os.path.join(PROJECT_ROOT, 'config', 'donor_health_rules.json'))
+RULES_RELOAD_CHECK_SECONDS = 2.0
+
+BOUND_KEYS = ('above', 'at_least', 'below', 'at_most')
+LAB_FEATURES = ('creatinine', 'gfr')
+
+# Interval region kinds
+_NONE, _CONSTANT, _PER_UNIT_ABOVE, _PER_UNIT_BELOW = 0, 1, 2, 3
+
+
+class DonorHealthRuleError(ValueError):
+    """Raised when a rule table fails validation."""
+
+
+def _matches(rule, x):
+    return (('above' not in rule or x > rule['above']) and ('at_least' not in rule or x >= rule['at_least']) and
+            ('below' not in rule or x < rule['below']) and ('at_most' not in rule or x <= rule['at_most']))
+
+
+def _validate_rule(rule, where):
+    if not isinstance(rule, dict):
+        raise DonorHealthRuleError(f"{where}: each rule must be an object.")
+    unknown = set(rule) - set(BOUND_KEYS) - {'penalty', 'per_unit'}
+    if unknown:
+        raise DonorHealthRuleError(f"{where}: unknown keys {sorted(unknown)}.")
+    bounds = [k for k in BOUND_KEYS if k in rule]
+    if not bounds:
+        raise DonorHealthRuleError(f"{where}: a rule needs at least one of {', '.join(BOUND_KEYS)}.")
+    for key in bounds + [k for k in ('penalty', 'per_unit') if k in rule]:
+        if isinstance(rule[key], bool) or not isinstance(rule[key], (int, float)):
+            raise DonorHealthRuleError(f"{where}: '{key}' must be a number.")
+    if ('penalty' in rule) == ('per_unit' in rule):
+        raise DonorHealthRuleError(f"{where}: a rule needs exactly one of 'penalty' or 'per_unit'.")
+    if 'per_unit' in rule and len(bounds) != 1:
+        raise DonorHealthRuleError(f"{where}: a 'per_unit' rule needs exactly one bound to measure from.")
+
+
+class IntervalTable:
+    """
+    A first-match rule list over one numeric feature, compiled into a step table.
+    The sorted rule thresholds split the line into open intervals and the threshold points themselves;
+    each region holds the rule that wins there, so a lookup is one binary search over a handful of cuts.
+    """
+
+    def __init__(self, rules, where):
+        if not isinstance(rules, list):
+            raise DonorHealthRuleError(f"{where}: must be a list of rules.")
+        for i, rule in enumerate(rules):
+            _validate_rule(rule, f"{where}[{i}]")
+        self.cuts = sorted({float(rule[k]) for rule in rules for k in BOUND_KEYS if k in rule})
+        k = len(self.cuts)
+        self._cuts_array = np.array(self.cuts, dtype=np.float64)
+        self.kinds = np.zeros(2 * k + 1, dtype=np.int8)
+        self.values = np.zeros(2 * k + 1, dtype=np.float64)
+        self.refs = np.zeros(2 * k + 1, dtype=np.float64)
+        self._regions = []
+        for region in range(2 * k + 1):
+            point = self._representative(region)
+            entry = (_NONE, 0.0, 0.0)
+            for rule in rules:
+                if _matches(rule, point):
+                    entry = self._effect(rule)
+                    break
+            self.kinds[region], self.values[region], self.refs[region] = entry
+            self._regions.append(entry)
+
+    def _representative(self, region):
+        cuts, i = self.cuts, region // 2
+        if region % 2 == 1:
+            return cuts[i]
+        if not cuts:
+            return 0.0
+        if i == 0:
+            return cuts[0] - 1.0
+        if i == len(cuts):
+            return cuts[-1] + 1.0
+        return (cuts[i - 1] + cuts[i]) / 2.0
+
+    @staticmethod
+    def _effect(rule):
+        if 'penalty' in rule:
+            return (_CONSTANT, rule['penalty'], 0.0)
+        bound = next(k for k in BOUND_KEYS if k in rule)
+        kind = _PER_UNIT_ABOVE if bound in ('above', 'at_least') else _PER_UNIT_BELOW
+        return (kind, rule['per_unit'], rule[bound])
+
+    def penalty(self, x):
+        i = bisect_left(self.cuts, x)
+        region = 2 * i + (1 if i < len(self.cuts) and self.cuts[i] == x else 0)
+        kind, value, ref = self._regions[region]
+        if kind == _CONSTANT:
+            return value
+        if kind == _PER_UNIT_ABOVE:
+            return (x - ref) * value
+        if kind == _PER_UNIT_BELOW:
+            return (ref - x) * value
+        return 0
+
+    def penalties(self, xs):
+        """Vectorized penalty(); callers mask out missing values beforehand."""
+        xs = np.asarray(xs, dtype=np.float64)
+        k = len(self.cuts)
+        idx = np.searchsorted(self._cuts_array, xs, side='left')
+        on_cut = (idx < k) & (self._cuts_array[np.minimum(idx, max(k - 1, 0))] == xs) if k else np.zeros(len(xs), bool)
+        region = 2 * idx + on_cut
+        kinds, values, refs = self.kinds[region], self.values[region], self.refs[region]
+        return np.select(
+            [kinds == _CONSTANT, kinds == _PER_UNIT_ABOVE, kinds == _PER_UNIT_BELOW],
+            [values, (xs - refs) * values, (refs - xs) * values],
+            default=0.0)
+
+
+def _number(doc, key, where, default=None):
+    value = doc.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise DonorHealthRuleError(f"{where}: '{key}' must be a number.")
+    return value
+
+
+def _section(doc, key, where, kind, default):
+    """doc[key] (or the default), which must be a JSON object (kind=dict) or array (kind=list)."""
+    value = doc.get(key, default)
+    if not isinstance(value, kind):
+        raise DonorHealthRuleError(f"{where}: must be {'an object' if kind is dict else 'a list'}.")
+    return value
+
+
+class CompiledDonorHealthRules:
+    """A validated rule table, ready for constant-time-per-feature scoring of one donor or a column batch."""
+
+    def __init__(self, doc, source=None):
+        if not isinstance(doc, dict):
+            raise DonorHealthRuleError("Rule table must be a JSON object.")
+        if not isinstance(doc.get('version'), str) or not doc['version']:
+            raise DonorHealthRuleError("Rule table needs a non-empty string 'version'.")
+        self.version = doc['version']
+        self.source = source
+        self.loaded_at = time.time()
+
+        self.base_score = _number(doc, 'base_score', 'base_score', 100)
+        bounds = doc.get('score_bounds', [0, 100])
+        if not (isinstance(bounds, list) and len(bounds) == 2 and
+                all(isinstance(b, (int, float)) and not isinstance(b, bool) for b in bounds) and bounds[0] <= bounds[1]):
+            raise DonorHealthRuleError("'score_bounds' must be [min, max] with min <= max.")
+        self.min_score, self.max_score = bounds
+
+        self.organ_age = {organ: IntervalTable(rules, f"organ_age_penalties.{organ}")
+                          for organ, rules in _section(doc, 'organ_age_penalties', 'organ_age_penalties', dict, {}).items()}
+        self.general_age = IntervalTable(doc.get('general_age_penalties', []), "general_age_penalties")
+        self.comorbidity_penalty = _number(doc, 'comorbidity_penalty_per_condition', 'comorbidity_penalty_per_condition', 0)
+        self.smoker_penalty = _number(doc, 'smoker_penalty', 'smoker_penalty', 0)
+
+        self.alcohol_penalties = _section(doc, 'alcohol_penalties', 'alcohol_penalties', dict, {})
+        for level in self.alcohol_penalties:
+            _number(self.alcohol_penalties, level, f"alcohol_penalties.{level}")
+
+        bmi = _section(doc, 'bmi', 'bmi', dict, {})
+        self.bmi_default = _number(bmi, 'default', 'bmi', 22)
+        self.bmi = IntervalTable(bmi.get('rules', []), "bmi.rules")
+
+        self.organ_labs = {}
+        for organ, labs in _section(doc, 'organ_lab_penalties', 'organ_lab_penalties', dict, {}).items():
+            if not isinstance(labs, dict):
+                raise DonorHealthRuleError(f"organ_lab_penalties.{organ}: must be an object.")
+            unknown = set(labs) - set(LAB_FEATURES)
+            if unknown:
+                raise DonorHealthRuleError(f"organ_lab_penalties.{organ}: unknown lab features {sorted(unknown)}.")
+            self.organ_labs[organ] = []
+            for feature in LAB_FEATURES:
+                if feature not in labs:
+                    continue
+                where = f"organ_lab_penalties.{organ}.{feature}"
+                lab = labs[feature]
+                if not isinstance(lab, dict):
+                    raise DonorHealthRuleError(f"{where}: must be an object.")
+                if not isinstance(lab.get('treat_zero_as_missing', False), bool):
+                    raise DonorHealthRuleError(f"{where}: 'treat_zero_as_missing' must be true or false.")
+                self.organ_labs[organ].append(
+                    (feature, lab.get('treat_zero_as_missing', False), IntervalTable(lab.get('rules', []), f"{where}.rules")))
+
+    def score(self, donor_age, organ_type, comorbidities_count, lifestyle_factors=None, lab_results=None):
+        """Single donor. Penalties are applied in table order: age, comorbidities, lifestyle, labs."""
+        score = self.base_score
+        organ_table = self.organ_age.get(organ_type)
+        if organ_table is not None:
+            score -= organ_table.penalty(donor_age)
+        score -= self.general_age.penalty(donor_age)
+        score -= comorbidities_count * self.comorbidity_penalty
+
+        if lifestyle_factors:
+            if lifestyle_factors.get("smoker", False):
+                score -= self.smoker_penalty
+            score -= self.alcohol_penalties.get(lifestyle_factors.get("alcohol_consumption", "low"), 0)
+            score -= self.bmi.penalty(lifestyle_factors.get("bmi", self.bmi_default))
+
+        if lab_results:
+            for feature, zero_is_missing, table in self.organ_labs.get(organ_type, []):
+                value = lab_results.get(feature)
+                if value is None or (zero_is_missing and not value):
+                    continue
+                score -= table.penalty(value)
+
+        return max(self.min_score, min(score, self.max_score))
+
+    def score_batch(self, donor_ages, organ_types, comorbidities_counts, smoker=None, alcohol_consumption=None,
+                    bmi=None, creatinine=None, gfr=None):
+        """Column batch (one entry per donor); missing optional entries (None/NaN) behave like absent keys."""
+        donor_ages = np.asarray(donor_ages, dtype=np.float64)
+        n = len(donor_ages)
+        organ_types = np.asarray(organ_types, dtype=object)
+        score = np.full(n, float(self.base_score))
+
+        age_penalty = np.zeros(n)
+        for organ, table in self.organ_age.items():
+            mask = organ_types == organ
+            if mask.any():
+                age_penalty[mask] = table.penalties(donor_ages[mask])
+        score -= age_penalty
+        score -= self.general_age.penalties(donor_ages)
+        score -= np.asarray(comorbidities_counts, dtype=np.float64) * self.comorbidity_penalty
+
+        if smoker is not None:
+            score -= np.where(pd.Series(smoker, dtype=object).fillna(False).astype(bool).to_numpy(), float(self.smoker_penalty), 0.0)
+        if alcohol_consumption is not None:
+            alcohol = pd.Series(alcohol_consumption, dtype=object).fillna("low")
+            score -= alcohol.map(lambda level: self.alcohol_penalties.get(level, 0)).to_numpy(dtype=np.float64)
+        score -= self.bmi.penalties(_numeric_column(bmi, n, self.bmi_default))
+
+        lab_columns = {'creatinine': creatinine, 'gfr': gfr}
+        for organ, labs in self.organ_labs.items():
+            organ_mask = organ_types == organ
+            if not organ_mask.any():
+                continue
+            for feature, zero_is_missing, table in labs:
+                values = _numeric_column(lab_columns[feature], n, np.nan)
+                present = organ_mask & ~np.isnan(values)
+                if zero_is_missing:
+                    present &= values != 0
+                lab_penalty = np.zeros(n)
+                lab_penalty[present] = table.penalties(values[present])
+                score -= lab_penalty
+
+        return np.clip(score, self.min_score, self.max_score)
+
+    def describe(self):
+        return {"version": self.version, "source": self.source, "loaded_at": self.loaded_at}
+
+
+def _numeric_column(values, n, default):
+    if values is None:
+        return np.full(n, default, dtype=np.float64)
+    column = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64, copy=True)
+    column[np.isnan(column)] = default
+    return column
+
+
+def load_donor_health_rules(path=DONOR_HEALTH_RULES_PATH):
+    """Reads, validates and compiles a rule table file."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Donor health rule table not found at {path}.")
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            doc = json.load(f)
+        except ValueError as e:
+            raise DonorHealthRuleError(f"Rule table {path} is not valid JSON: {e}")
+    try:
+        return CompiledDonorHealthRules(doc, source=path)
+    except DonorHealthRuleError:
+        raise
+    except Exception as e: # A shape the validation above missed still rejects the file, never the request
+        raise DonorHealthRuleError(f"Rule table {path} could not be compiled: {e!r}")
+
+
+_rules_lock = threading.Lock()
+_rules_state = {"compiled": None, "mtime": None, "checked_at": 0.0, "last_error": None}
+
+
+def get_donor_health_rules(path=DONOR_HEALTH_RULES_PATH, force_reload=False):
+    """
+    Returns the compiled rule table, reloading it when the file's mtime changes (checked at most every
+    RULES_RELOAD_CHECK_SECONDS). An invalid edit keeps the previous table in force and is reported.
+    """
+    now = time.time()
+    compiled = _rules_state["compiled"]
+    if compiled is not None and not force_reload and now - _rules_state["checked_at"] < RULES_RELOAD_CHECK_SECONDS:
+        return compiled # Fast path without the lock: dict reads are atomic
+    with _rules_lock:
+        state = _rules_state
+        if state["compiled"] is not None and not force_reload and now - state["checked_at"] < RULES_RELOAD_CHECK_SECONDS:
+            return state["compiled"]
+        state["checked_at"] = now
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if state["compiled"] is not None and not force_reload and mtime == state["mtime"]:
+            return state["compiled"]
+        try:
+            compiled = load_donor_health_rules(path)
+        except Exception as e: # Any failure to load (bad types included) is a rejected edit
+            state["last_error"] = str(e)
+            if state["compiled"] is None:
+                raise
+            print(f"Warning: donor health rule table reload failed, keeping version {state['compiled'].version}: {e}")
+            state["mtime"] = mtime # Don't retry the same broken file on every call
+            if force_reload:
+                raise # An explicit reload reports the rejection to the caller
+            return state["compiled"]
+        if state["compiled"] is not None and compiled.version != state["compiled"].version:
+            print(f"Donor health rules reloaded: {state['compiled'].version} -> {compiled.version}")
+        state.update(compiled=compiled, mtime=mtime, last_error=None)
+        return compiled
+
+
+def donor_health_rules_status():
+    with _rules_lock:
+        compiled = _rules_state["compiled"]
+        status = compiled.describe() if compiled else {"version": None}
+        status["last_error"] = _rules_state["last_error"]
+        return status
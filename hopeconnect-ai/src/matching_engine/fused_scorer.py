@@ -0,0 +1,231 @@
+# hopeconnect-ai/src/matching_engine/fused_scorer.py
+
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.columnar_scorer import (
+    calculate_match_scores, compute_pair_distances_km, _column, DONOR_HLA_KEYS, RECIPIENT_HLA_KEYS
+)
+from src.matching_engine.preprocessor import get_blood_type_compatibility
+from src.matching_engine.risk_scorer import get_donor_risk_profile
+from src.matching_engine.weighted_scorer import WEIGHTS, SCORE_COMPONENTS, normalize_risk_score
+
+# Fused form of columnar_scorer.calculate_match_scores: blood type gate, CIT gate, HLA, recipient risk,
+# distance factor, weighted sum, normalization and clipping are computed in one pass per recipient,
+# with no intermediate float arrays. The only preparation is turning the object columns (blood type,
+# HLA alleles) into boolean flags. With Numba the pass is a compiled parallel loop; without it, the
+# NumPy fallback runs the same formula over fixed-size chunks so temporaries stay bounded.
+# Scores are identical to calculate_match_scores: every term uses the same float operations in the same
+# order (no fastmath), the age term comes from a table of Python's r ** 2 (as calculate_basic_risk_scores),
+# and the rare rows the pass cannot reproduce exactly (missing recipient HLA alleles, which the reference
+# compresses positionally, or ages outside the table) are marked NaN and rescored by the reference.
+
+FUSED_MATCH_SCORER = os.environ.get('FUSED_MATCH_SCORER', 'off') # off | auto | numba | numpy
+FUSED_NUMPY_CHUNK_ROWS = int(os.environ.get('FUSED_NUMPY_CHUNK_ROWS', 16384))
+FUSED_BACKENDS = ("auto", "numba", "numpy")
+AGE_TABLE_MAX = 150 # Integer ages 0..150 are looked up; anything else goes to the reference path
+MAX_EFFECTIVE_DISTANCE_KM = 1000 # distance_factors default
+# (age / 100) ** 2 with Python's operator: it differs from age * age in the last bit for some values
+AGE_SCORES = np.array([(age / 100) ** 2 for age in range(AGE_TABLE_MAX + 1)], dtype=np.float64)
+
+
+def _score_rows(out, compatible, cit, max_cit, hla_match, hla_present, donor_hla_complete, ages, comorbidities,
+                recipient_risk_factor, urgency, use_components, distances, probs, age_scores, w, donor_risk_factor,
+                weights_sum):
+    """The fused loop (compiled by Numba when available). NaN in `out` marks rows for the reference path."""
+    divide = weights_sum != 0 and weights_sum != 1.0
+    for i in _prange(out.shape[0]):
+        if not compatible[i] or not (cit[i] <= max_cit):
+            out[i] = 0.0
+            continue
+        if not (hla_present[0][i] and hla_present[1][i] and hla_present[2][i] and hla_present[3][i]):
+            out[i] = np.nan
+            continue
+        mismatches = 4
+        if donor_hla_complete:
+            mismatches = (4 - np.int64(hla_match[0][i]) - np.int64(hla_match[1][i])
+                          - np.int64(hla_match[2][i]) - np.int64(hla_match[3][i]))
+        hla_score = 1 - (mismatches / 4)
+        if hla_score < 0:
+            hla_score = 0.0
+
+        if use_components:
+            rrf = recipient_risk_factor[i]
+        else:
+            age = ages[i]
+            if not (age >= 0 and age <= AGE_TABLE_MAX and age == math.floor(age)):
+                out[i] = np.nan
+                continue
+            risk = (0.6 * age_scores[np.int64(age)]) + (0.4 * (comorbidities[i] / 5))
+            if risk < 0:
+                risk = 0.0
+            elif risk > 1:
+                risk = 1.0
+            rrf = 1 - risk
+
+        distance = distances[i]
+        if math.isinf(distance):
+            distance_factor = 0.0
+        elif distance <= 0:
+            distance_factor = 1.0
+        else:
+            distance_factor = 1.0 - (distance / MAX_EFFECTIVE_DISTANCE_KM)
+            if distance_factor < 0.0:
+                distance_factor = 0.0
+            elif distance_factor > 1.0:
+                distance_factor = 1.0
+
+        score = (w[0] * hla_score + w[1] * donor_risk_factor + w[2] * rrf +
+                 w[3] * distance_factor + w[4] * probs[i] + w[5] * urgency[i])
+        if divide:
+            score = score / weights_sum
+        if score < 0.0:
+            score = 0.0
+        elif score > 1.0:
+            score = 1.0
+        out[i] = score
+
+
+if numba is not None:
+    _prange = numba.prange
+    _score_rows_numba = numba.njit(parallel=True, cache=True)(_score_rows)
+else:
+    _prange = range
+    _score_rows_numba = None
+
+
+def _score_chunk_numpy(out, compatible, cit, max_cit, hla_match, hla_present, donor_hla_complete, ages, comorbidities,
+                       recipient_risk_factor, urgency, use_components, distances, probs, w, donor_risk_factor, weights_sum):
+    """NumPy fallback for one chunk (all arguments are slices of the same rows); same operations as _score_rows."""
+    eligible = compatible & (cit <= max_cit)
+    complete = hla_present[0] & hla_present[1] & hla_present[2] & hla_present[3]
+    if donor_hla_complete:
+        mismatches = 4 - (hla_match[0].astype(np.int64) + hla_match[1] + hla_match[2] + hla_match[3])
+    else:
+        mismatches = np.full(len(out), 4, dtype=np.int64)
+    hla_score = np.maximum(0, 1 - (mismatches / 4))
+
+    fallback = ~complete
+    if use_components:
+        rrf = recipient_risk_factor
+    else:
+        in_table = (ages >= 0) & (ages <= AGE_TABLE_MAX) & (ages == np.floor(ages))
+        fallback |= ~in_table
+        age_score = AGE_SCORES[np.where(in_table, ages, 0).astype(np.int64)]
+        rrf = 1 - np.clip((0.6 * age_score) + (0.4 * (comorbidities / 5)), 0, 1)
+
+    distance_factor = np.clip(1.0 - (distances / MAX_EFFECTIVE_DISTANCE_KM), 0.0, 1.0)
+    distance_factor[distances <= 0] = 1.0
+    distance_factor[np.isinf(distances)] = 0.0
+
+    score = (w[0] * hla_score + w[1] * donor_risk_factor + w[2] * rrf +
+             w[3] * distance_factor + w[4] * probs + w[5] * urgency)
+    if weights_sum != 0 and weights_sum != 1.0:
+        score = score / weights_sum
+    out[:] = np.where(eligible, np.where(fallback, np.nan, np.clip(score, 0.0, 1.0)), 0.0)
+
+
+def active_backend(requested=None):
+    """'numba' or 'numpy' for a FUSED_BACKENDS value ('numba' without Numba installed falls back to 'numpy')."""
+    requested = requested or (FUSED_MATCH_SCORER if FUSED_MATCH_SCORER in FUSED_BACKENDS else "auto")
+    if requested not in FUSED_BACKENDS:
+        raise ValueError(f"Unknown fused scorer backend '{requested}'. Expected one of: {', '.join(FUSED_BACKENDS)}.")
+    if requested == "numpy" or numba is None:
+        return "numpy"
+    return "numba"
+
+
+def _subset(columns, rows):
+    if hasattr(columns, 'iloc'):
+        return columns.iloc[rows]
+    return {name: np.asarray(values)[rows] for name, values in columns.items()}
+
+
+def fused_match_scores(organ_info, recipients, graft_survival_probs, estimated_cold_ischemia_hours,
+                       max_allowable_cold_ischemia, distances_km=None, recipient_components=None,
+                       donor_components=None, weights=None, backend=None):
+    """
+    Drop-in replacement for calculate_match_scores (same arguments, identical scores) computed in one
+    fused pass. backend: 'numba', 'numpy' or 'auto' (default: FUSED_MATCH_SCORER, Numba when installed).
+    """
+    backend = active_backend(backend)
+    weights = WEIGHTS if weights is None else weights
+    probs = np.asarray(graft_survival_probs, dtype=np.float64)
+    cit = np.asarray(estimated_cold_ischemia_hours, dtype=np.float64)
+    n = len(cit)
+    if distances_km is None:
+        distances_km = compute_pair_distances_km(organ_info, recipients)
+    distances = np.asarray(distances_km, dtype=np.float64)
+
+    # Object columns -> flags: blood type compatibility, allele equal to the donor's, allele present (truthy)
+    compatible = np.isin(_column(recipients, 'recipient_blood_type').astype(object),
+                         get_blood_type_compatibility().get(organ_info['donor_blood_type'], []))
+    donor_hlas = [organ_info.get(k, '') for k in DONOR_HLA_KEYS]
+    recipient_hla = [_column(recipients, k, '').astype(object) for k in RECIPIENT_HLA_KEYS]
+    hla_match = tuple(column == allele for column, allele in zip(recipient_hla, donor_hlas))
+    hla_present = tuple(column.astype(bool) for column in recipient_hla)
+    donor_hla_complete = all(bool(h) for h in donor_hlas)
+
+    if donor_components is not None:
+        donor_risk_factor = float(donor_components["donor_risk_factor"])
+    else:
+        donor_risk_factor = normalize_risk_score(
+            get_donor_risk_profile(organ_info['donor_age'], organ_info.get('donor_comorbidities', 0)))
+    use_components = recipient_components is not None
+    if use_components:
+        recipient_risk_factor = np.asarray(recipient_components["recipient_risk_factor"], dtype=np.float64)
+        urgency = np.asarray(recipient_components["urgency_score"], dtype=np.float64)
+        ages = comorbidities = recipient_risk_factor # Unused
+    else:
+        ages = _column(recipients, 'recipient_age').astype(np.float64)
+        comorbidities = _column(recipients, 'recipient_comorbidities', 0).astype(np.float64)
+        urgency = _column(recipients, 'urgency_score', 0.5).astype(np.float64)
+        recipient_risk_factor = ages # Unused
+    w = np.array([weights[k] for k in SCORE_COMPONENTS], dtype=np.float64)
+    weights_sum = float(sum(weights[k] for k in SCORE_COMPONENTS))
+
+    out = np.empty(n, dtype=np.float64)
+    if backend == "numba":
+        _score_rows_numba(out, compatible, cit, float(max_allowable_cold_ischemia), hla_match, hla_present,
+                          donor_hla_complete, ages, comorbidities, recipient_risk_factor, urgency, use_components,
+                          distances, probs, AGE_SCORES, w, donor_risk_factor, weights_sum)
+    else:
+        for start in range(0, n, FUSED_NUMPY_CHUNK_ROWS):
+            s = slice(start, start + FUSED_NUMPY_CHUNK_ROWS)
+            _score_chunk_numpy(out[s], compatible[s], cit[s], max_allowable_cold_ischemia,
+                               tuple(a[s] for a in hla_match), tuple(a[s] for a in hla_present), donor_hla_complete,
+                               ages[s], comorbidities[s], recipient_risk_factor[s], urgency[s], use_components,
+                               distances[s], probs[s], w, donor_risk_factor, weights_sum)
+
+    rows = np.flatnonzero(np.isnan(out))
+    if len(rows):
+        out[rows] = calculate_match_scores(
+            organ_info, _subset(recipients, rows), probs[rows], cit[rows], max_allowable_cold_ischemia, distances[rows],
+            _subset(recipient_components, rows) if use_components else None, donor_components, weights)
+    return out
+
+
+def warm_up():
+    """Compiles the Numba kernel (or loads it from the on-disk cache) so the first request does not pay for it."""
+    if active_backend() != "numba":
+        return
+    organ = {'donor_blood_type': 'O+', 'donor_age': 40, 'donor_comorbidities': 0,
+             'donor_hla_a1': 'A1', 'donor_hla_a2': 'A2', 'donor_hla_b1': 'B7', 'donor_hla_b2': 'B8'}
+    recipients = {'recipient_blood_type': np.array(['O+'], dtype=object), 'recipient_age': np.array([50.0]),
+                  'recipient_comorbidities': np.array([1.0]), 'urgency_score': np.array([0.5]),
+                  'recipient_hla_a1': np.array(['A1'], dtype=object), 'recipient_hla_a2': np.array(['A3'], dtype=object),
+                  'recipient_hla_b1': np.array(['B7'], dtype=object), 'recipient_hla_b2': np.array(['B8'], dtype=object)}
+    fused_match_scores(organ, recipients, [0.8], [5.0], 24.0, np.array([100.0]))
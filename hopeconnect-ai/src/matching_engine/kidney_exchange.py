@@ -0,0 +1,502 @@
+# hopeconnect-ai/src/matching_engine/kidney_exchange.py
+
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.preprocessor import check_blood_compatibility
+from src.matching_engine.columnar_scorer import calculate_pair_match_scores, count_pair_hla_mismatches, DONOR_HLA_KEYS, RECIPIENT_HLA_KEYS
+from src.matching_engine.center_distances import center_distance_km
+from src.matching_engine.policy_simulator import estimate_transport_hours
+from src.matching_engine.match_pipeline import DEFAULT_GRAFT_SURVIVAL_PROB
+from src.prediction_models.prediction_cache import VIABILITY_CACHE_FEATURES
+from src.prediction_models.viability_predictor import get_max_cold_ischemia_time, predict_graft_survival_batch
+
+# The solver is optional: without scipy's MILP (HiGHS) the packing falls back to a greedy selection.
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+    from scipy.sparse import csr_matrix
+except ImportError:
+    milp = None
+
+# Paired kidney exchange. Each pool entry is an incompatible (or poorly matched) donor/recipient pair;
+# altruistic donors have no recipient. The compatibility digraph has an edge u -> v when the donor of u
+# can give to the recipient of pair v: blood type compatible (check_blood_compatibility), within the HLA
+# mismatch limit, and scored by the /api/match_organs engine (HLA, risks, distance, predicted viability,
+# urgency) above the minimum score. An edge is kept if it is among the `max_edges_per_vertex` best of its
+# donor or of its recipient, which is what keeps dense pools tractable.
+# Exchanges are cycles of pairs (every donor gives once its recipient receives) of bounded length, and
+# chains started by an altruistic donor along pairs, the last donor becoming a bridge donor for a later
+# run. Cycles are enumerated by depth-first search over adjacency bitsets (Python ints), a path only being
+# extended towards vertices that can still get back to its start within the length bound. A maximum-weight
+# set of vertex-disjoint cycles and chains is then picked with an integer program in which chains are not
+# enumerated but built from position-indexed edge variables (the number of chains grows too fast with
+# their length); the greedy fallback enumerates them.
+
+EXCHANGE_ORGAN_TYPE = 'Kidney'
+EXCHANGE_MAX_CYCLE_LENGTH = int(os.environ.get('EXCHANGE_MAX_CYCLE_LENGTH', 3))
+EXCHANGE_MAX_CHAIN_LENGTH = int(os.environ.get('EXCHANGE_MAX_CHAIN_LENGTH', 3)) # Transplants per chain
+EXCHANGE_MAX_EDGES_PER_VERTEX = int(os.environ.get('EXCHANGE_MAX_EDGES_PER_VERTEX', 10)) # Per donor and recipient (0 = all)
+EXCHANGE_MAX_STRUCTURES = int(os.environ.get('EXCHANGE_MAX_STRUCTURES', 2000000)) # Cycles + chains enumerated
+EXCHANGE_SOLVER_TIME_LIMIT_S = float(os.environ.get('EXCHANGE_SOLVER_TIME_LIMIT_S', 60))
+EXCHANGE_PROCUREMENT_HOURS = float(os.environ.get('EXCHANGE_PROCUREMENT_HOURS', 2.0)) # Added to transport time
+EXCHANGE_EDGE_CHUNK_ROWS = 200000 # Candidate edges scored per batch
+MAX_EXCHANGE_LENGTH = 6
+EXCHANGE_OBJECTIVES = ('transplants', 'score')
+
+REQUIRED_EXCHANGE_PAIR_FIELDS = ['pair_id', 'donor_age', 'donor_blood_type', 'donor_location_lat', 'donor_location_lon',
+                                 'recipient_age', 'recipient_blood_type', 'recipient_location_lat', 'recipient_location_lon']
+REQUIRED_ALTRUIST_FIELDS = ['donor_id', 'donor_age', 'donor_blood_type', 'donor_location_lat', 'donor_location_lon']
+DONOR_FIELDS = ['donor_age', 'donor_blood_type', 'donor_comorbidities', 'donor_center_id',
+                'donor_location_lat', 'donor_location_lon'] + DONOR_HLA_KEYS
+RECIPIENT_FIELDS = ['recipient_age', 'recipient_blood_type', 'recipient_comorbidities', 'urgency_score', 'recipient_center_id',
+                    'recipient_location_lat', 'recipient_location_lon'] + RECIPIENT_HLA_KEYS
+
+_default_logger = logging.getLogger(__name__)
+
+
+class KidneyExchangeError(ValueError):
+    """Invalid pool or options, or an enumeration larger than EXCHANGE_MAX_STRUCTURES."""
+
+
+def normalize_exchange_options(options):
+    """Validated solver options with defaults: raises KidneyExchangeError on bad values."""
+    options = options or {}
+    normalized = {
+        "max_cycle_length": options.get("max_cycle_length", EXCHANGE_MAX_CYCLE_LENGTH),
+        "max_chain_length": options.get("max_chain_length", EXCHANGE_MAX_CHAIN_LENGTH),
+        "max_edges_per_vertex": options.get("max_edges_per_vertex", EXCHANGE_MAX_EDGES_PER_VERTEX),
+        "max_hla_mismatches": options.get("max_hla_mismatches"),
+        "min_edge_score": options.get("min_edge_score", 0.0),
+        "objective": options.get("objective", "transplants"),
+        "time_limit_s": options.get("time_limit_s", EXCHANGE_SOLVER_TIME_LIMIT_S),
+    }
+    for key, low, high in (("max_cycle_length", 0, MAX_EXCHANGE_LENGTH), ("max_chain_length", 0, MAX_EXCHANGE_LENGTH),
+                           ("max_edges_per_vertex", 0, None), ("max_hla_mismatches", 0, len(RECIPIENT_HLA_KEYS))):
+        value = normalized[key]
+        if value is None and key == "max_hla_mismatches":
+            continue
+        if not isinstance(value, int) or isinstance(value, bool) or value < low or (high is not None and value > high):
+            bound = f"between {low} and {high}" if high is not None else f">= {low}"
+            raise KidneyExchangeError(f"'{key}' must be an integer {bound}.")
+    if normalized["max_cycle_length"] == 1:
+        raise KidneyExchangeError("'max_cycle_length' must be 0 (no cycles) or at least 2.")
+    for key in ("min_edge_score", "time_limit_s"):
+        if isinstance(normalized[key], bool) or not isinstance(normalized[key], (int, float)) or normalized[key] < 0:
+            raise KidneyExchangeError(f"'{key}' must be a non-negative number.")
+    if normalized["objective"] not in EXCHANGE_OBJECTIVES:
+        raise KidneyExchangeError(f"'objective' must be one of: {', '.join(EXCHANGE_OBJECTIVES)}.")
+    return normalized
+
+
+def missing_exchange_fields(records, required, id_field):
+    """[(record id or position, [missing fields]), ...] for records lacking required values."""
+    problems = []
+    for i, record in enumerate(records):
+        missing = [field for field in required if record.get(field) is None]
+        if missing:
+            problems.append((record.get(id_field, i), missing))
+    return problems
+
+
+def _columns(records, fields):
+    """{field: numpy array} over records: HLA as strings ('' when absent), defaults as in the API."""
+    columns = {}
+    for field in fields:
+        values = [record.get(field) for record in records]
+        if field in DONOR_HLA_KEYS or field in RECIPIENT_HLA_KEYS:
+            columns[field] = np.array(['' if v is None else str(v) for v in values], dtype=object)
+        elif field.endswith('_comorbidities'):
+            columns[field] = np.array([0 if v is None else v for v in values], dtype=np.float64)
+        elif field == 'urgency_score':
+            columns[field] = np.array([0.5 if v is None else v for v in values], dtype=np.float64)
+        else:
+            columns[field] = np.array(values, dtype=object)
+    return columns
+
+
+def _location_codes(columns, prefix):
+    """Index of each row's (center id, lat, lon) among the distinct locations, and those locations."""
+    keys = list(zip(columns[f'{prefix}_center_id'].tolist(), columns[f'{prefix}_location_lat'].tolist(),
+                    columns[f'{prefix}_location_lon'].tolist()))
+    index = {}
+    codes = np.array([index.setdefault(key, len(index)) for key in keys], dtype=np.int64)
+    return codes, list(index)
+
+
+class CompatibilityGraph:
+    """
+    Scored donor -> recipient edges of an exchange pool. Vertices 0..n_pairs-1 are pairs (donor and
+    recipient), n_pairs.. are altruistic donors. `src`, `dst`, `score`, `graft_survival_prob` and
+    `hla_mismatches` are aligned edge arrays; out_bits[u] is the set of u's targets as an int bitset.
+    """
+
+    def __init__(self, n_pairs, n_altruists, src, dst, score, graft_survival_prob, hla_mismatches):
+        self.n_pairs = n_pairs
+        self.n_altruists = n_altruists
+        self.src = src
+        self.dst = dst
+        self.score = score
+        self.graft_survival_prob = graft_survival_prob
+        self.hla_mismatches = hla_mismatches
+        self.edge_index = {(u, v): e for e, (u, v) in enumerate(zip(src.tolist(), dst.tolist()))}
+        self.out_bits = [0] * (n_pairs + n_altruists)
+        self.in_bits = [0] * n_pairs
+        for u, v in self.edge_index:
+            self.out_bits[u] |= 1 << v
+            self.in_bits[v] |= 1 << u
+
+    @property
+    def n_edges(self):
+        return len(self.src)
+
+
+def _rank_within(groups, score):
+    """Rank of each edge by descending score among the edges sharing its group value (0 = best)."""
+    order = np.argsort(groups * 2.0 - score, kind='stable') # Scores lie in [0, 1]: groups stay apart
+    sorted_groups = groups[order]
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order)) - np.searchsorted(sorted_groups, sorted_groups, side='left')
+    return ranks
+
+
+def build_compatibility_graph(pairs, altruists, model, preprocessor, options, logger=None):
+    """
+    Compatibility digraph of a pool: pairs and altruistic donors are lists of dicts with the
+    /api/match_organs donor and recipient fields (REQUIRED_EXCHANGE_PAIR_FIELDS / REQUIRED_ALTRUIST_FIELDS).
+    Candidate edges (blood compatible, within max_hla_mismatches) are scored in batches: CIT is the
+    procurement time plus the transport estimate for the distance, viability comes from the model
+    (DEFAULT_GRAFT_SURVIVAL_PROB without one) and the score from calculate_pair_match_scores.
+    """
+    logger = logger or _default_logger
+    n_pairs, n_altruists = len(pairs), len(altruists)
+    donors = _columns(list(pairs) + list(altruists), DONOR_FIELDS)
+    recipients = _columns(pairs, RECIPIENT_FIELDS)
+
+    # Blood type compatibility over the distinct types, then the donor x recipient matrix from it
+    donor_types, donor_type_codes = np.unique(donors['donor_blood_type'].astype(str), return_inverse=True)
+    recipient_types, recipient_type_codes = np.unique(recipients['recipient_blood_type'].astype(str), return_inverse=True)
+    type_table = np.array([[check_blood_compatibility(d, r) for r in recipient_types] for d in donor_types],
+                          dtype=bool).reshape(len(donor_types), len(recipient_types))
+    compatible = type_table[donor_type_codes[:, None], recipient_type_codes[None, :]]
+    compatible[np.arange(n_pairs), np.arange(n_pairs)] = False # A pair's own donor is not an exchange
+    src, dst = np.nonzero(compatible)
+
+    donor_locations, donor_sites = _location_codes(donors, 'donor')
+    recipient_locations, recipient_sites = _location_codes(recipients, 'recipient')
+    site_distances = {}
+    max_cit = float(get_max_cold_ischemia_time(EXCHANGE_ORGAN_TYPE))
+
+    kept = []
+    for start in range(0, len(src), EXCHANGE_EDGE_CHUNK_ROWS):
+        u, v = src[start:start + EXCHANGE_EDGE_CHUNK_ROWS], dst[start:start + EXCHANGE_EDGE_CHUNK_ROWS]
+        edges = {key: values[u] for key, values in donors.items()}
+        edges.update({key: values[v] for key, values in recipients.items()})
+        hla_mismatches = count_pair_hla_mismatches(edges)
+        if options["max_hla_mismatches"] is not None:
+            within = hla_mismatches <= options["max_hla_mismatches"]
+            u, v, hla_mismatches = u[within], v[within], hla_mismatches[within]
+            edges = {key: values[within] for key, values in edges.items()}
+        if len(u) == 0:
+            continue
+
+        # Pools sit at a handful of centers: one distance per distinct pair of sites
+        site_pairs = donor_locations[u] * len(recipient_sites) + recipient_locations[v]
+        for code in np.unique(site_pairs).tolist():
+            if code not in site_distances:
+                d_center, d_lat, d_lon = donor_sites[code // len(recipient_sites)]
+                r_center, r_lat, r_lon = recipient_sites[code % len(recipient_sites)]
+                site_distances[code] = center_distance_km(d_center, float(d_lat), float(d_lon),
+                                                          r_center, float(r_lat), float(r_lon))
+        distances = np.array([site_distances[code] for code in site_pairs.tolist()], dtype=np.float64)
+        cit = EXCHANGE_PROCUREMENT_HOURS + estimate_transport_hours(distances)
+
+        probs = np.full(len(u), DEFAULT_GRAFT_SURVIVAL_PROB)
+        if model and preprocessor:
+            try:
+                probs = predict_graft_survival_batch(pd.DataFrame({
+                    'donor_age': edges['donor_age'].astype(np.float64),
+                    'organ_type': np.full(len(u), EXCHANGE_ORGAN_TYPE, dtype=object),
+                    'donor_comorbidities': edges['donor_comorbidities'].astype(np.int64),
+                    'cold_ischemia_time_hours': cit,
+                    'distance_km': np.where(np.isinf(distances), 9999.0, distances),
+                    'donor_blood_type': edges['donor_blood_type'], 'recipient_blood_type': edges['recipient_blood_type'],
+                    'hla_mismatches_count': hla_mismatches,
+                    'recipient_age': edges['recipient_age'].astype(np.float64),
+                    'recipient_comorbidities': edges['recipient_comorbidities'].astype(np.int64)
+                }, columns=VIABILITY_CACHE_FEATURES), model, preprocessor)
+            except Exception as e:
+                logger.error(f"Error predicting viability for exchange edges: {e}")
+                probs = np.zeros(len(u)) # Penalize on error, as in the API
+
+        scores = calculate_pair_match_scores(edges, probs, cit, np.full(len(u), max_cit), distances)
+        keep = (scores > 0) & (scores >= options["min_edge_score"])
+        kept.append((u[keep], v[keep], scores[keep], probs[keep], hla_mismatches[keep]))
+
+    if kept:
+        src, dst, score, probs, hla_mismatches = (np.concatenate(parts) for parts in zip(*kept))
+    else:
+        src = dst = hla_mismatches = np.zeros(0, dtype=np.int64)
+        score = probs = np.zeros(0)
+
+    if options["max_edges_per_vertex"] and len(src):
+        # Donor-side ranks alone would send every donor to the same few recipients: keep the best of both sides
+        k = options["max_edges_per_vertex"]
+        keep = (_rank_within(src, score) < k) | (_rank_within(dst, score) < k)
+        src, dst, score, probs, hla_mismatches = src[keep], dst[keep], score[keep], probs[keep], hla_mismatches[keep]
+    return CompatibilityGraph(n_pairs, n_altruists, src, dst, score, probs, hla_mismatches)
+
+
+def _bits(mask):
+    """Vertex indexes set in an int bitset, ascending."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def enumerate_cycles(graph, max_length, limit=EXCHANGE_MAX_STRUCTURES):
+    """
+    Every simple cycle of 2..max_length pairs, each once, as a tuple starting at its lowest vertex.
+    For a start s only vertices above s are used, and a path is only extended to vertices that can
+    reach s in the steps left (backward reachability sets computed per s).
+    """
+    cycles = []
+    if max_length < 2:
+        return cycles
+    out_bits, in_bits = graph.out_bits, graph.in_bits
+    for s in range(graph.n_pairs):
+        above = ((1 << graph.n_pairs) - 1) >> (s + 1) << (s + 1)
+        if not (out_bits[s] & above and in_bits[s] & above):
+            continue
+        # reaches_back[k]: vertices above s with a path to s of at most k edges
+        reaches_back = [0, in_bits[s] & above]
+        for _ in range(2, max_length):
+            frontier = reaches_back[-1]
+            for v in _bits(reaches_back[-1]):
+                frontier |= in_bits[v] & above
+            reaches_back.append(frontier)
+
+        stack = [(s, 1 << s, (s,))]
+        while stack:
+            u, visited, path = stack.pop()
+            if len(path) >= 2 and out_bits[u] >> s & 1:
+                cycles.append(path)
+                if len(cycles) > limit:
+                    raise KidneyExchangeError(f"More than {limit} cycles and chains: lower 'max_edges_per_vertex' or the "
+                                              f"length limits, or raise 'min_edge_score'.")
+            if len(path) < max_length:
+                for v in _bits(out_bits[u] & reaches_back[max_length - len(path)] & ~visited):
+                    stack.append((v, visited | 1 << v, path + (v,)))
+    return cycles
+
+
+def enumerate_chains(graph, max_length, limit=EXCHANGE_MAX_STRUCTURES):
+    """Every chain of 1..max_length transplants: (altruist vertex, pair, pair, ...) along simple paths."""
+    chains = []
+    if max_length < 1:
+        return chains
+    for a in range(graph.n_pairs, graph.n_pairs + graph.n_altruists):
+        stack = [(a, 0, (a,))]
+        while stack:
+            u, visited, path = stack.pop()
+            if len(path) > 1:
+                chains.append(path)
+                if len(chains) > limit:
+                    raise KidneyExchangeError(f"More than {limit} cycles and chains: lower 'max_edges_per_vertex' or the "
+                                              f"length limits, or raise 'min_edge_score'.")
+            if len(path) <= max_length:
+                for v in _bits(graph.out_bits[u] & ~visited):
+                    stack.append((v, visited | 1 << v, path + (v,)))
+    return chains
+
+
+def _structure_edges(structure, is_cycle):
+    steps = list(zip(structure, structure[1:]))
+    return steps + [(structure[-1], structure[0])] if is_cycle else steps
+
+
+def chain_edge_positions(graph, max_length):
+    """
+    Variables of the position-indexed chain formulation: (edge indexes, positions) for every edge that can
+    be the k-th transplant of a chain, i.e. leaves an altruistic donor (k = 1) or a pair that some
+    altruistic donor reaches in exactly k - 1 steps (k <= max_length).
+    """
+    pair_edges = np.flatnonzero(graph.src < graph.n_pairs)
+    frontier = np.flatnonzero(graph.src >= graph.n_pairs)
+    edges, positions = [], []
+    for position in range(1, max_length + 1):
+        if position > 1:
+            reached = np.zeros(graph.n_pairs, dtype=bool)
+            reached[graph.dst[frontier]] = True
+            frontier = pair_edges[reached[graph.src[pair_edges]]]
+        if len(frontier) == 0:
+            break
+        edges.append(frontier)
+        positions.append(np.full(len(frontier), position, dtype=np.int64))
+    if not edges:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(edges), np.concatenate(positions)
+
+
+def _solve_milp(graph, cycles, cycle_weights, chain_edges, chain_positions, edge_weights, max_chain_length, time_limit_s):
+    """
+    Integer program over cycle variables plus position-indexed chain edge variables: every vertex is used
+    at most once, and a pair donates at position k + 1 only if its recipient received at position k.
+    Returns (chosen cycle indexes, chains as vertex tuples, status), or None when no solution was found.
+    """
+    n_vertices = graph.n_pairs + graph.n_altruists
+    n_cycles, n_chain_vars = len(cycles), len(chain_edges)
+    rows, cols, values = [], [], []
+    if n_cycles:
+        rows.append(np.concatenate([np.asarray(c, dtype=np.int64) for c in cycles]))
+        cols.append(np.repeat(np.arange(n_cycles), [len(c) for c in cycles]))
+        values.append(np.ones(len(rows[-1])))
+    if n_chain_vars:
+        chain_src, chain_dst = graph.src[chain_edges], graph.dst[chain_edges]
+        chain_cols = n_cycles + np.arange(n_chain_vars)
+        first = chain_positions == 1
+        # Capacity: the recipient receives once, an altruistic donor gives once
+        rows += [chain_dst, chain_src[first]]
+        cols += [chain_cols, chain_cols[first]]
+        values += [np.ones(n_chain_vars), np.ones(int(first.sum()))]
+        # Flow, one row per (pair, position k < max_chain_length): out at k + 1 <= in at k
+        flow_row = lambda vertices, k: n_vertices + (k - 1) * graph.n_pairs + vertices
+        out_later, in_earlier = ~first, chain_positions < max_chain_length
+        rows += [flow_row(chain_src[out_later], chain_positions[out_later] - 1),
+                 flow_row(chain_dst[in_earlier], chain_positions[in_earlier])]
+        cols += [chain_cols[out_later], chain_cols[in_earlier]]
+        values += [np.ones(int(out_later.sum())), -np.ones(int(in_earlier.sum()))]
+
+    n_rows = n_vertices + max(max_chain_length - 1, 0) * graph.n_pairs
+    upper = np.concatenate([np.ones(n_vertices), np.zeros(n_rows - n_vertices)])
+    matrix = csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                        shape=(n_rows, n_cycles + n_chain_vars))
+    weights = np.concatenate([np.asarray(cycle_weights, dtype=np.float64), edge_weights[chain_edges]])
+    result = milp(-weights, integrality=np.ones(len(weights)), bounds=Bounds(0, 1),
+                  constraints=LinearConstraint(matrix, -np.inf, upper),
+                  options={"time_limit": time_limit_s, "mip_rel_gap": 1e-6})
+    if result.x is None:
+        return None
+
+    selected = result.x > 0.5
+    chosen_cycles = np.flatnonzero(selected[:n_cycles]).tolist()
+    next_vertex = {} # (vertex, position) -> recipient pair of the chain edge leaving it
+    for e, k in zip(chain_edges[selected[n_cycles:]].tolist(), chain_positions[selected[n_cycles:]].tolist()):
+        next_vertex[(int(graph.src[e]), k)] = int(graph.dst[e])
+    chains = []
+    for a in range(graph.n_pairs, n_vertices):
+        chain, k = [a], 1
+        while (chain[-1], k) in next_vertex:
+            chain.append(next_vertex[(chain[-1], k)])
+            k += 1
+        if len(chain) > 1:
+            chains.append(tuple(chain))
+    return chosen_cycles, chains, "optimal" if result.status == 0 else "time_limit"
+
+
+def _select_greedy(structures, weights, n_vertices):
+    """Takes structures by decreasing weight when none of their vertices is used yet."""
+    used = np.zeros(n_vertices, dtype=bool)
+    chosen = []
+    for i in np.argsort(-np.asarray(weights, dtype=np.float64), kind='stable').tolist():
+        members = list(structures[i][0])
+        if not used[members].any():
+            used[members] = True
+            chosen.append(structures[i])
+    return chosen
+
+
+def solve_exchange(pairs, altruists, model, preprocessor, options=None, logger=None):
+    """
+    Builds the compatibility graph of a pool and selects the best set of vertex-disjoint cycles and chains.
+    objective 'transplants' maximizes the number of transplants, then the total match score (each transplant
+    weighs 1 + score / (pool size + 1), so scores only break ties); 'score' maximizes the total match score.
+    With scipy, cycles are enumerated and chains are position-indexed edge variables of one integer
+    program; without it (or if the program finds nothing in time), chains are enumerated too and the
+    exchanges are taken greedily. Returns the selected exchanges and a summary.
+    """
+    options = normalize_exchange_options(options)
+    timings = {}
+    started = time.perf_counter()
+    graph = build_compatibility_graph(pairs, altruists, model, preprocessor, options, logger)
+    timings["graph_ms"] = (time.perf_counter() - started) * 1000
+    n_vertices = graph.n_pairs + graph.n_altruists
+    if options["objective"] == "transplants":
+        edge_weights = 1.0 + graph.score / (n_vertices + 1)
+    else:
+        edge_weights = graph.score.copy()
+
+    def structure_weight(structure, is_cycle):
+        return sum(edge_weights[graph.edge_index[edge]] for edge in _structure_edges(structure, is_cycle))
+
+    started = time.perf_counter()
+    cycles = enumerate_cycles(graph, options["max_cycle_length"])
+    cycle_weights = [structure_weight(c, True) for c in cycles]
+    timings["enumeration_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    solution = None
+    if milp is not None:
+        chain_edges, chain_positions = chain_edge_positions(graph, options["max_chain_length"])
+        chain_candidates = len(chain_edges)
+        if cycles or chain_candidates:
+            solution = _solve_milp(graph, cycles, cycle_weights, chain_edges, chain_positions, edge_weights,
+                                   options["max_chain_length"], options["time_limit_s"])
+        else:
+            solution = [], [], "optimal"
+    if solution is not None:
+        chosen_cycles, chains, status = solution
+        selected = [(cycles[i], True) for i in chosen_cycles] + [(chain, False) for chain in chains]
+        solver = "milp"
+    else:
+        chains = enumerate_chains(graph, options["max_chain_length"], EXCHANGE_MAX_STRUCTURES - len(cycles))
+        chain_candidates = len(chains)
+        structures = [(c, True) for c in cycles] + [(c, False) for c in chains]
+        selected = _select_greedy(structures, cycle_weights + [structure_weight(c, False) for c in chains], n_vertices)
+        solver, status = "greedy", "heuristic"
+    timings["solver_ms"] = (time.perf_counter() - started) * 1000
+
+    pair_ids = [pair['pair_id'] for pair in pairs]
+    altruist_ids = [donor['donor_id'] for donor in altruists]
+    exchanges = []
+    for structure, is_cycle in selected:
+        transplants = []
+        for u, v in _structure_edges(structure, is_cycle):
+            e = graph.edge_index[(u, v)]
+            transplants.append({
+                "donor": pair_ids[u] if u < graph.n_pairs else altruist_ids[u - graph.n_pairs],
+                "donor_is_altruistic": u >= graph.n_pairs,
+                "recipient_pair_id": pair_ids[v],
+                "match_score": float(graph.score[e]),
+                "predicted_graft_survival_prob": float(graph.graft_survival_prob[e]),
+                "hla_mismatches": int(graph.hla_mismatches[e]),
+            })
+        exchange = {"type": "cycle" if is_cycle else "chain", "transplants": transplants,
+                    "total_match_score": sum(t["match_score"] for t in transplants)}
+        if not is_cycle:
+            exchange["altruistic_donor_id"] = altruist_ids[structure[0] - graph.n_pairs]
+            exchange["bridge_donor_pair_id"] = pair_ids[structure[-1]]
+        exchanges.append(exchange)
+    exchanges.sort(key=lambda x: (-len(x["transplants"]), -x["total_match_score"]))
+
+    return {
+        "exchanges": exchanges,
+        "summary": {
+            "pairs": graph.n_pairs, "altruistic_donors": graph.n_altruists, "edges": graph.n_edges,
+            "cycles_considered": len(cycles),
+            "chain_candidates": chain_candidates, # Chain edge variables (milp) or enumerated chains (greedy)
+            "transplants": sum(len(x["transplants"]) for x in exchanges),
+            "total_match_score": sum(x["total_match_score"] for x in exchanges),
+            "solver": solver, "status": status, "options": options, "timings": timings,
+        }
+    }
@@ -0,0 +1,293 @@
+# hopeconnect-ai/src/matching_engine/match_jobs.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+# Asynchronous jobs for match runs and batch predictions that can outlive an HTTP request. A job is
+# submitted, runs on a bounded thread pool and writes its result entries to a local SQLite file, from
+# where they are read back in pages. Jobs and results survive restarts: jobs that were queued or running
+# when the process stopped are run again on the next start. Identical in-flight submissions share a job.
+
+MATCH_JOBS_DB_PATH = os.environ.get('MATCH_JOBS_DB_PATH', os.path.join(PROJECT_ROOT, 'data', 'jobs', 'match_jobs.sqlite3'))
+MATCH_JOB_WORKERS = int(os.environ.get('MATCH_JOB_WORKERS', 2))
+MAX_QUEUED_MATCH_JOBS = int(os.environ.get('MAX_QUEUED_MATCH_JOBS', 100))
+MATCH_JOB_RETENTION_HOURS = float(os.environ.get('MATCH_JOB_RETENTION_HOURS', 24))
+MAX_JOB_WAIT_SECONDS = 30 # Upper bound for long-poll waits
+DEFAULT_RESULTS_PAGE_SIZE = 100
+MAX_RESULTS_PAGE_SIZE = 1000
+RESULT_WRITE_CHUNK = 1000 # Result entries inserted per transaction (cancellation is checked in between)
+
+ACTIVE_JOB_STATUSES = ("queued", "running")
+FINISHED_JOB_STATUSES = ("succeeded", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload_hash TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result_count INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_hash ON jobs (payload_hash, status);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+
+class MatchJobError(ValueError):
+    """Raised for submissions that cannot be accepted (unknown kind, queue full)."""
+
+
+class JobQueueFull(MatchJobError):
+    """Raised when MAX_QUEUED_MATCH_JOBS jobs are already queued or running."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested."""
+
+
+class MatchJobStore:
+    """SQLite persistence for jobs and their result entries. One connection shared under a lock."""
+
+    def __init__(self, db_path=MATCH_JOBS_DB_PATH):
+        self.db_path = db_path
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _execute(self, sql, params=()):
+        """Runs a statement; returns the number of rows changed."""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _fetchall(self, sql, params=()):
+        with self._lock: # Rows are fetched under the lock too: the connection is shared across threads
+            return self._conn.execute(sql, params).fetchall()
+
+    def insert(self, job_id, kind, payload_hash, payload_json):
+        self._execute("INSERT INTO jobs (job_id, kind, payload_hash, payload, status, submitted_at) "
+                      "VALUES (?, ?, ?, ?, 'queued', ?)", (job_id, kind, payload_hash, payload_json, time.time()))
+
+    def find_active(self, payload_hash):
+        rows = self._fetchall("SELECT job_id FROM jobs WHERE payload_hash = ? AND status IN ('queued', 'running') "
+                              "ORDER BY submitted_at LIMIT 1", (payload_hash,))
+        return rows[0]["job_id"] if rows else None
+
+    def get(self, job_id):
+        rows = self._fetchall("SELECT job_id, kind, status, cancel_requested, submitted_at, started_at, finished_at, "
+                              "result_count, error FROM jobs WHERE job_id = ?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    def payload(self, job_id):
+        rows = self._fetchall("SELECT kind, payload FROM jobs WHERE job_id = ?", (job_id,))
+        return (rows[0]["kind"], json.loads(rows[0]["payload"])) if rows else (None, None)
+
+    def count_active(self):
+        return self._fetchall("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')")[0][0]
+
+    def counts_by_status(self):
+        return {row[0]: row[1] for row in self._fetchall("SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+
+    def active_job_ids(self):
+        return [row[0] for row in self._fetchall(
+            "SELECT job_id FROM jobs WHERE status IN ('queued', 'running') ORDER BY submitted_at")]
+
+    def claim(self, job_id):
+        """queued -> running. False if the job was cancelled (or claimed) in the meantime."""
+        return self._execute("UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ? AND status = 'queued'",
+                             (time.time(), job_id)) == 1
+
+    def requeue_interrupted(self):
+        """Jobs left 'running' by a previous process lost their work; they start again from 'queued'."""
+        self._execute("DELETE FROM job_results WHERE job_id IN (SELECT job_id FROM jobs WHERE status = 'running')")
+        self._execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        self._execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE status = 'queued' AND cancel_requested = 1",
+                      (time.time(),))
+
+    def request_cancel(self, job_id):
+        """Cancels a queued job at once; a running job is flagged and stops at its next checkpoint."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+                               "WHERE job_id = ? AND status = 'queued'", (time.time(), job_id))
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,))
+
+    def cancel_requested(self, job_id):
+        rows = self._fetchall("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,))
+        return bool(rows and rows[0][0])
+
+    def write_results(self, job_id, start_position, results):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO job_results (job_id, position, result) VALUES (?, ?, ?)",
+                                   ((job_id, start_position + i, json.dumps(r)) for i, r in enumerate(results)))
+            self._conn.execute("COMMIT")
+
+    def finish(self, job_id, status, result_count=None, error=None):
+        with self._lock:
+            if status != "succeeded": # Partial results of failed/cancelled jobs are not served
+                self._conn.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+            self._conn.execute("UPDATE jobs SET status = ?, finished_at = ?, result_count = ?, error = ? WHERE job_id = ?",
+                               (status, time.time(), result_count, error, job_id))
+
+    def results(self, job_id, offset, limit):
+        rows = self._fetchall("SELECT result FROM job_results WHERE job_id = ? AND position >= ? ORDER BY position LIMIT ?",
+                              (job_id, offset, limit))
+        return [json.loads(row[0]) for row in rows]
+
+    def purge_finished(self, older_than):
+        with self._lock:
+            self._conn.execute("DELETE FROM job_results WHERE job_id IN (SELECT job_id FROM jobs WHERE "
+                               "status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?)", (older_than,))
+            self._conn.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?",
+                               (older_than,))
+
+
+class RunningJob:
+    """Handed to a job runner: checkpoint() raises JobCancelled once the job has been cancelled."""
+
+    def __init__(self, job_id, store):
+        self.job_id = job_id
+        self._store = store
+
+    def checkpoint(self):
+        if self._store.cancel_requested(self.job_id):
+            raise JobCancelled(self.job_id)
+
+
+class MatchJobManager:
+    """
+    Runs jobs from a MatchJobStore on a bounded worker pool. `runners` maps a job kind to
+    runner(payload, running_job) -> iterable of JSON-serializable result entries; the runner calls
+    running_job.checkpoint() between units of work so cancellation takes effect mid-job.
+    """
+
+    def __init__(self, runners, store=None, workers=MATCH_JOB_WORKERS, max_queued=MAX_QUEUED_MATCH_JOBS,
+                 retention_hours=MATCH_JOB_RETENTION_HOURS, logger=None):
+        self.runners = runners
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_hours * 3600
+        self.logger = logger
+        self._executor = None
+        self._lock = threading.Lock()
+        self._status_changed = threading.Condition()
+
+    def start(self):
+        """Opens the store and re-submits jobs interrupted by a restart. Idempotent; called lazily."""
+        with self._lock:
+            if self._executor is not None:
+                return
+            if self.store is None:
+                self.store = MatchJobStore()
+            self.store.requeue_interrupted()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='match-job')
+            for job_id in self.store.active_job_ids():
+                self._executor.submit(self._run, job_id)
+
+    def submit(self, kind, payload):
+        """Returns (job status dict, deduplicated). Identical queued/running submissions return the existing job."""
+        if kind not in self.runners:
+            raise MatchJobError(f"Unknown job kind '{kind}'. Expected one of: {', '.join(self.runners)}.")
+        self.start()
+        payload_json = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        payload_hash = hashlib.sha256(f"{kind}\n{payload_json}".encode('utf-8')).hexdigest()
+        with self._lock:
+            existing = self.store.find_active(payload_hash)
+            if existing:
+                return self.store.get(existing), True
+            if self.store.count_active() >= self.max_queued:
+                raise JobQueueFull(f"Too many queued jobs ({self.max_queued}). Retry later.")
+            self.store.purge_finished(time.time() - self.retention_seconds)
+            job_id = uuid.uuid4().hex
+            self.store.insert(job_id, kind, payload_hash, payload_json)
+            self._executor.submit(self._run, job_id)
+        return self.store.get(job_id), False
+
+    def _notify(self):
+        with self._status_changed:
+            self._status_changed.notify_all()
+
+    def _run(self, job_id):
+        if not self.store.claim(job_id):
+            return
+        self._notify()
+        kind, payload = self.store.payload(job_id)
+        running_job = RunningJob(job_id, self.store)
+        count = 0
+        try:
+            chunk = []
+            for result in self.runners[kind](payload, running_job):
+                chunk.append(result)
+                if len(chunk) >= RESULT_WRITE_CHUNK:
+                    running_job.checkpoint()
+                    self.store.write_results(job_id, count, chunk)
+                    count += len(chunk)
+                    chunk = []
+            running_job.checkpoint()
+            if chunk:
+                self.store.write_results(job_id, count, chunk)
+                count += len(chunk)
+            self.store.finish(job_id, "succeeded", result_count=count)
+        except JobCancelled:
+            self.store.finish(job_id, "cancelled")
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Match job {job_id} ({kind}) failed: {e}")
+            self.store.finish(job_id, "failed", error=str(e))
+        self._notify()
+
+    def get(self, job_id, wait_seconds=0):
+        """Job status; with wait_seconds > 0, blocks until the job is finished or the wait runs out (long poll)."""
+        self.start()
+        deadline = time.monotonic() + min(max(wait_seconds, 0), MAX_JOB_WAIT_SECONDS)
+        with self._status_changed:
+            while True:
+                job = self.store.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINISHED_JOB_STATUSES or remaining <= 0:
+                    return job
+                self._status_changed.wait(remaining)
+
+    def cancel(self, job_id):
+        self.start()
+        self.store.request_cancel(job_id)
+        self._notify()
+        return self.store.get(job_id)
+
+    def results(self, job_id, offset=0, limit=DEFAULT_RESULTS_PAGE_SIZE):
+        self.start()
+        return self.store.results(job_id, max(offset, 0), min(max(limit, 1), MAX_RESULTS_PAGE_SIZE))
+
+    def stats(self):
+        self.start()
+        return {"workers": self.workers, "max_queued": self.max_queued, "db_path": self.store.db_path,
+                "jobs_by_status": self.store.counts_by_status()}
@@ -0,0 +1,403 @@
+# hopeconnect-ai/src/matching_engine/match_pipeline.py
+
+import logging
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.weighted_scorer import calculate_match_score, explain_match_score
+from src.matching_engine.center_distances import center_distance_km
+from src.matching_engine.preprocessor import calculate_hla_mismatch
+from src.matching_engine.columnar_scorer import (
+    calculate_match_scores, compute_pair_distances_km, count_hla_mismatches, calculate_pair_match_scores,
+    count_pair_hla_mismatches, DONOR_HLA_KEYS, RECIPIENT_HLA_KEYS
+)
+from src.matching_engine.fused_scorer import fused_match_scores, FUSED_MATCH_SCORER
+from src.prediction_models.viability_predictor import (
+    predict_graft_survival, predict_graft_survival_batch, get_max_cold_ischemia_time
+)
+from src.prediction_models.prediction_cache import VIABILITY_CACHE_FEATURES
+from src.utils.arrow_io import null_mask
+
+# Per-pair steps of /api/match_organs, shared by the request handler and stateful offer sessions.
+
+REQUIRED_ORGAN_FIELDS = ['organ_type', 'donor_age', 'donor_blood_type',
+                         'donor_hla_a1', 'donor_hla_a2', 'donor_hla_b1', 'donor_hla_b2',
+                         'donor_location_lat', 'donor_location_lon']
+REQUIRED_RECIPIENT_FIELDS = ['recipient_age', 'recipient_blood_type',
+                             'recipient_hla_a1', 'recipient_hla_a2', 'recipient_hla_b1', 'recipient_hla_b2',
+                             'recipient_location_lat', 'recipient_location_lon', 'urgency_score']
+
+DEFAULT_GRAFT_SURVIVAL_PROB = 0.5
+DEFAULT_EXPLAIN_TOP_K = 10
+MAX_EXPLAIN_TOP_K = 1000
+
+_default_logger = logging.getLogger(__name__)
+
+
+def missing_recipient_fields(recipient_info):
+    return [field for field in REQUIRED_RECIPIENT_FIELDS if field not in recipient_info]
+
+
+def parse_estimated_cit(estimated_cit_str, recipient_id, logger=None):
+    """Parses a logistics CIT value; returns None if absent or malformed."""
+    logger = logger or _default_logger
+    if estimated_cit_str is None:
+        return None
+    try:
+        return float(estimated_cit_str)
+    except (ValueError, TypeError): # Malformed strings, and lists/objects sent as CIT
+        logger.warning(f"Invalid CIT format '{estimated_cit_str}' for recipient {recipient_id}. Treating as unknown.")
+        return None
+
+
+def build_viability_input(organ_info, recipient_info, estimated_cit):
+    """Feature row for the viability model; raises ValueError on non-numeric fields."""
+    donor_hlas_list = [organ_info.get(f'donor_hla_{la}{n}', '') for la in ['a','b'] for n in ['1','2']]
+    rec_hlas_list = [recipient_info.get(f'recipient_hla_{la}{n}', '') for la in ['a','b'] for n in ['1','2']]
+    hla_mismatches_count = calculate_hla_mismatch(donor_hlas_list, rec_hlas_list)
+
+    dist_km = center_distance_km(
+        organ_info.get('donor_center_id'), float(organ_info['donor_location_lat']), float(organ_info['donor_location_lon']),
+        recipient_info.get('recipient_center_id'),
+        float(recipient_info['recipient_location_lat']), float(recipient_info['recipient_location_lon'])
+    )
+    dist_km = 9999.0 if dist_km == np.inf else float(dist_km)
+
+    return {
+        'donor_age': float(organ_info['donor_age']), 'organ_type': organ_info['organ_type'],
+        'donor_comorbidities': int(organ_info['donor_comorbidities']),
+        'cold_ischemia_time_hours': float(estimated_cit), 'distance_km': dist_km,
+        'donor_blood_type': organ_info['donor_blood_type'],
+        'recipient_blood_type': recipient_info['recipient_blood_type'],
+        'hla_mismatches_count': int(hla_mismatches_count),
+        'recipient_age': float(recipient_info['recipient_age']),
+        'recipient_comorbidities': int(recipient_info['recipient_comorbidities'])
+    }
+
+
+def _default_viability(recipient_id, estimated_cit, logger):
+    if estimated_cit is None:
+        logger.warning(f"Estimated CIT not available for recipient {recipient_id}. Using default viability (0.5).")
+    else: # Models not loaded
+        logger.warning(f"Viability model/preprocessor not available. Using default viability (0.5) for {recipient_id}.")
+    return DEFAULT_GRAFT_SURVIVAL_PROB
+
+
+def predict_pair_viability(organ_info, recipient_info, recipient_id, estimated_cit, model, preprocessor, logger=None,
+                           cache=None):
+    """
+    Graft survival probability for one pair.
+    Defaults to 0.5 when CIT is unknown or models are not loaded; 0.0 if the data cannot be scored.
+    With a ViabilityPredictionCache, a previously seen feature row is not re-evaluated.
+    """
+    logger = logger or _default_logger
+    if not (model and preprocessor and estimated_cit is not None):
+        return _default_viability(recipient_id, estimated_cit, logger)
+    if cache is not None:
+        return predict_pairs_viability(organ_info, [(recipient_id, recipient_info, estimated_cit)],
+                                       model, preprocessor, cache, logger)[0]
+
+    try:
+        viability_input_df = pd.DataFrame([build_viability_input(organ_info, recipient_info, estimated_cit)])
+        return predict_graft_survival(viability_input_df, model, preprocessor)
+    except ValueError as ve:
+        logger.error(f"ValueError preparing data or predicting viability for {recipient_id}: {ve}")
+        return 0.0 # Penalize if data is bad for prediction
+    except Exception as e:
+        logger.error(f"Error predicting viability for recipient {recipient_id}: {e}")
+        return 0.0 # Penalize on generic error
+
+
+def predict_pairs_viability(organ_info, pairs, model, preprocessor, cache, logger=None):
+    """
+    Batch form of predict_pair_viability for [(recipient_id, recipient_info, estimated_cit), ...].
+    Identical feature rows are evaluated once and remembered in `cache` (a ViabilityPredictionCache);
+    results, defaults and per-pair error handling are the same as calling predict_pair_viability per pair.
+    """
+    logger = logger or _default_logger
+    probs = [None] * len(pairs)
+    rows, row_slots = [], []
+    for i, (recipient_id, recipient_info, estimated_cit) in enumerate(pairs):
+        if not (model and preprocessor and estimated_cit is not None):
+            probs[i] = _default_viability(recipient_id, estimated_cit, logger)
+            continue
+        try:
+            rows.append(build_viability_input(organ_info, recipient_info, estimated_cit))
+            row_slots.append(i)
+        except ValueError as ve:
+            logger.error(f"ValueError preparing data or predicting viability for {recipient_id}: {ve}")
+            probs[i] = 0.0 # Penalize if data is bad for prediction
+        except Exception as e:
+            logger.error(f"Error predicting viability for recipient {recipient_id}: {e}")
+            probs[i] = 0.0
+
+    def log_row_error(index, error):
+        logger.error(f"Error predicting viability for recipient {pairs[row_slots[index]][0]}: {error}")
+
+    for slot, prob in zip(row_slots, cache.predict_rows(rows, model, preprocessor, on_error=log_row_error)):
+        probs[slot] = 0.0 if prob is None else prob # Penalize on prediction error
+    return probs
+
+
+def build_match_result(organ_info, recipient_info, recipient_id, graft_survival_prob, estimated_cit,
+                       recipient_components=None, donor_components=None):
+    """Scores one pair and returns the /api/match_organs result entry."""
+    max_cit = get_max_cold_ischemia_time(organ_info['organ_type'])
+    effective_cit_for_score = (max_cit + 1.0) if estimated_cit is None else float(estimated_cit)
+
+    score = calculate_match_score(
+        organ_data=organ_info, recipient_data=recipient_info,
+        graft_survival_prob=float(graft_survival_prob),
+        estimated_cold_ischemia_hours=effective_cit_for_score,
+        max_allowable_cold_ischemia=float(max_cit),
+        recipient_components=recipient_components,
+        donor_components=donor_components
+    )
+
+    return {
+        "recipient_id": recipient_id, "score": float(score),
+        "details": {
+            "predicted_graft_survival_prob": float(graft_survival_prob),
+            "estimated_cold_ischemia_hours": float(estimated_cit) if estimated_cit is not None else "N/A",
+            "max_allowable_cold_ischemia_hours": float(max_cit)
+        }
+    }
+
+
+def explain_match_pairs(organ_info, pairs, model, preprocessor, cache, logger=None):
+    """
+    Explanations for scored pairs [(recipient_info, estimated_cit, graft_survival_prob)]:
+    {"score_components": explain_match_score breakdown, "viability": per-feature contributions or None}.
+    Viability contributions come from one batched call through `cache` (a ViabilityPredictionCache), so
+    repeated explanations of the same feature row are not recomputed. None when no model prediction
+    was made for the pair (unknown CIT, models not loaded) or the row cannot be explained.
+    """
+    logger = logger or _default_logger
+    max_cit = float(get_max_cold_ischemia_time(organ_info['organ_type']))
+    explanations, rows, row_slots = [], [], []
+    for slot, (recipient_info, estimated_cit, graft_survival_prob) in enumerate(pairs):
+        effective_cit = (max_cit + 1.0) if estimated_cit is None else float(estimated_cit)
+        explanations.append({
+            "score_components": explain_match_score(organ_info, recipient_info, float(graft_survival_prob),
+                                                    effective_cit, max_cit),
+            "viability": None
+        })
+        if model and preprocessor and estimated_cit is not None:
+            try:
+                rows.append(build_viability_input(organ_info, recipient_info, estimated_cit))
+                row_slots.append(slot)
+            except (ValueError, TypeError) as e:
+                logger.error(f"Cannot explain viability for recipient {recipient_info.get('recipient_id')}: {e}")
+    if rows:
+        try:
+            viability = cache.explain_frame(pd.DataFrame(rows, columns=VIABILITY_CACHE_FEATURES), model, preprocessor)
+            for slot, explanation in zip(row_slots, viability):
+                explanations[slot]["viability"] = explanation
+        except Exception as e:
+            logger.error(f"Error explaining viability predictions: {e}")
+    return explanations
+
+
+def missing_fields_result(recipient_id, missing_fields):
+    return {
+        "recipient_id": recipient_id, "score": 0.0,
+        "error": f"Missing fields for recipient: {', '.join(missing_fields)}"
+    }
+
+
+def prepare_recipient_columns(organ_info, recipients, n, model, preprocessor, cache, logger=None):
+    """
+    Weight-independent inputs of the columnar score for one organ over `n` recipients given as
+    {field: numpy array} (the JSON recipient fields, plus an optional 'estimated_cold_ischemia_hours'
+    column): distances, and viability predicted in one batch through `cache` (a ViabilityPredictionCache).
+    Returns {"graft_survival_probs", "cit", "max_cit", "distances", "valid", "missing_matrix"}, in input order.
+    """
+    logger = logger or _default_logger
+    missing_matrix = np.column_stack([null_mask(recipients[f]) for f in REQUIRED_RECIPIENT_FIELDS])
+    valid = ~missing_matrix.any(axis=1)
+    comorbidities = recipients.get('recipient_comorbidities', np.zeros(n))
+    # Scored as given (float, like the JSON path); only the viability input is truncated to int
+    recipients['recipient_comorbidities'] = np.where(null_mask(comorbidities), 0, comorbidities).astype(np.float64)
+
+    cit = np.asarray(recipients.get('estimated_cold_ischemia_hours', np.full(n, np.nan)), dtype=np.float64)
+    max_cit = float(get_max_cold_ischemia_time(organ_info['organ_type']))
+    distances = compute_pair_distances_km(organ_info, recipients)
+
+    graft_survival_probs = np.full(n, 0.5)
+    predictable = valid & ~np.isnan(cit)
+    if model and preprocessor and predictable.any():
+        try:
+            viability_input_df = pd.DataFrame({
+                'donor_age': float(organ_info['donor_age']), 'organ_type': organ_info['organ_type'],
+                'donor_comorbidities': int(organ_info['donor_comorbidities']),
+                'cold_ischemia_time_hours': cit[predictable],
+                'distance_km': np.where(np.isinf(distances), 9999.0, distances)[predictable],
+                'donor_blood_type': organ_info['donor_blood_type'],
+                'recipient_blood_type': recipients['recipient_blood_type'][predictable],
+                'hla_mismatches_count': count_hla_mismatches(organ_info, recipients)[predictable],
+                'recipient_age': recipients['recipient_age'][predictable].astype(np.float64),
+                'recipient_comorbidities': recipients['recipient_comorbidities'][predictable].astype(np.int64)
+            })
+            graft_survival_probs[predictable] = cache.predict_frame(viability_input_df, model, preprocessor)
+        except Exception as e:
+            logger.error(f"Error predicting viability for columnar batch: {e}")
+            graft_survival_probs[predictable] = 0.0 # Penalize on error, as in the JSON path
+    elif not (model and preprocessor):
+        logger.warning("Viability model/preprocessor not available. Using default viability (0.5) for columnar batch.")
+
+    return {"graft_survival_probs": graft_survival_probs, "cit": cit, "max_cit": max_cit, "distances": distances,
+            "valid": valid, "missing_matrix": missing_matrix}
+
+
+def score_recipient_columns(organ_info, recipients, n, model, preprocessor, cache, logger=None):
+    """
+    Columnar /api/match_organs for one organ over `n` recipients (see prepare_recipient_columns).
+    Scores equal the per-pair path.
+    Returns {"scores", "graft_survival_probs", "cit", "max_cit", "valid", "missing_matrix"}, in input order.
+    """
+    prepared = prepare_recipient_columns(organ_info, recipients, n, model, preprocessor, cache, logger)
+    score_fn = fused_match_scores if FUSED_MATCH_SCORER != 'off' else calculate_match_scores # Identical scores
+    scores = score_fn(organ_info, recipients, prepared["graft_survival_probs"], prepared["cit"], prepared["max_cit"],
+                      prepared.pop("distances"))
+    scores[~prepared["valid"]] = 0.0
+    return dict(prepared, scores=scores)
+
+
+def recipient_columns_from_records(recipients_list, recipient_ids, logistics_info, logger=None):
+    """
+    JSON recipient dicts (+ the logistics map) -> {field: numpy array} for score_recipient_columns.
+    Absent required fields become None columns, so those recipients are reported as missing fields.
+    """
+    logger = logger or _default_logger
+    n = len(recipients_list)
+    frame = pd.DataFrame([r if isinstance(r, dict) else {} for r in recipients_list])
+    recipients = {column: frame[column].to_numpy() for column in frame.columns}
+    for field in missing_recipient_fields(recipients):
+        recipients[field] = np.full(n, None, dtype=object)
+    recipients['estimated_cold_ischemia_hours'] = np.array(
+        [parse_estimated_cit(logistics_info.get(rid, {}).get("estimated_cold_ischemia_hours"), rid, logger)
+         for rid in recipient_ids], dtype=np.float64) # None -> NaN
+    return recipients
+
+
+def iter_ranked_match_results(recipient_ids, scored):
+    """
+    /api/match_organs result entries, best first, from score_recipient_columns output. Entries are
+    built one at a time while iterating, so callers can stream them. Ties keep input order.
+    """
+    scores, probs, cit = scored["scores"], scored["graft_survival_probs"], scored["cit"]
+    valid, missing_matrix, max_cit = scored["valid"], scored["missing_matrix"], scored["max_cit"]
+    for i in np.argsort(-scores, kind='stable').tolist(): # Same tie order as sorted(..., reverse=True)
+        if not valid[i]:
+            missing_fields = [f for f, is_missing in zip(REQUIRED_RECIPIENT_FIELDS, missing_matrix[i]) if is_missing]
+            yield {"recipient_id": recipient_ids[i], "score": 0.0,
+                   "error": f"Missing fields for recipient: {', '.join(missing_fields)}"}
+            continue
+        est_cit = float(cit[i])
+        yield {
+            "recipient_id": recipient_ids[i], "score": float(scores[i]),
+            "details": {
+                "predicted_graft_survival_prob": float(probs[i]),
+                "estimated_cold_ischemia_hours": est_cit if est_cit == est_cit else "N/A",
+                "max_allowable_cold_ischemia_hours": max_cit
+            }
+        }
+
+
+REQUIRED_PAIR_FIELDS = ['organ_type', 'donor_age', 'donor_blood_type', 'recipient_age', 'recipient_blood_type']
+
+
+def score_pair_frame(pairs, model, preprocessor, cache=None, logger=None):
+    """
+    Scores rows that each hold one donor x recipient pair (historical transplant records) with the
+    /api/match_organs engine: batch viability prediction, then calculate_pair_match_scores.
+    'cold_ischemia_time_hours' is the CIT; 'distance_km' is used when present, otherwise the distance
+    comes from the donor/recipient coordinates. Missing comorbidities count as 0 and missing urgency as
+    0.5, as in the API. Rows missing a REQUIRED_PAIR_FIELDS value get NaN scores and an 'error'.
+    Returns a DataFrame aligned with `pairs`.
+    """
+    logger = logger or _default_logger
+    n = len(pairs)
+    columns = {c: pairs[c].to_numpy() for c in pairs.columns}
+    for key in DONOR_HLA_KEYS + RECIPIENT_HLA_KEYS:
+        columns[key] = pairs[key].fillna('').astype(str).to_numpy(dtype=object) if key in pairs else np.full(n, '', dtype=object)
+    for key in ('donor_comorbidities', 'recipient_comorbidities'):
+        columns[key] = pairs[key].fillna(0).to_numpy(dtype=np.float64) if key in pairs else np.zeros(n)
+    columns['urgency_score'] = pairs['urgency_score'].fillna(0.5).to_numpy(dtype=np.float64) if 'urgency_score' in pairs else np.full(n, 0.5)
+
+    missing_matrix = np.column_stack([pairs[f].isna().to_numpy() if f in pairs else np.ones(n, dtype=bool)
+                                      for f in REQUIRED_PAIR_FIELDS])
+    valid = ~missing_matrix.any(axis=1)
+
+    cit = pd.to_numeric(pairs['cold_ischemia_time_hours'], errors='coerce').to_numpy(dtype=np.float64) \
+        if 'cold_ischemia_time_hours' in pairs else np.full(n, np.nan)
+    organ_types = pairs['organ_type'].astype(object).to_numpy() if 'organ_type' in pairs else np.full(n, None, dtype=object)
+    max_cit_by_type = {t: float(get_max_cold_ischemia_time(t)) for t in pd.unique(organ_types)}
+    max_cit = np.array([max_cit_by_type[t] for t in organ_types], dtype=np.float64)
+
+    distances = pd.to_numeric(pairs['distance_km'], errors='coerce').to_numpy(dtype=np.float64) \
+        if 'distance_km' in pairs else np.full(n, np.nan)
+    for i in np.flatnonzero(np.isnan(distances)).tolist():
+        distances[i] = center_distance_km(*(_optional(columns, f, i) for f in (
+            'donor_center_id', 'donor_location_lat', 'donor_location_lon',
+            'recipient_center_id', 'recipient_location_lat', 'recipient_location_lon')))
+
+    graft_survival_probs = np.full(n, DEFAULT_GRAFT_SURVIVAL_PROB)
+    predictable = valid & ~np.isnan(cit)
+    if model and preprocessor and predictable.any():
+        try:
+            viability_input_df = pd.DataFrame({
+                'donor_age': columns['donor_age'][predictable].astype(np.float64),
+                'organ_type': organ_types[predictable],
+                'donor_comorbidities': columns['donor_comorbidities'][predictable].astype(np.int64),
+                'cold_ischemia_time_hours': cit[predictable],
+                'distance_km': np.where(np.isinf(distances), 9999.0, distances)[predictable],
+                'donor_blood_type': columns['donor_blood_type'][predictable],
+                'recipient_blood_type': columns['recipient_blood_type'][predictable],
+                'hla_mismatches_count': count_pair_hla_mismatches(columns)[predictable],
+                'recipient_age': columns['recipient_age'][predictable].astype(np.float64),
+                'recipient_comorbidities': columns['recipient_comorbidities'][predictable].astype(np.int64)
+            })
+            graft_survival_probs[predictable] = (
+                cache.predict_frame(viability_input_df, model, preprocessor) if cache is not None
+                else predict_graft_survival_batch(viability_input_df, model, preprocessor))
+        except Exception as e:
+            logger.error(f"Error predicting viability for pair batch: {e}")
+            graft_survival_probs[predictable] = 0.0 # Penalize on error, as in the API
+    elif not (model and preprocessor):
+        logger.warning("Viability model/preprocessor not available. Using default viability (0.5) for pair batch.")
+
+    scores = np.full(n, np.nan)
+    if valid.any():
+        scores[valid] = calculate_pair_match_scores(
+            {k: v[valid] for k, v in columns.items()}, graft_survival_probs[valid],
+            np.where(np.isnan(cit), max_cit + 1.0, cit)[valid], max_cit[valid], distances[valid])
+
+    errors = np.full(n, None, dtype=object)
+    for i in np.flatnonzero(~valid):
+        errors[i] = f"Missing fields: {', '.join(f for f, m in zip(REQUIRED_PAIR_FIELDS, missing_matrix[i]) if m)}"
+    return pd.DataFrame({
+        "predicted_graft_survival_prob": np.where(valid, graft_survival_probs, np.nan),
+        "match_score": scores,
+        "estimated_cold_ischemia_hours": cit,
+        "max_allowable_cold_ischemia_hours": max_cit,
+        "distance_km": distances,
+        "error": errors
+    }, index=pairs.index)
+
+
+def _optional(columns, field, i):
+    """Row value of an optional column, None when absent or null (what calculate_distance_km expects)."""
+    if field not in columns:
+        return None
+    value = columns[field][i]
+    return None if value is None or (isinstance(value, float) and value != value) else value
+
@@ -0,0 +1,306 @@
+# hopeconnect-ai/src/matching_engine/offer_session.py
+
+import threading
+import time
+import uuid
+from sortedcontainers import SortedList
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.match_pipeline import (
+    missing_recipient_fields, missing_fields_result, parse_estimated_cit,
+    predict_pair_viability, predict_pairs_viability, build_match_result, build_viability_input
+)
+from src.prediction_models.prediction_cache import ViabilityPredictionCache
+
+# Stateful offer sessions: an open organ offer is scored once, then kept up to date with small
+# deltas (CIT changes, withdrawals, urgency changes, late additions). Only the affected pair is
+# re-predicted/re-scored and the ranking is a sorted index, so each delta costs O(log n).
+
+OFFER_SESSION_TTL_SECONDS = 6 * 3600
+MAX_OFFER_SESSIONS = 1000
+DEFAULT_TOP_K = 10
+# CIT updates answered from per-pair viability-vs-CIT curves (see cit_curves.py):
+#   "lazy"  - a pair's curve is built on its first CIT update, later updates are a lookup
+#   "eager" - curves for every pair are built in one batch when the session opens
+#   "off"   - every CIT update re-runs the viability model
+OFFER_SESSION_CIT_CURVES = os.environ.get('OFFER_SESSION_CIT_CURVES', 'lazy')
+CIT_CURVE_MODES = ("off", "lazy", "eager")
+
+DELTA_OPS = ("update_cit", "update_urgency", "withdraw_recipient", "add_recipient")
+RECIPIENT_NUMERIC_FIELDS = ('recipient_age', 'recipient_comorbidities', 'recipient_location_lat', 'recipient_location_lon')
+
+
+class OfferSessionError(ValueError):
+    """Raised for deltas that cannot be applied to a session."""
+
+
+def _check_urgency(value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 <= value <= 1:
+        raise OfferSessionError("'urgency_score' must be a number between 0 and 1.")
+
+
+def _check_cit(value):
+    """CIT values are numbers or numeric strings (malformed strings count as unknown, as in /api/match_organs)."""
+    if value is not None and (not isinstance(value, (int, float, str)) or isinstance(value, bool)):
+        raise OfferSessionError("'estimated_cold_ischemia_hours' must be a number.")
+
+
+def _check_recipient_numbers(recipient_id, recipient_info):
+    """Checked before any state is recorded: the scorers do arithmetic on these fields as given."""
+    for field in RECIPIENT_NUMERIC_FIELDS:
+        value = recipient_info.get(field)
+        if field in recipient_info and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+            raise OfferSessionError(f"Recipient {recipient_id}: '{field}' must be a number.")
+
+
+class OfferSession:
+    def __init__(self, session_id, organ_info, recipients_list, logistics_info, model, preprocessor,
+                 component_store, logger, prediction_cache=None, curve_cache=None, cit_curves=OFFER_SESSION_CIT_CURVES):
+        self.session_id = session_id
+        self.organ_info = organ_info
+        self.model = model
+        self.preprocessor = preprocessor
+        self.component_store = component_store
+        self.logger = logger
+        self.prediction_cache = prediction_cache
+        # Curves are exact for XGBoost models only; other models (or no cache) keep re-predicting
+        self.curve_cache = curve_cache if cit_curves != "off" and curve_cache is not None and \
+            curve_cache.supports(model, preprocessor) else None
+        self.donor_components = component_store.get_donor_components(organ_info)
+        self.version = 0
+        self.last_access = time.time()
+
+        self._lock = threading.Lock()
+        self._recipients = {}  # recipient_id -> recipient_info
+        self._cit = {}         # recipient_id -> estimated CIT (None if unknown)
+        self._graft = {}       # recipient_id -> predicted graft survival probability
+        self._results = {}     # recipient_id -> match result entry
+        self._rank_keys = {}   # recipient_id -> key currently stored in _ranking
+        self._arrival = {}     # recipient_id -> arrival order, breaks score ties like a stable sort
+        self._ranking = SortedList()
+        self._next_arrival = 0
+        self._curves = {}      # recipient_id -> ViabilityCurve, for CIT updates
+
+        # Initial viabilities in one model batch, then one bulk insert into the ranking
+        results, scorable = {}, []
+        for recipient_info in recipients_list:
+            recipient_id = recipient_info.get("recipient_id", f"Recipient_{uuid.uuid4().hex[:8]}")
+            cit_str = logistics_info.get(recipient_id, {}).get("estimated_cold_ischemia_hours")
+            missing_result = self._register(recipient_id, recipient_info, cit_str)
+            if missing_result is not None:
+                results[recipient_id] = missing_result
+            else:
+                scorable.append(recipient_id)
+        cache = prediction_cache if prediction_cache is not None else ViabilityPredictionCache(max_entries=len(scorable))
+        graft_probs = predict_pairs_viability(
+            organ_info, [(rid, self._recipients[rid], self._cit[rid]) for rid in scorable],
+            model, preprocessor, cache, logger)
+        for recipient_id, graft in zip(scorable, graft_probs):
+            self._graft[recipient_id] = graft
+            results[recipient_id] = self._build_result(recipient_id)
+        self._rank_new(results)
+        if self.curve_cache is not None and cit_curves == "eager":
+            self._prefetch_curves()
+
+    # --- internal, caller holds the lock (or is the constructor) ---
+
+    def _rank(self, recipient_id, result):
+        old_key = self._rank_keys.pop(recipient_id, None)
+        if old_key is not None:
+            self._ranking.remove(old_key)
+        self._results[recipient_id] = result
+        key = (-result["score"], self._arrival[recipient_id], recipient_id)
+        self._rank_keys[recipient_id] = key
+        self._ranking.add(key)
+
+    def _rank_new(self, results):
+        """Ranks recipients that are not in the ranking yet ({recipient_id: result}) in one bulk insert."""
+        keys = []
+        for recipient_id, result in results.items():
+            self._results[recipient_id] = result
+            key = (-result["score"], self._arrival[recipient_id], recipient_id)
+            self._rank_keys[recipient_id] = key
+            keys.append(key)
+        self._ranking.update(keys)
+
+    def _prefetch_curves(self):
+        recipient_ids, rows = [], []
+        for recipient_id, recipient_info in self._recipients.items():
+            try:
+                rows.append(build_viability_input(self.organ_info, recipient_info, 0.0))
+                recipient_ids.append(recipient_id)
+            except (ValueError, TypeError, KeyError):
+                continue # Scored (and logged) by the regular prediction path
+        try:
+            self._curves.update(zip(recipient_ids, self.curve_cache.curves(rows, self.model, self.preprocessor)))
+        except Exception as e:
+            self.logger.warning(f"Could not precompute CIT curves for offer session {self.session_id}: {e}")
+
+    def _predict_from_curve(self, recipient_id):
+        """Viability for the pair's current CIT from its curve (built on first use); None if no curve can be used."""
+        estimated_cit = self._cit[recipient_id]
+        if self.curve_cache is None or estimated_cit is None:
+            return None
+        curve = self._curves.get(recipient_id)
+        if curve is None:
+            try:
+                row = build_viability_input(self.organ_info, self._recipients[recipient_id], estimated_cit)
+                curve = self.curve_cache.curves([row], self.model, self.preprocessor)[0]
+            except Exception:
+                return None # The regular path handles (and logs) rows the model cannot score
+            self._curves[recipient_id] = curve
+        return curve.predict(estimated_cit)
+
+    def _rescore(self, recipient_id, repredict, cit_changed=False):
+        recipient_info = self._recipients[recipient_id]
+        if repredict:
+            graft = self._predict_from_curve(recipient_id) if cit_changed else None
+            if graft is None:
+                graft = predict_pair_viability(
+                    self.organ_info, recipient_info, recipient_id, self._cit[recipient_id],
+                    self.model, self.preprocessor, self.logger, cache=self.prediction_cache)
+            self._graft[recipient_id] = graft
+        self._rank(recipient_id, self._build_result(recipient_id))
+
+    def _build_result(self, recipient_id):
+        recipient_info = self._recipients[recipient_id]
+        return build_match_result(
+            self.organ_info, recipient_info, recipient_id, self._graft[recipient_id], self._cit[recipient_id],
+            recipient_components=self.component_store.get_recipient_components(recipient_id, recipient_info),
+            donor_components=self.donor_components)
+
+    def _register(self, recipient_id, recipient_info, cit_str):
+        """
+        Records a new recipient's state, not yet scored. Returns the score-0 result for recipients missing
+        fields (kept in the ranking like /api/match_organs, but never re-scored), None otherwise.
+        """
+        if recipient_id in self._arrival:
+            raise OfferSessionError(f"Recipient {recipient_id} is already part of this offer.")
+        _check_recipient_numbers(recipient_id, recipient_info)
+        missing_fields = missing_recipient_fields(recipient_info)
+        self._arrival[recipient_id] = self._next_arrival
+        self._next_arrival += 1
+        if missing_fields:
+            return missing_fields_result(recipient_id, missing_fields)
+        recipient_info.setdefault('recipient_comorbidities', 0)
+        self._recipients[recipient_id] = recipient_info
+        self._cit[recipient_id] = parse_estimated_cit(cit_str, recipient_id, self.logger)
+        return None
+
+    def _add_recipient(self, recipient_id, recipient_info, cit_str):
+        missing_result = self._register(recipient_id, recipient_info, cit_str)
+        if missing_result is not None:
+            self._rank(recipient_id, missing_result)
+        else:
+            self._rescore(recipient_id, repredict=True)
+
+    def _require_recipient(self, recipient_id):
+        if recipient_id not in self._recipients:
+            raise OfferSessionError(f"Recipient {recipient_id} is not an active, scorable recipient of this offer.")
+
+    def _apply(self, delta):
+        op = delta.get("op")
+        recipient_id = delta.get("recipient_id")
+        if op == "update_cit":
+            self._require_recipient(recipient_id)
+            _check_cit(delta.get("estimated_cold_ischemia_hours"))
+            self._cit[recipient_id] = parse_estimated_cit(delta.get("estimated_cold_ischemia_hours"), recipient_id, self.logger)
+            self._rescore(recipient_id, repredict=True, cit_changed=True)
+        elif op == "update_urgency":
+            self._require_recipient(recipient_id)
+            if "urgency_score" not in delta:
+                raise OfferSessionError("update_urgency requires 'urgency_score'.")
+            _check_urgency(delta["urgency_score"])
+            self._recipients[recipient_id]['urgency_score'] = delta["urgency_score"]
+            self._rescore(recipient_id, repredict=False) # Urgency is not a viability model input
+        elif op == "withdraw_recipient":
+            if recipient_id not in self._results:
+                raise OfferSessionError(f"Recipient {recipient_id} is not part of this offer.")
+            self._ranking.remove(self._rank_keys.pop(recipient_id))
+            for state in (self._results, self._recipients, self._cit, self._graft, self._arrival, self._curves):
+                state.pop(recipient_id, None)
+        elif op == "add_recipient":
+            recipient_info = delta.get("recipient")
+            if not isinstance(recipient_info, dict):
+                raise OfferSessionError("add_recipient requires a 'recipient' object.")
+            recipient_id = recipient_info.get("recipient_id")
+            if recipient_id is None:
+                raise OfferSessionError("add_recipient requires 'recipient.recipient_id'.")
+            if "urgency_score" in recipient_info:
+                _check_urgency(recipient_info["urgency_score"])
+            _check_cit(delta.get("estimated_cold_ischemia_hours"))
+            self._add_recipient(recipient_id, recipient_info, delta.get("estimated_cold_ischemia_hours"))
+        else:
+            raise OfferSessionError(f"Unknown delta op '{op}'. Expected one of: {', '.join(DELTA_OPS)}.")
+
+    # --- public API ---
+
+    def apply_deltas(self, deltas):
+        """Applies deltas in order. Returns (applied_count, [{"index", "error"}]) for rejected ones."""
+        errors = []
+        applied = 0
+        with self._lock:
+            for index, delta in enumerate(deltas):
+                try:
+                    if not isinstance(delta, dict):
+                        raise OfferSessionError("Each delta must be an object.")
+                    self._apply(delta)
+                    applied += 1
+                except OfferSessionError as e:
+                    errors.append({"index": index, "error": str(e)})
+            if applied:
+                self.version += 1
+            self.last_access = time.time()
+        return applied, errors
+
+    def top(self, k=DEFAULT_TOP_K):
+        """Current top-k results, best first."""
+        with self._lock:
+            self.last_access = time.time()
+            return [self._results[key[2]] for key in self._ranking.islice(0, max(0, int(k)))]
+
+    def summary(self, k=DEFAULT_TOP_K):
+        top = self.top(k)
+        return {"session_id": self.session_id, "version": self.version,
+                "recipient_count": len(self._results), "top": top}
+
+
+class OfferSessionRegistry:
+    """In-process store of open offer sessions with idle expiry."""
+
+    def __init__(self, ttl_seconds=OFFER_SESSION_TTL_SECONDS, max_sessions=MAX_OFFER_SESSIONS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_access < cutoff]:
+            del self._sessions[session_id]
+
+    def create(self, **session_kwargs):
+        session = OfferSession(session_id=uuid.uuid4().hex, **session_kwargs)
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                oldest = min(self._sessions.values(), key=lambda s: s.last_access)
+                del self._sessions[oldest.session_id]
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._expire()
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
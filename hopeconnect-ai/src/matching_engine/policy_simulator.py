@@ -0,0 +1,268 @@
+# hopeconnect-ai/src/matching_engine/policy_simulator.py
+
+import time
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.columnar_scorer import (
+    calculate_match_scores, count_hla_mismatches, DONOR_HLA_KEYS, RECIPIENT_HLA_KEYS
+)
+from src.matching_engine.distance_calculator import calculate_distance_km
+from src.matching_engine.fused_scorer import fused_match_scores, FUSED_MATCH_SCORER
+from src.matching_engine.preprocessor import get_blood_type_compatibility
+from src.matching_engine.static_components import compute_recipient_static_arrays, compute_donor_static_components
+from src.matching_engine.weighted_scorer import WEIGHTS, SCORE_COMPONENTS
+from src.matching_engine.match_pipeline import DEFAULT_GRAFT_SURVIVAL_PROB
+from src.prediction_models.prediction_cache import VIABILITY_CACHE_FEATURES, model_version_key
+from src.prediction_models.viability_predictor import (
+    ORGAN_MAX_CIT, get_max_cold_ischemia_time, predict_graft_survival_batch
+)
+
+# Discrete-event replay of organ offers against an evolving waitlist under a candidate allocation policy
+# (WEIGHTS overrides, ORGAN_MAX_CIT overrides, a minimum score). A "world" is one random draw of recipient
+# arrivals (each with its waitlist death/delisting time) and organ offers; it does not depend on the
+# policy, so every policy replayed on the same world sees the same patients and organs (common random
+# numbers) and policy differences are not buried in sampling noise. Recipient-only features are computed
+# once when the world is built; at each offer the engine (calculate_match_scores with the policy weights)
+# ranks the waiting candidates for that organ type and the organ goes to the best eligible one, or is
+# discarded. Viability is predicted once per offer for every compatible candidate waiting at that time and
+# kept with the world, so further policies replayed on it need no model calls. Parties sit at transplant centers, so distances
+# come from a precomputed center x center table.
+
+SIMULATION_RECIPIENT_COLUMNS = ['recipient_id', 'arrival_day', 'death_day', 'organ_type', 'recipient_blood_type',
+                                'recipient_age', 'recipient_comorbidities', 'urgency_score', 'center'] + RECIPIENT_HLA_KEYS
+SIMULATION_OFFER_COLUMNS = ['day', 'organ_type', 'donor_age', 'donor_blood_type', 'donor_comorbidities', 'center',
+                            'logistics_delay_hours'] + DONOR_HLA_KEYS
+URGENCY_DRIFT_PER_YEAR = 0.10 # Urgency rises while waiting (capped at 1)
+
+OUTCOME_COLUMNS = [
+    'offers', 'transplants', 'discards', 'discard_rate', 'waitlist_deaths', 'final_waitlist',
+    'mean_predicted_graft_survival', 'expected_graft_failures', 'mean_wait_days', 'median_wait_days',
+    'p90_wait_days', 'mean_distance_km', 'mean_cit_hours', 'mean_hla_mismatches', 'mean_match_score'
+]
+
+
+def normalize_policy(policy):
+    """
+    Validated policy dict {"name", "weights", "max_cit", "min_score"} from a partial spec: weights and
+    max_cit override WEIGHTS and ORGAN_MAX_CIT key by key. Raises ValueError on unknown keys or bad values.
+    """
+    if not isinstance(policy, dict) or not policy.get('name'):
+        raise ValueError("Each policy must be an object with a 'name'.")
+    weights = dict(WEIGHTS)
+    for key, value in (policy.get('weights') or {}).items():
+        if key not in SCORE_COMPONENTS:
+            raise ValueError(f"Policy '{policy['name']}': unknown weight '{key}'. Expected one of: {', '.join(SCORE_COMPONENTS)}.")
+        if not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"Policy '{policy['name']}': weight '{key}' must be a non-negative number.")
+        weights[key] = float(value)
+    max_cit = dict(ORGAN_MAX_CIT)
+    for organ_type, hours in (policy.get('max_cit') or {}).items():
+        if not isinstance(hours, (int, float)) or hours <= 0:
+            raise ValueError(f"Policy '{policy['name']}': max_cit for '{organ_type}' must be a positive number.")
+        max_cit[str(organ_type).capitalize()] = float(hours)
+    min_score = policy.get('min_score', 0.0)
+    if not isinstance(min_score, (int, float)) or not 0 <= min_score <= 1:
+        raise ValueError(f"Policy '{policy['name']}': min_score must be between 0 and 1.")
+    return {"name": str(policy['name']), "weights": weights, "max_cit": max_cit, "min_score": float(min_score)}
+
+
+def estimate_transport_hours(distances_km):
+    """Retrieval and transport time: ground transport up to ~300 km, flights beyond (as in the load test generator)."""
+    distances_km = np.asarray(distances_km, dtype=np.float64)
+    return 1.5 + np.where(distances_km < 300, distances_km / 60.0, 2.0 + distances_km / 650.0)
+
+
+class SimulationWorld:
+    """
+    One draw of arrivals and offers, with everything that does not depend on the policy precomputed:
+    recipient columns grouped by organ type in arrival order, recipient risk factors, and the
+    center x center distance table. `recipients` / `offers` are DataFrames with SIMULATION_RECIPIENT_COLUMNS /
+    SIMULATION_OFFER_COLUMNS; 'center' indexes `centers` [(center_id, lat, lon)].
+    """
+
+    def __init__(self, recipients, offers, centers, horizon_days):
+        self.horizon_days = float(horizon_days)
+        self.centers = list(centers)
+        self.center_distances = np.array([[calculate_distance_km(a[1], a[2], b[1], b[2]) for b in self.centers]
+                                          for a in self.centers], dtype=np.float64)
+
+        recipients = recipients.sort_values('arrival_day', kind='stable').reset_index(drop=True)
+        self.n_recipients = len(recipients)
+        self.recipient_ids = recipients['recipient_id'].to_numpy(dtype=object)
+        self.arrival_day = recipients['arrival_day'].to_numpy(dtype=np.float64)
+        self.death_day = recipients['death_day'].to_numpy(dtype=np.float64)
+        self.organ_type = recipients['organ_type'].astype(str).str.capitalize().to_numpy(dtype=object)
+        self.columns = {
+            'recipient_blood_type': recipients['recipient_blood_type'].to_numpy(dtype=object),
+            'recipient_age': recipients['recipient_age'].to_numpy(dtype=np.float64),
+            'recipient_comorbidities': recipients['recipient_comorbidities'].to_numpy(dtype=np.int64),
+            'recipient_center_id': np.array([self.centers[c][0] for c in recipients['center']], dtype=object),
+        }
+        for key in RECIPIENT_HLA_KEYS:
+            self.columns[key] = recipients[key].fillna('').astype(str).to_numpy(dtype=object)
+        self.center = recipients['center'].to_numpy(dtype=np.int64)
+        self.initial_urgency = recipients['urgency_score'].to_numpy(dtype=np.float64)
+        self.recipient_risk_factor = compute_recipient_static_arrays(
+            self.columns['recipient_age'], self.columns['recipient_comorbidities'].astype(np.float64),
+            self.initial_urgency)["recipient_risk_factor"]
+        # Candidates per organ type, in arrival order (ties in the ranking keep waitlist order)
+        self.by_organ_type = {t: np.flatnonzero(self.organ_type == t) for t in pd.unique(self.organ_type)}
+
+        self.offers = offers.sort_values('day', kind='stable').reset_index(drop=True)
+        self.offers['organ_type'] = self.offers['organ_type'].astype(str).str.capitalize()
+        for key in DONOR_HLA_KEYS:
+            self.offers[key] = self.offers[key].fillna('').astype(str)
+        self.offer_records = self.offers.to_dict('records')
+        self.donor_components = [compute_donor_static_components(offer) for offer in self.offer_records]
+        self._viability = {} # {model version: {offer index: (recipient indexes, probabilities)}}
+
+    def offer_viability(self, k, model, preprocessor):
+        """
+        Graft survival probabilities of offer k for every blood compatible candidate on the waitlist at
+        that time, whoever was already transplanted: (recipient indexes ascending, probabilities). The
+        set does not depend on the policy, so it is predicted once per offer and model, in one batch, and
+        shared by every policy replayed on this world.
+        """
+        memo = self._viability.setdefault(model_version_key(model, preprocessor), {})
+        if k not in memo:
+            offer = self.offer_records[k]
+            candidates = self.by_organ_type.get(offer['organ_type'], np.zeros(0, dtype=np.int64))
+            compatible = get_blood_type_compatibility().get(offer['donor_blood_type'], [])
+            rows = candidates[(self.arrival_day[candidates] <= offer['day']) & (self.death_day[candidates] > offer['day']) &
+                              np.isin(self.columns['recipient_blood_type'][candidates], compatible)]
+            n = len(rows)
+            distances = self.center_distances[offer['center'], self.center[rows]]
+            probs = predict_graft_survival_batch(pd.DataFrame({
+                'donor_age': np.full(n, float(offer['donor_age'])), 'organ_type': np.full(n, offer['organ_type'], dtype=object),
+                'donor_comorbidities': np.full(n, int(offer['donor_comorbidities'])),
+                'cold_ischemia_time_hours': estimate_transport_hours(distances) + offer['logistics_delay_hours'],
+                'distance_km': distances, 'donor_blood_type': np.full(n, offer['donor_blood_type'], dtype=object),
+                'recipient_blood_type': self.columns['recipient_blood_type'][rows],
+                'hla_mismatches_count': count_hla_mismatches(offer, {key: self.columns[key][rows] for key in RECIPIENT_HLA_KEYS}),
+                'recipient_age': self.columns['recipient_age'][rows],
+                'recipient_comorbidities': self.columns['recipient_comorbidities'][rows]
+            }, columns=VIABILITY_CACHE_FEATURES), model, preprocessor) if n else np.zeros(0)
+            memo[k] = (rows, probs)
+        return memo[k]
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else float('nan')
+
+
+def _mean(values):
+    return float(np.mean(values)) if len(values) else float('nan')
+
+
+def simulate_policy(world, policy, model, preprocessor):
+    """
+    Replays every offer of `world` under a normalize_policy() policy and returns the outcome metrics
+    (OUTCOME_COLUMNS). Without a model, viability is the API default (0.5).
+    """
+    started = time.perf_counter()
+    weights, max_cit_by_type, min_score = policy["weights"], policy["max_cit"], policy["min_score"]
+    compatibility = get_blood_type_compatibility()
+    score_fn = fused_match_scores if FUSED_MATCH_SCORER != 'off' else calculate_match_scores # Identical scores
+    transplanted = np.zeros(world.n_recipients, dtype=bool)
+    accepted = {"prob": [], "wait": [], "distance": [], "cit": [], "hla": [], "score": []}
+    discards = 0
+
+    for k, offer in enumerate(world.offer_records):
+        day = offer['day']
+        candidates = world.by_organ_type.get(offer['organ_type'])
+        if candidates is None:
+            discards += 1
+            continue
+        waiting = candidates[(world.arrival_day[candidates] <= day) & (world.death_day[candidates] > day) &
+                             ~transplanted[candidates]]
+        if len(waiting) == 0:
+            discards += 1
+            continue
+
+        recipients = {name: column[waiting] for name, column in world.columns.items()}
+        distances = world.center_distances[offer['center'], world.center[waiting]]
+        cit = estimate_transport_hours(distances) + offer['logistics_delay_hours']
+        max_cit = float(max_cit_by_type.get(offer['organ_type'], get_max_cold_ischemia_time(offer['organ_type'])))
+        urgency = np.minimum(1.0, world.initial_urgency[waiting] +
+                             URGENCY_DRIFT_PER_YEAR * (day - world.arrival_day[waiting]) / 365.0)
+
+        # Viability is only needed where the score can be non-zero (blood compatible, CIT within the limit)
+        probs = np.full(len(waiting), DEFAULT_GRAFT_SURVIVAL_PROB)
+        predict = np.isin(recipients['recipient_blood_type'], compatibility.get(offer['donor_blood_type'], [])) & (cit <= max_cit)
+        if model and preprocessor and predict.any():
+            rows, offer_probs = world.offer_viability(k, model, preprocessor)
+            probs[predict] = offer_probs[np.searchsorted(rows, waiting[predict])]
+
+        scores = score_fn(
+            offer, recipients, probs, cit, max_cit, distances,
+            recipient_components={"recipient_risk_factor": world.recipient_risk_factor[waiting], "urgency_score": urgency},
+            donor_components=world.donor_components[k], weights=weights)
+        best = int(np.argmax(scores)) # First maximum: ties go to the longest-waiting candidate
+        if scores[best] <= 0.0 or scores[best] < min_score:
+            discards += 1
+            continue
+
+        winner = waiting[best]
+        transplanted[winner] = True
+        accepted["prob"].append(probs[best])
+        accepted["wait"].append(day - world.arrival_day[winner])
+        accepted["distance"].append(distances[best])
+        accepted["cit"].append(cit[best])
+        winner_hla = {key: recipients[key][best:best + 1] for key in RECIPIENT_HLA_KEYS}
+        accepted["hla"].append(int(count_hla_mismatches(offer, winner_hla, skip_empty=True)[0]))
+        accepted["score"].append(scores[best])
+
+    horizon = world.horizon_days
+    arrived = world.arrival_day <= horizon
+    n_offers = len(world.offer_records)
+    n_transplants = len(accepted["prob"])
+    return {
+        "offers": n_offers, "transplants": n_transplants, "discards": discards,
+        "discard_rate": discards / n_offers if n_offers else float('nan'),
+        "waitlist_deaths": int((arrived & (world.death_day <= horizon) & ~transplanted).sum()),
+        "final_waitlist": int((arrived & (world.death_day > horizon) & ~transplanted).sum()),
+        "mean_predicted_graft_survival": _mean(accepted["prob"]),
+        "expected_graft_failures": float(n_transplants - np.sum(accepted["prob"])),
+        "mean_wait_days": _mean(accepted["wait"]), "median_wait_days": _percentile(accepted["wait"], 50),
+        "p90_wait_days": _percentile(accepted["wait"], 90), "mean_distance_km": _mean(accepted["distance"]),
+        "mean_cit_hours": _mean(accepted["cit"]), "mean_hla_mismatches": _mean(accepted["hla"]),
+        "mean_match_score": _mean(accepted["score"]),
+        "elapsed_seconds": time.perf_counter() - started
+    }
+
+
+def summarize_replicas(replicas, baseline=None):
+    """
+    Outcome table per policy from one row per (policy, seed) replica: mean and 95% confidence half-width
+    of every outcome over the seeds. With a baseline policy name, also the mean paired difference to the
+    baseline on the same seeds (the same worlds), which is far tighter than comparing the two means.
+    """
+    rows = []
+    for name, group in replicas.groupby('policy', sort=False):
+        row = {"policy": name, "replicas": len(group)}
+        for column in OUTCOME_COLUMNS:
+            values = group[column].to_numpy(dtype=np.float64)
+            row[column] = np.nanmean(values) if not np.isnan(values).all() else float('nan')
+            row[f"{column}_ci95"] = 1.96 * np.nanstd(values, ddof=1) / np.sqrt(len(values)) if len(values) > 1 else float('nan')
+        rows.append(row)
+    summary = pd.DataFrame(rows)
+
+    if baseline is not None and baseline in set(replicas['policy']):
+        reference = replicas[replicas['policy'] == baseline].set_index('seed')
+        for column in OUTCOME_COLUMNS:
+            deltas = []
+            for name in summary['policy']:
+                group = replicas[replicas['policy'] == name].set_index('seed')
+                paired = (group[column] - reference[column]).dropna()
+                deltas.append(paired.mean() if len(paired) else float('nan'))
+            summary[f"{column}_vs_{baseline}"] = deltas
+    return summary
@@ -4,6 +4,15 @@ from sklearn.preprocessing import StandardScaler
 import joblib
 import os
 
+# --- Start of Path Handling ---
+import sys
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.donor_health_rules import get_donor_health_rules
+
 # This scaler would be for scaling features IF a model was trained to predict risk.
 # For a rule-based score, we might not need a scaler from scikit-learn.
 SCALER_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'models', 'matching_model_components', 'risk_profile_scaler.joblib')
@@ -25,6 +34,23 @@ def calculate_basic_risk_score(age, comorbidities, max_age=100, max_comorbiditie
     risk_score = (age_weight * age_score) + (comorbidity_weight * comorbidity_score)
     return min(max(risk_score, 0), 1) # Ensure score is between 0 and 1
 
+def calculate_basic_risk_scores(ages, comorbidities, max_age=100, max_comorbidities=5):
+    """
+    Vectorized calculate_basic_risk_score over numpy arrays, with identical results.
+    Python's `x ** 2` goes through libm pow(), which can differ from numpy's x*x in the last bit,
+    so the age term is squared once per distinct age with Python's operator (ages repeat heavily).
+    """
+    age_ratio = np.asarray(ages, dtype=np.float64) / max_age
+    unique_ratios, inverse = np.unique(age_ratio, return_inverse=True)
+    age_score = np.array([r ** 2 for r in unique_ratios.tolist()], dtype=np.float64)[inverse.reshape(-1)]
+    comorbidity_score = (np.asarray(comorbidities, dtype=np.float64) / max_comorbidities) if max_comorbidities > 0 else 0
+
+    age_weight = 0.6
+    comorbidity_weight = 0.4
+
+    risk_score = (age_weight * age_score) + (comorbidity_weight * comorbidity_score)
+    return np.clip(risk_score, 0, 1)
+
 def get_donor_risk_profile(donor_age, donor_comorbidities):
     """Calculates donor risk profile."""
     # In a real system, this would be more complex, considering specific conditions, lifestyle, etc.
@@ -43,47 +69,38 @@ def assess_donor_health_for_incentives(donor_age, organ_type, comorbidities_coun
     """
     Assesses donor health to determine a quality score for incentives.
     Score 0-100 (higher is better).
-    This is a simplified example.
+    Thresholds and penalties come from the versioned rule table (config/donor_health_rules.json),
+    see matching_engine.donor_health_rules.
     """
-    score = 100
-
-    # Age penalty (organ-specific)
-    if organ_type == "Kidney":
-        if donor_age > 60: score -= (donor_age - 60) * 1.5
-        elif donor_age > 50: score -= (donor_age - 50) * 1.0
-    elif organ_type == "Liver":
-        if donor_age > 55: score -= (donor_age - 55) * 1.5
-    elif organ_type == "Heart":
-        if donor_age > 50: score -= (donor_age - 50) * 2.0
-    
-    # General age penalty
-    if donor_age > 70: score -= 20
-    elif donor_age < 20: score -= 5 # Very young might have developmental considerations
-
-    # Comorbidities penalty
-    score -= comorbidities_count * 10
-
-    if lifestyle_factors:
-        if lifestyle_factors.get("smoker", False):
-            score -= 15
-        
-        alcohol = lifestyle_factors.get("alcohol_consumption", "low")
-        if alcohol == "high": score -= 10
-        elif alcohol == "moderate": score -= 5
-
-        bmi = lifestyle_factors.get("bmi", 22)
-        if bmi > 30: score -= 10
-        elif bmi < 18.5: score -= 5
-
-    if lab_results: # Example for Kidney
-        if organ_type == "Kidney":
-            creatinine = lab_results.get("creatinine")
-            gfr = lab_results.get("gfr")
-            if creatinine and creatinine > 1.2: score -= (creatinine - 1.2) * 20
-            if gfr and gfr < 60: score -= (60 - gfr) * 0.5
-    
-    return max(0, min(score, 100))
+    return get_donor_health_rules().score(donor_age, organ_type, comorbidities_count, lifestyle_factors, lab_results)
+
 
+def assess_donor_health_batch(donor_ages, organ_types, comorbidities_counts, smoker=None, alcohol_consumption=None,
+                              bmi=None, creatinine=None, gfr=None):
+    """
+    Vectorized assess_donor_health_for_incentives over column arrays (one entry per donor).
+    Lifestyle and lab columns are optional; missing entries (None/NaN) behave like absent keys.
+    Penalties are subtracted in the same order as the single-donor path, so scores are identical.
+    """
+    return get_donor_health_rules().score_batch(
+        donor_ages, organ_types, comorbidities_counts, smoker=smoker, alcohol_consumption=alcohol_consumption,
+        bmi=bmi, creatinine=creatinine, gfr=gfr)
+
+
+def parse_comorbidities_counts(values):
+    """
+    Comorbidity counts parsed per entry with int(), like the single-donor endpoint: missing entries
+    (None/NaN) count as 0, numbers are truncated, and anything int() rejects (e.g. "1.5") becomes NaN.
+    """
+    counts = np.zeros(len(values))
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+        try:
+            counts[i] = int(value)
+        except (ValueError, TypeError, OverflowError):
+            counts[i] = np.nan
+    return counts
 
 if __name__ == '__main__':
     donor_age = 45
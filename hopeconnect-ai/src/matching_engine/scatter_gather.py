@@ -0,0 +1,233 @@
+# hopeconnect-ai/src/matching_engine/scatter_gather.py
+
+import json
+import math
+import threading
+import time
+import zlib
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+# Coordinator mode: the waitlist of a match request is partitioned into one shard per AI worker node
+# (by recipient hash or by region), every node ranks its shard with its own /api/match_organs and
+# returns its local top-K, and the coordinator merges those into the global top-K. The global top-K is
+# always contained in the union of the local ones, so a complete response equals single-node ranking.
+# Shards have a shared deadline: shards that fail or miss it are reported and the response is marked
+# partial instead of failing. Failed requests are retried on another node; nodes that keep failing are
+# skipped until a recovery period has passed (then one request probes them again).
+
+AI_WORKER_NODES = [url.strip().rstrip('/') for url in os.environ.get('AI_WORKER_NODES', '').split(',') if url.strip()]
+SCATTER_SHARD_STRATEGY = os.environ.get('SCATTER_SHARD_STRATEGY', 'hash')
+SCATTER_DEADLINE_MS = float(os.environ.get('SCATTER_DEADLINE_MS', 5000))
+SCATTER_RETRIES = int(os.environ.get('SCATTER_RETRIES', 1))
+NODE_FAILURE_THRESHOLD = int(os.environ.get('NODE_FAILURE_THRESHOLD', 3)) # Consecutive failures before a node is skipped
+NODE_RECOVERY_SECONDS = float(os.environ.get('NODE_RECOVERY_SECONDS', 30))
+DEFAULT_SCATTER_TOP_K = 10
+SHARD_STRATEGIES = ("hash", "region")
+REGION_CELL_DEGREES = 5.0 # Lat/lon cell used as the region when a recipient has no region or center id
+
+
+def shard_key(recipient_info, strategy=SCATTER_SHARD_STRATEGY):
+    """
+    'hash': the recipient id. 'region': recipient_region, else recipient_center_id, else a coarse
+    lat/lon cell, so recipients of one region (and their center distance rows) stay on one node.
+    """
+    if strategy == "region":
+        region = recipient_info.get('recipient_region') or recipient_info.get('recipient_center_id')
+        if region is not None:
+            return str(region)
+        try:
+            lat = float(recipient_info['recipient_location_lat'])
+            lon = float(recipient_info['recipient_location_lon'])
+            return f"cell:{math.floor(lat / REGION_CELL_DEGREES)}:{math.floor(lon / REGION_CELL_DEGREES)}"
+        except (KeyError, TypeError, ValueError):
+            pass
+    return str(recipient_info.get('recipient_id'))
+
+
+def partition_recipients(recipients_list, n_shards, strategy=SCATTER_SHARD_STRATEGY):
+    """Input indexes of each shard; stable across processes (CRC32 of the shard key)."""
+    shards = [[] for _ in range(n_shards)]
+    for index, recipient_info in enumerate(recipients_list):
+        shards[zlib.crc32(shard_key(recipient_info, strategy).encode('utf-8')) % n_shards].append(index)
+    return shards
+
+
+class WorkerNode:
+    """One AI worker and its health: consecutive failures open a circuit for NODE_RECOVERY_SECONDS."""
+
+    def __init__(self, url, failure_threshold=NODE_FAILURE_THRESHOLD, recovery_seconds=NODE_RECOVERY_SECONDS):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None # Set while the node is considered down
+        self.requests = 0
+        self.failures = 0
+        self.latency_ewma_ms = None
+        self.last_error = None
+
+    def available(self):
+        """True when healthy, or when down for longer than the recovery period (the next request probes it)."""
+        with self._lock:
+            return self.opened_at is None or time.monotonic() - self.opened_at >= self.recovery_seconds
+
+    def record_success(self, latency_ms):
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.latency_ewma_ms = latency_ms if self.latency_ewma_ms is None else \
+                0.8 * self.latency_ewma_ms + 0.2 * latency_ms
+
+    def record_failure(self, error):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            if self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic() # (Re)open: a failed probe restarts the recovery period
+
+    def stats(self):
+        with self._lock:
+            if self.opened_at is None:
+                status = "healthy"
+            elif time.monotonic() - self.opened_at >= self.recovery_seconds:
+                status = "probing"
+            else:
+                status = "down"
+            return {"url": self.url, "status": status, "requests": self.requests, "failures": self.failures,
+                    "consecutive_failures": self.consecutive_failures, "latency_ewma_ms": self.latency_ewma_ms,
+                    "last_error": self.last_error}
+
+
+def _http_json(url, body=None, timeout=5.0):
+    """POST (or GET without a body) and decode the JSON response; raises on HTTP errors and timeouts."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'},
+                                 method='POST' if body is not None else 'GET')
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class ScatterGatherCoordinator:
+    def __init__(self, node_urls=None, strategy=SCATTER_SHARD_STRATEGY, deadline_ms=SCATTER_DEADLINE_MS,
+                 retries=SCATTER_RETRIES, failure_threshold=NODE_FAILURE_THRESHOLD,
+                 recovery_seconds=NODE_RECOVERY_SECONDS, logger=None):
+        if strategy not in SHARD_STRATEGIES:
+            raise ValueError(f"Unknown shard strategy '{strategy}'. Expected one of: {', '.join(SHARD_STRATEGIES)}.")
+        self.nodes = [WorkerNode(url, failure_threshold, recovery_seconds)
+                      for url in (AI_WORKER_NODES if node_urls is None else node_urls)]
+        self.strategy = strategy
+        self.deadline_ms = deadline_ms
+        self.retries = retries
+        self.logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.nodes)), thread_name_prefix='scatter')
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.partial_responses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.nodes)
+
+    def _candidates(self, shard):
+        """Nodes to try for a shard: its own node first, then the others in ring order; available ones only."""
+        ring = [self.nodes[(shard + k) % len(self.nodes)] for k in range(len(self.nodes))]
+        return [node for node in ring if node.available()]
+
+    def _run_shard(self, shard, body, deadline):
+        attempts = []
+        for node in self._candidates(shard)[:self.retries + 1]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            started = time.monotonic()
+            try:
+                results = _http_json(f"{node.url}/api/match_organs", body, timeout=remaining)
+                if not isinstance(results, list):
+                    raise ValueError(f"unexpected response: {str(results)[:200]}")
+                latency_ms = (time.monotonic() - started) * 1000
+                node.record_success(latency_ms)
+                attempts.append({"node": node.url, "status": "ok", "latency_ms": latency_ms})
+                return {"status": "ok", "results": results, "attempts": attempts}
+            except (urllib.error.URLError, OSError, ValueError) as e: # HTTPError is a URLError; timeouts are OSErrors
+                node.record_failure(e)
+                attempts.append({"node": node.url, "status": "error", "error": str(e)})
+                if self.logger:
+                    self.logger.warning(f"Shard {shard} failed on {node.url}: {e}")
+        return {"status": "failed" if attempts else "no_available_node", "results": [], "attempts": attempts}
+
+    def match(self, organ_info, recipients_list, logistics_info, quality=None, top_k=DEFAULT_SCATTER_TOP_K, deadline_ms=None):
+        """
+        Global top_k for one organ over recipients_list, scattered over the worker nodes.
+        Returns {"results", "partial", "recipients_total", "recipients_ranked", "shards", "elapsed_ms"}.
+        """
+        started = time.monotonic()
+        deadline = started + (self.deadline_ms if deadline_ms is None else deadline_ms) / 1000.0
+        position = {}
+        for index, recipient_info in enumerate(recipients_list):
+            position.setdefault(recipient_info.get('recipient_id'), index)
+
+        futures, shard_sizes = {}, []
+        for shard, indexes in enumerate(partition_recipients(recipients_list, len(self.nodes), self.strategy)):
+            shard_sizes.append(len(indexes))
+            if not indexes:
+                continue
+            shard_recipients = [recipients_list[i] for i in indexes]
+            body = {"organ": organ_info, "recipients": shard_recipients, "top_k": top_k,
+                    "logistics": {r['recipient_id']: logistics_info[r['recipient_id']]
+                                  for r in shard_recipients if r.get('recipient_id') in logistics_info}}
+            if quality is not None:
+                body["quality"] = quality
+            futures[self._executor.submit(self._run_shard, shard, body, deadline)] = shard
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+        merged, shard_reports, ranked = [], [], 0
+        for future, shard in sorted(futures.items(), key=lambda item: item[1]):
+            if future in done:
+                outcome = future.result()
+            else: # Still running at the deadline: its answer is dropped
+                outcome = {"status": "deadline_exceeded", "results": [], "attempts": []}
+            if outcome["status"] == "ok":
+                ranked += shard_sizes[shard]
+                merged.extend(outcome["results"])
+            shard_reports.append({"shard": shard, "recipients": shard_sizes[shard], "status": outcome["status"],
+                                  "attempts": outcome["attempts"]})
+
+        # Same order as a single node: score descending, ties in request order
+        merged.sort(key=lambda r: (-r.get("score", 0.0), position.get(r.get("recipient_id"), len(position))))
+        partial = ranked < len(recipients_list)
+        with self._lock:
+            self.requests += 1
+            self.partial_responses += int(partial)
+        return {"results": merged[:top_k], "partial": partial, "recipients_total": len(recipients_list),
+                "recipients_ranked": ranked, "shards": shard_reports,
+                "elapsed_ms": (time.monotonic() - started) * 1000}
+
+    def probe(self, timeout=2.0):
+        """Checks every node's /api/health now and updates its health state."""
+        for node in self.nodes:
+            started = time.monotonic()
+            try:
+                _http_json(f"{node.url}/api/health", timeout=timeout)
+                node.record_success((time.monotonic() - started) * 1000)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                node.record_failure(e)
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": self.enabled, "strategy": self.strategy, "deadline_ms": self.deadline_ms,
+                    "retries": self.retries, "requests": self.requests, "partial_responses": self.partial_responses,
+                    "nodes": [node.stats() for node in self.nodes]}
@@ -0,0 +1,223 @@
+# hopeconnect-ai/src/matching_engine/shadow_scoring.py
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.match_pipeline import (
+    missing_recipient_fields, parse_estimated_cit, predict_pairs_viability, build_match_result,
+    score_recipient_columns, recipient_columns_from_records
+)
+from src.prediction_models.prediction_cache import ViabilityPredictionCache
+
+# Shadow scoring: on a sampled fraction of live /api/match_organs requests, an alternative engine
+# (the columnar scorer, or a candidate viability model) re-ranks the same waitlist on a background
+# thread after the response has been computed. Rank agreement and latency are recorded so a rewrite
+# or a retrained model can be validated on production traffic without affecting responses.
+
+SHADOW_ENGINE = os.environ.get('SHADOW_ENGINE', 'columnar')
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 0.0)) # Off unless configured
+SHADOW_VIABILITY_MODEL_PATH = os.environ.get('SHADOW_VIABILITY_MODEL_PATH')
+SHADOW_VIABILITY_PREPROCESSOR_PATH = os.environ.get('SHADOW_VIABILITY_PREPROCESSOR_PATH')
+SHADOW_TOP_K = 10
+MAX_PENDING_SHADOW_RUNS = 4
+MAX_RECORDED_COMPARISONS = 1000
+
+SHADOW_ENGINES = ("columnar", "model")
+
+
+def columnar_engine(model, preprocessor, cache):
+    """Ranks the request with score_recipient_columns (the Arrow path's vectorized scorer)."""
+    def run(organ_info, recipients_list, logistics_info, recipient_ids, logger):
+        n = len(recipients_list)
+        if n == 0:
+            return []
+        recipients = recipient_columns_from_records(recipients_list, recipient_ids, logistics_info, logger)
+        scores = score_recipient_columns(organ_info, recipients, n, model, preprocessor, cache, logger)["scores"]
+        order = np.argsort(-scores, kind='stable')
+        return [(recipient_ids[i], float(scores[i])) for i in order.tolist()]
+    return run
+
+
+def pipeline_engine(model, preprocessor, cache):
+    """Ranks the request with the per-pair /api/match_organs pipeline, e.g. with a candidate model."""
+    def run(organ_info, recipients_list, logistics_info, recipient_ids, logger):
+        scores = [0.0] * len(recipient_ids) # Recipients with missing fields score 0, as in the live path
+        scored, slots = [], []
+        for index, (recipient_id, recipient_info) in enumerate(zip(recipient_ids, recipients_list)):
+            if missing_recipient_fields(recipient_info):
+                continue
+            estimated_cit = parse_estimated_cit(
+                logistics_info.get(recipient_id, {}).get("estimated_cold_ischemia_hours"), recipient_id, logger)
+            scored.append((recipient_id, recipient_info, estimated_cit))
+            slots.append(index)
+        probs = predict_pairs_viability(organ_info, scored, model, preprocessor, cache, logger)
+        for index, (recipient_id, recipient_info, estimated_cit), prob in zip(slots, scored, probs):
+            scores[index] = build_match_result(organ_info, recipient_info, recipient_id, prob, estimated_cit)["score"]
+        # Stable sort over request order gives the same tie order as the live ranking
+        return sorted(zip(recipient_ids, scores), key=lambda r: r[1], reverse=True)
+    return run
+
+
+def compare_rankings(primary, shadow, top_k=SHADOW_TOP_K):
+    """
+    primary / shadow: [(recipient_id, score), ...] best first.
+    Spearman correlation of the scores over the common recipients, top-k overlap, and whether the
+    full order is identical.
+    """
+    primary_scores = dict(primary)
+    shadow_scores = dict(shadow)
+    common = [rid for rid in primary_scores if rid in shadow_scores]
+    spearman = None
+    if len(common) >= 2:
+        value = pd.Series([primary_scores[r] for r in common]).corr(
+            pd.Series([shadow_scores[r] for r in common]), method='spearman')
+        spearman = None if pd.isna(value) else float(value) # Undefined when one side is constant
+    k = min(top_k, len(primary), len(shadow))
+    top_overlap = (len({r for r, _ in primary[:k]} & {r for r, _ in shadow[:k]}) / k) if k else 1.0
+    return {
+        "spearman": spearman,
+        "top_k_overlap": top_overlap,
+        "identical_order": [r for r, _ in primary] == [r for r, _ in shadow],
+        "max_abs_score_diff": max((abs(primary_scores[r] - shadow_scores[r]) for r in common), default=0.0),
+        "recipients": len(primary), "unmatched_recipients": len(primary) + len(shadow) - 2 * len(common)
+    }
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+class ShadowScorer:
+    """Samples requests, runs the shadow engine off the request thread and aggregates the comparisons."""
+
+    def __init__(self, engine_name, engine, sample_rate=SHADOW_SAMPLE_RATE, top_k=SHADOW_TOP_K,
+                 max_pending=MAX_PENDING_SHADOW_RUNS, logger=None):
+        self.engine_name = engine_name
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.top_k = top_k
+        self.max_pending = max_pending
+        self.logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow-scoring')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._comparisons = deque(maxlen=MAX_RECORDED_COMPARISONS)
+        self.requests_seen = 0
+        self.sampled = 0
+        self.dropped = 0 # Sampled but skipped because the shadow worker was backed up
+        self.errors = 0
+        self.last_error = None
+
+    def maybe_submit(self, organ_info, recipients_list, logistics_info, recipient_ids, primary_matches,
+                     primary_latency_seconds):
+        """
+        Called with the sorted /api/match_organs results once they are computed. Nothing is copied on the
+        request thread: the primary handler no longer touches the payload and the engines only read it.
+        """
+        with self._lock:
+            self.requests_seen += 1
+            if self.engine is None or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                return False
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.sampled += 1
+            self._pending += 1
+        self._executor.submit(self._run, organ_info, recipients_list, logistics_info, recipient_ids,
+                              primary_matches, primary_latency_seconds)
+        return True
+
+    def _run(self, organ_info, recipients_list, logistics_info, recipient_ids, primary_matches, primary_latency_seconds):
+        try:
+            primary_ranking = [(m["recipient_id"], m.get("score", 0.0)) for m in primary_matches]
+            start = time.perf_counter()
+            shadow_ranking = self.engine(organ_info, recipients_list, logistics_info, recipient_ids, self.logger)
+            shadow_latency = time.perf_counter() - start
+            comparison = compare_rankings(primary_ranking, shadow_ranking, self.top_k)
+            comparison.update(primary_ms=primary_latency_seconds * 1000, shadow_ms=shadow_latency * 1000,
+                              recorded_at=time.time())
+            with self._lock:
+                self._comparisons.append(comparison)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self.last_error = str(e)
+            if self.logger:
+                self.logger.error(f"Shadow scoring ({self.engine_name}) failed: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            comparisons = list(self._comparisons)
+            stats = {
+                "engine": self.engine_name, "enabled": self.engine is not None, "sample_rate": self.sample_rate,
+                "top_k": self.top_k, "requests_seen": self.requests_seen, "sampled": self.sampled,
+                "dropped": self.dropped, "errors": self.errors, "last_error": self.last_error,
+                "pending": self._pending, "comparisons": len(comparisons)
+            }
+        if comparisons:
+            spearman = [c["spearman"] for c in comparisons if c["spearman"] is not None]
+            primary_ms = [c["primary_ms"] for c in comparisons]
+            shadow_ms = [c["shadow_ms"] for c in comparisons]
+            delta_ms = [s - p for s, p in zip(shadow_ms, primary_ms)]
+            stats.update({
+                "spearman_mean": float(np.mean(spearman)) if spearman else None,
+                "spearman_min": float(np.min(spearman)) if spearman else None,
+                "top_k_overlap_mean": float(np.mean([c["top_k_overlap"] for c in comparisons])),
+                "top_k_overlap_min": float(np.min([c["top_k_overlap"] for c in comparisons])),
+                "identical_order_rate": float(np.mean([c["identical_order"] for c in comparisons])),
+                "max_abs_score_diff": float(np.max([c["max_abs_score_diff"] for c in comparisons])),
+                "primary_ms_p50": _percentile(primary_ms, 50), "primary_ms_p95": _percentile(primary_ms, 95),
+                "shadow_ms_p50": _percentile(shadow_ms, 50), "shadow_ms_p95": _percentile(shadow_ms, 95),
+                "latency_delta_ms_p50": _percentile(delta_ms, 50), "latency_delta_ms_p95": _percentile(delta_ms, 95),
+                "last_comparison": comparisons[-1]
+            })
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._comparisons.clear()
+            self.requests_seen = self.sampled = self.dropped = self.errors = 0
+            self.last_error = None
+
+
+def create_shadow_scorer(primary_model, primary_preprocessor, engine_name=SHADOW_ENGINE,
+                         sample_rate=SHADOW_SAMPLE_RATE, logger=None):
+    """
+    Builds the configured shadow engine:
+      'columnar' - the vectorized scorer with the primary model (validates the rewrite),
+      'model'    - the per-pair pipeline with the model/preprocessor at SHADOW_VIABILITY_MODEL_PATH /
+                   SHADOW_VIABILITY_PREPROCESSOR_PATH (validates a retrained model).
+    An engine that cannot be built leaves shadow scoring disabled.
+    """
+    engine = None
+    cache = ViabilityPredictionCache() # Separate from the live cache so shadow traffic does not evict it
+    try:
+        if engine_name == "columnar":
+            engine = columnar_engine(primary_model, primary_preprocessor, cache)
+        elif engine_name == "model":
+            if not (SHADOW_VIABILITY_MODEL_PATH and SHADOW_VIABILITY_PREPROCESSOR_PATH):
+                raise FileNotFoundError("SHADOW_VIABILITY_MODEL_PATH and SHADOW_VIABILITY_PREPROCESSOR_PATH must be set.")
+            engine = pipeline_engine(joblib.load(SHADOW_VIABILITY_MODEL_PATH),
+                                     joblib.load(SHADOW_VIABILITY_PREPROCESSOR_PATH), cache)
+        else:
+            raise ValueError(f"Unknown shadow engine '{engine_name}'. Expected one of: {', '.join(SHADOW_ENGINES)}.")
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Warning: shadow scoring disabled: {e}")
+    return ShadowScorer(engine_name, engine, sample_rate=sample_rate, logger=logger)
@@ -0,0 +1,128 @@
+# hopeconnect-ai/src/matching_engine/static_components.py
+
+import threading
+import numpy as np
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.risk_scorer import get_donor_risk_profile, get_recipient_risk_profile, calculate_basic_risk_scores
+
+# Score terms that depend on only one side of a donor/recipient pair.
+# They are computed once per recipient (waitlist version) and once per organ offer,
+# so per-pair scoring only has to do the pairwise terms (HLA, distance, viability, CIT).
+
+MAX_CACHED_RECIPIENTS = 200000
+
+
+def compute_recipient_static_components(recipient_info):
+    """Recipient-only score terms, exactly as calculate_match_score computes them."""
+    recipient_risk = get_recipient_risk_profile(recipient_info['recipient_age'], recipient_info.get('recipient_comorbidities', 0))
+    return {
+        "recipient_risk_factor": 1 - recipient_risk,
+        "urgency_score": recipient_info.get('urgency_score', 0.5)
+    }
+
+
+def compute_donor_static_components(organ_info):
+    """Donor-only score terms, exactly as calculate_match_score computes them."""
+    donor_risk = get_donor_risk_profile(organ_info['donor_age'], organ_info.get('donor_comorbidities', 0))
+    return {"donor_risk_factor": 1 - donor_risk}
+
+
+def compute_recipient_static_arrays(recipient_ages, recipient_comorbidities, urgency_scores):
+    """Columnar form of compute_recipient_static_components, for whole waitlists."""
+    return {
+        "recipient_risk_factor": 1 - calculate_basic_risk_scores(recipient_ages, recipient_comorbidities),
+        "urgency_score": np.asarray(urgency_scores, dtype=np.float64)
+    }
+
+
+def _recipient_fingerprint(recipient_info):
+    return (recipient_info.get('recipient_age'), recipient_info.get('recipient_comorbidities', 0),
+            recipient_info.get('urgency_score', 0.5))
+
+
+def _donor_fingerprint(organ_info):
+    return (organ_info.get('donor_age'), organ_info.get('donor_comorbidities', 0))
+
+
+class StaticComponentStore:
+    """
+    Thread-safe cache of recipient-only and donor-only components.
+
+    Each entry is validated against a fingerprint of its inputs (age, comorbidities, urgency) and
+    refreshed when they change; ids alone cannot be trusted (missing ids are generated per request and
+    may collide). When the caller supplies a waitlist version, the whole cache is dropped when it changes.
+    """
+
+    def __init__(self, max_recipients=MAX_CACHED_RECIPIENTS):
+        self.max_recipients = max_recipients
+        self._lock = threading.Lock()
+        self._waitlist_version = None
+        self._recipients = {}
+        self._donors = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_version(self, waitlist_version):
+        if waitlist_version is not None and waitlist_version != self._waitlist_version:
+            self._recipients.clear()
+            self._donors.clear()
+            self._waitlist_version = waitlist_version
+
+    def get_recipient_components(self, recipient_id, recipient_info, waitlist_version=None):
+        fingerprint = _recipient_fingerprint(recipient_info)
+        with self._lock:
+            self._sync_version(waitlist_version)
+            cached = self._recipients.get(recipient_id)
+            if cached is not None and cached[0] == fingerprint:
+                self.hits += 1
+                return cached[1]
+
+        components = compute_recipient_static_components(recipient_info)
+        with self._lock:
+            self.misses += 1
+            if len(self._recipients) >= self.max_recipients:
+                self._recipients.clear() # Simple bound: waitlists are re-warmed on the next request
+            self._recipients[recipient_id] = (fingerprint, components)
+        return components
+
+    def get_donor_components(self, organ_info, offer_id=None):
+        key = offer_id if offer_id is not None else _donor_fingerprint(organ_info)
+        fingerprint = _donor_fingerprint(organ_info)
+        with self._lock:
+            cached = self._donors.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+        components = compute_donor_static_components(organ_info)
+        with self._lock:
+            if len(self._donors) >= self.max_recipients:
+                self._donors.clear()
+            self._donors[key] = (fingerprint, components)
+        return components
+
+    def invalidate(self, recipient_id=None):
+        """Drops one recipient's entry, or everything when recipient_id is None."""
+        with self._lock:
+            if recipient_id is None:
+                self._recipients.clear()
+                self._donors.clear()
+            else:
+                self._recipients.pop(recipient_id, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "waitlist_version": self._waitlist_version,
+                "cached_recipients": len(self._recipients),
+                "cached_donors": len(self._donors),
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0
+            }
@@ -0,0 +1,248 @@
+# hopeconnect-ai/src/matching_engine/weight_sweep.py
+
+import math
+import time
+import logging
+import numpy as np
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.columnar_scorer import calculate_score_components
+from src.matching_engine.match_pipeline import (
+    REQUIRED_RECIPIENT_FIELDS, prepare_recipient_columns, recipient_columns_from_records
+)
+from src.matching_engine.weighted_scorer import WEIGHTS, SCORE_COMPONENTS
+
+# Sensitivity of a ranking to the score WEIGHTS. The weight-independent work of /api/match_organs
+# (distances, HLA, viability) is done once per candidate into a candidates x SCORE_COMPONENTS matrix;
+# each weight vector is then one column of a matrix product, normalized and clipped as in
+# calculate_match_scores. Vectors are evaluated in chunks so the score matrix stays within
+# WEIGHT_SWEEP_CHUNK_CELLS. Scores agree with calculate_match_scores up to float rounding (the product
+# sums the terms in a different order), so exact ties may break differently.
+#
+# Every vector is compared with the current WEIGHTS ("current", always the first vector): Spearman rank
+# correlation over the eligible candidates, overlap of the top-K and whether the top candidate changes.
+# Per candidate, how often and at which ranks it appears in the top-K across all vectors.
+
+DEFAULT_SWEEP_TOP_K = 10
+MAX_SWEEP_TOP_K = 1000
+WEIGHT_SWEEP_MAX_VECTORS = int(os.environ.get('WEIGHT_SWEEP_MAX_VECTORS', 2000))
+WEIGHT_SWEEP_CHUNK_CELLS = int(os.environ.get('WEIGHT_SWEEP_CHUNK_CELLS', 4000000)) # Scores per matrix product
+DEFAULT_PERTURBATION_SCALE = 0.2 # Standard deviation of the log-normal factor applied to each weight
+REFERENCE_VECTOR_NAME = "current"
+
+_default_logger = logging.getLogger(__name__)
+
+
+class WeightSweepError(ValueError):
+    """Invalid weight vectors or sweep options."""
+
+
+def _weight_value(name, key, value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value) or value < 0:
+        raise WeightSweepError(f"Vector '{name}': weight '{key}' must be a non-negative number.")
+    return float(value)
+
+
+def normalize_weight_vector(spec, index):
+    """
+    (name, weights) from one entry of "weight_vectors": either a list of len(SCORE_COMPONENTS) numbers
+    in SCORE_COMPONENTS order, or {"name", "weights"} whose weights override WEIGHTS key by key.
+    """
+    if isinstance(spec, list):
+        name = f"vector_{index}"
+        if len(spec) != len(SCORE_COMPONENTS):
+            raise WeightSweepError(f"Vector '{name}' must have {len(SCORE_COMPONENTS)} weights "
+                                   f"({', '.join(SCORE_COMPONENTS)}).")
+        weights = {key: _weight_value(name, key, value) for key, value in zip(SCORE_COMPONENTS, spec)}
+    elif isinstance(spec, dict):
+        name = str(spec.get("name") or f"vector_{index}")
+        overrides = spec.get("weights") or {}
+        if not isinstance(overrides, dict):
+            raise WeightSweepError(f"Vector '{name}': 'weights' must be an object.")
+        weights = dict(WEIGHTS)
+        for key, value in overrides.items():
+            if key not in SCORE_COMPONENTS:
+                raise WeightSweepError(f"Vector '{name}': unknown weight '{key}'. Expected one of: {', '.join(SCORE_COMPONENTS)}.")
+            weights[key] = _weight_value(name, key, value)
+    else:
+        raise WeightSweepError("Each weight vector must be a list of numbers or an object with 'weights'.")
+    if sum(weights[key] for key in SCORE_COMPONENTS) <= 0:
+        raise WeightSweepError(f"Vector '{name}': at least one weight must be positive.")
+    return name, {key: float(weights[key]) for key in SCORE_COMPONENTS}
+
+
+def perturbed_weight_vectors(count, scale=DEFAULT_PERTURBATION_SCALE, seed=0):
+    """`count` random variations of WEIGHTS: each weight times an independent log-normal factor."""
+    rng = np.random.default_rng(seed)
+    base = np.array([WEIGHTS[key] for key in SCORE_COMPONENTS], dtype=np.float64)
+    factors = np.exp(rng.normal(0.0, scale, size=(count, len(SCORE_COMPONENTS))))
+    return [(f"perturbed_{i}", dict(zip(SCORE_COMPONENTS, row.tolist()))) for i, row in enumerate(base * factors)]
+
+
+def normalize_sweep_options(data):
+    """
+    Validated ([(name, weights)], top_k) from a request body: "weight_vectors" (see normalize_weight_vector),
+    "perturb" {"count", "scale", "seed"} for generated variations of WEIGHTS, and "top_k".
+    The current WEIGHTS are always the first vector. Raises WeightSweepError.
+    """
+    vectors = [(REFERENCE_VECTOR_NAME, {key: float(WEIGHTS[key]) for key in SCORE_COMPONENTS})]
+    specs = data.get("weight_vectors") or []
+    if not isinstance(specs, list):
+        raise WeightSweepError("'weight_vectors' must be a list.")
+    vectors.extend(normalize_weight_vector(spec, i) for i, spec in enumerate(specs))
+
+    perturb = data.get("perturb")
+    if perturb is not None:
+        if not isinstance(perturb, dict):
+            raise WeightSweepError("'perturb' must be an object with 'count' (and optional 'scale', 'seed').")
+        count, scale, seed = perturb.get("count"), perturb.get("scale", DEFAULT_PERTURBATION_SCALE), perturb.get("seed", 0)
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise WeightSweepError("'perturb.count' must be a positive integer.")
+        if not isinstance(scale, (int, float)) or isinstance(scale, bool) or not 0 < scale <= 5:
+            raise WeightSweepError("'perturb.scale' must be a number in (0, 5].")
+        if not isinstance(seed, int) or isinstance(seed, bool):
+            raise WeightSweepError("'perturb.seed' must be an integer.")
+    else:
+        count, scale, seed = 0, None, None
+    if len(vectors) - 1 + count > WEIGHT_SWEEP_MAX_VECTORS: # Checked before generating the perturbed vectors
+        raise WeightSweepError(f"At most {WEIGHT_SWEEP_MAX_VECTORS} weight vectors per sweep ({len(vectors) - 1 + count} given).")
+    if count:
+        vectors.extend(perturbed_weight_vectors(count, float(scale), seed))
+    if len(vectors) == 1:
+        raise WeightSweepError("Provide 'weight_vectors' and/or 'perturb'.")
+    names = [name for name, _ in vectors]
+    if len(set(names)) != len(names):
+        raise WeightSweepError("Weight vector names must be unique.")
+
+    top_k = data.get("top_k", DEFAULT_SWEEP_TOP_K)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or not 1 <= top_k <= MAX_SWEEP_TOP_K:
+        raise WeightSweepError(f"'top_k' must be an integer between 1 and {MAX_SWEEP_TOP_K}.")
+    return vectors, top_k
+
+
+def component_matrix(terms, n):
+    """calculate_score_components terms -> float64 (n, len(SCORE_COMPONENTS)) matrix; scalar terms are repeated."""
+    return np.column_stack([np.broadcast_to(np.asarray(terms[key], dtype=np.float64), (n,)) for key in SCORE_COMPONENTS])
+
+
+def _score_matrix(components, weight_matrix):
+    """Scores of every candidate (rows) under every weight vector (columns), as calculate_match_scores."""
+    sums = weight_matrix.sum(axis=1)
+    scores = components @ weight_matrix.T
+    scores /= np.where((sums != 0) & (sums != 1.0), sums, 1.0)
+    return np.clip(scores, 0.0, 1.0, out=scores)
+
+
+def sweep_weights(components, candidate_ids, vectors, top_k=DEFAULT_SWEEP_TOP_K):
+    """
+    Ranks the candidates (rows of `components`, all eligible) under every (name, weights) in `vectors`;
+    the first vector is the reference. Ties keep candidate order, as in /api/match_organs.
+    Returns {"vectors": [...], "candidate_stability": [...], "summary": {...}}; ranks are 1-based.
+    """
+    n, m = len(components), len(vectors)
+    k = min(top_k, n)
+    weight_matrix = np.array([[weights[key] for key in SCORE_COMPONENTS] for _, weights in vectors], dtype=np.float64)
+
+    reference_order = np.argsort(-_score_matrix(components, weight_matrix[:1])[:, 0], kind='stable')
+    reference_rank = np.empty(n, dtype=np.int64)
+    reference_rank[reference_order] = np.arange(n)
+    reference_top = reference_rank < k
+
+    top_k_counts = np.zeros(n, dtype=np.int64)
+    rank_sums = np.zeros(n, dtype=np.int64)
+    best_rank = np.full(n, n, dtype=np.int64)
+    worst_rank = np.zeros(n, dtype=np.int64)
+    results = []
+    chunk = max(1, WEIGHT_SWEEP_CHUNK_CELLS // max(n, 1))
+    for start in range(0, m, chunk):
+        scores = _score_matrix(components, weight_matrix[start:start + chunk])
+        order = np.argsort(-scores, axis=0, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(n)[:, None], axis=0)
+
+        if n > 1: # Ordinal ranks have no ties, so the d^2 formula is exact
+            spearman = 1.0 - 6.0 * ((ranks - reference_rank[:, None]) ** 2).sum(axis=0) / (n * (n * n - 1.0))
+        else:
+            spearman = np.ones(ranks.shape[1])
+        in_top = ranks < k
+        overlap = (in_top & reference_top[:, None]).sum(axis=0) / k if k else np.ones(ranks.shape[1])
+        top_k_counts += in_top.sum(axis=1)
+        rank_sums += ranks.sum(axis=1)
+        if n:
+            np.minimum(best_rank, ranks.min(axis=1), out=best_rank)
+            np.maximum(worst_rank, ranks.max(axis=1), out=worst_rank)
+
+        for j in range(scores.shape[1]):
+            name, weights = vectors[start + j]
+            top = order[:k, j]
+            results.append({
+                "name": name, "weights": weights,
+                "top_k": [{"rank": rank + 1, "recipient_id": candidate_ids[i], "score": float(scores[i, j])}
+                          for rank, i in enumerate(top.tolist())],
+                "spearman_vs_reference": float(spearman[j]),
+                "top_k_overlap_vs_reference": float(overlap[j]),
+                "top_candidate_unchanged": bool(n == 0 or top[0] == reference_order[0])
+            })
+
+    # Candidates that reach the top-K under at least one vector, in reference order
+    stability = [{
+        "recipient_id": candidate_ids[i], "reference_rank": int(reference_rank[i]) + 1,
+        "best_rank": int(best_rank[i]) + 1, "worst_rank": int(worst_rank[i]) + 1,
+        "mean_rank": float(rank_sums[i] / m) + 1, "top_k_frequency": float(top_k_counts[i] / m)
+    } for i in sorted(np.flatnonzero(top_k_counts).tolist(), key=lambda i: reference_rank[i])]
+
+    alternatives = results[1:]
+    summary = {
+        "vectors": m - 1, "candidates": n, "top_k": k,
+        "mean_spearman_vs_reference": float(np.mean([r["spearman_vs_reference"] for r in alternatives])),
+        "min_spearman_vs_reference": float(min(r["spearman_vs_reference"] for r in alternatives)),
+        "mean_top_k_overlap_vs_reference": float(np.mean([r["top_k_overlap_vs_reference"] for r in alternatives])),
+        "min_top_k_overlap_vs_reference": float(min(r["top_k_overlap_vs_reference"] for r in alternatives)),
+        "top_candidate_unchanged_rate": float(np.mean([r["top_candidate_unchanged"] for r in alternatives])),
+        "distinct_top_candidates": len({r["top_k"][0]["recipient_id"] for r in results if r["top_k"]})
+    }
+    return {"vectors": results, "candidate_stability": stability, "summary": summary}
+
+
+def run_weight_sweep(organ_info, recipients_list, logistics_info, model, preprocessor, cache, vectors,
+                     top_k=DEFAULT_SWEEP_TOP_K, logger=None):
+    """
+    Weight sweep over a /api/match_organs request (organ, recipient dicts, logistics map). Recipients
+    missing required fields are skipped; blood type incompatible ones and those over the CIT limit are
+    left out of the rankings (they score 0 under every vector). See sweep_weights for the result.
+    """
+    logger = logger or _default_logger
+    started = time.perf_counter()
+    n = len(recipients_list)
+    recipient_ids = [r.get("recipient_id", f"Recipient_{i}") if isinstance(r, dict) else f"Recipient_{i}"
+                     for i, r in enumerate(recipients_list)]
+    recipients = recipient_columns_from_records(recipients_list, recipient_ids, logistics_info, logger)
+    prepared = prepare_recipient_columns(organ_info, recipients, n, model, preprocessor, cache, logger)
+    valid = prepared["valid"]
+    terms, eligible = calculate_score_components(
+        organ_info, {key: values[valid] for key, values in recipients.items()},
+        prepared["graft_survival_probs"][valid], prepared["cit"][valid], prepared["max_cit"], prepared["distances"][valid])
+    components = component_matrix(terms, int(valid.sum()))[eligible]
+    candidate_ids = [recipient_ids[i] for i in np.flatnonzero(valid)[eligible].tolist()]
+    components_done = time.perf_counter()
+
+    result = sweep_weights(components, candidate_ids, vectors, top_k)
+    missing_matrix = prepared["missing_matrix"]
+    result["skipped"] = [{
+        "recipient_id": recipient_ids[i],
+        "error": f"Missing fields for recipient: {', '.join(f for f, m in zip(REQUIRED_RECIPIENT_FIELDS, missing_matrix[i]) if m)}"
+    } for i in np.flatnonzero(~valid).tolist()]
+    result["summary"].update({
+        "recipients": n, "ineligible": int(valid.sum()) - len(candidate_ids), "reference": vectors[0][0],
+        "components": SCORE_COMPONENTS,
+        "timings": {"components_ms": (components_done - started) * 1000,
+                    "sweep_ms": (time.perf_counter() - components_done) * 1000}
+    })
+    return result
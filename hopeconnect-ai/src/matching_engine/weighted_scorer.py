@@ -15,7 +15,8 @@ if PROJECT_ROOT not in sys.path:
 # Corrected absolute imports from src
 from src.matching_engine.preprocessor import check_blood_compatibility, calculate_hla_mismatch
 from src.matching_engine.risk_scorer import get_donor_risk_profile, get_recipient_risk_profile
-from src.matching_engine.distance_calculator import calculate_distance_km, distance_factor
+from src.matching_engine.distance_calculator import distance_factor
+from src.matching_engine.center_distances import pair_distance_km
 
 # Define weights for different factors
 WEIGHTS = {
@@ -34,18 +35,10 @@ def normalize_hla_score(mismatches, max_mismatches=4):
 def normalize_risk_score(risk_val):
     return 1 - risk_val
 
-def calculate_match_score(organ_data, recipient_data, graft_survival_prob, estimated_cold_ischemia_hours, max_allowable_cold_ischemia):
-    # ... (rest of your calculate_match_score function - no changes needed inside it)
-
-    # 1. Blood Type Compatibility (Prerequisite)
-    blood_compatible = check_blood_compatibility(organ_data['donor_blood_type'], recipient_data['recipient_blood_type'])
-    if not blood_compatible:
-        return 0.0
-
-    # 2. Cold Ischemia Time Check (Prerequisite)
-    if estimated_cold_ischemia_hours > max_allowable_cold_ischemia:
-        return 0.0
+SCORE_COMPONENTS = ["hla_mismatch", "donor_risk", "recipient_risk", "distance", "graft_viability", "recipient_urgency"]
 
+def _score_factors(organ_data, recipient_data, graft_survival_prob, recipient_components=None, donor_components=None):
+    """Normalized (0-1) value of each weighted score component, keyed like WEIGHTS."""
     # 3. HLA Mismatch Score
     # Ensure HLA keys are like 'donor_hla_a1', 'donor_hla_a2', etc.
     # or 'donor_hla_A1', 'donor_hla_A2' - be consistent with your data
@@ -68,42 +61,93 @@ def calculate_match_score(organ_data, recipient_data, graft_survival_prob, estim
     hla_score = normalize_hla_score(hla_mismatches)
 
     # 4. Donor Risk Score
-    donor_risk = get_donor_risk_profile(organ_data['donor_age'], organ_data.get('donor_comorbidities', 0))
-    donor_risk_factor = normalize_risk_score(donor_risk)
+    if donor_components is not None:
+        donor_risk_factor = donor_components["donor_risk_factor"]
+    else:
+        donor_risk = get_donor_risk_profile(organ_data['donor_age'], organ_data.get('donor_comorbidities', 0))
+        donor_risk_factor = normalize_risk_score(donor_risk)
 
     # 5. Recipient Risk Score
-    recipient_risk = get_recipient_risk_profile(recipient_data['recipient_age'], recipient_data.get('recipient_comorbidities', 0))
-    recipient_risk_factor = normalize_risk_score(recipient_risk)
+    if recipient_components is not None:
+        recipient_risk_factor = recipient_components["recipient_risk_factor"]
+    else:
+        recipient_risk = get_recipient_risk_profile(recipient_data['recipient_age'], recipient_data.get('recipient_comorbidities', 0))
+        recipient_risk_factor = normalize_risk_score(recipient_risk)
 
     # 6. Distance Score
-    dist_km = calculate_distance_km(
-        organ_data.get('donor_location_lat'), organ_data.get('donor_location_lon'), # Use .get for safety
-        recipient_data.get('recipient_location_lat'), recipient_data.get('recipient_location_lon')
-    )
+    dist_km = pair_distance_km(organ_data, recipient_data) # Center table when both are known centers, else geodesic
     dist_score = distance_factor(dist_km, max_effective_distance=1000)
 
     # 7. Graft Viability Score
     viability_score = graft_survival_prob
 
     # 8. Recipient Urgency Score
-    urgency_score = recipient_data.get('urgency_score', 0.5)
+    if recipient_components is not None:
+        urgency_score = recipient_components["urgency_score"]
+    else:
+        urgency_score = recipient_data.get('urgency_score', 0.5)
+
+    return {
+        "hla_mismatch": hla_score, "donor_risk": donor_risk_factor, "recipient_risk": recipient_risk_factor,
+        "distance": dist_score, "graft_viability": viability_score, "recipient_urgency": urgency_score
+    }
+
+def calculate_match_score(organ_data, recipient_data, graft_survival_prob, estimated_cold_ischemia_hours, max_allowable_cold_ischemia,
+                          recipient_components=None, donor_components=None):
+    # recipient_components / donor_components: optional precomputed single-side terms
+    # (see matching_engine.static_components). When given, only the pairwise terms are computed here.
+
+    # 1. Blood Type Compatibility (Prerequisite)
+    blood_compatible = check_blood_compatibility(organ_data['donor_blood_type'], recipient_data['recipient_blood_type'])
+    if not blood_compatible:
+        return 0.0
+
+    # 2. Cold Ischemia Time Check (Prerequisite)
+    if estimated_cold_ischemia_hours > max_allowable_cold_ischemia:
+        return 0.0
+
+    # 3.-8. Weighted components
+    factors = _score_factors(organ_data, recipient_data, graft_survival_prob, recipient_components, donor_components)
 
     score = (
-        WEIGHTS["hla_mismatch"] * hla_score +
-        WEIGHTS["donor_risk"] * donor_risk_factor +
-        WEIGHTS["recipient_risk"] * recipient_risk_factor +
-        WEIGHTS["distance"] * dist_score +
-        WEIGHTS["graft_viability"] * viability_score +
-        WEIGHTS["recipient_urgency"] * urgency_score
+        WEIGHTS["hla_mismatch"] * factors["hla_mismatch"] +
+        WEIGHTS["donor_risk"] * factors["donor_risk"] +
+        WEIGHTS["recipient_risk"] * factors["recipient_risk"] +
+        WEIGHTS["distance"] * factors["distance"] +
+        WEIGHTS["graft_viability"] * factors["graft_viability"] +
+        WEIGHTS["recipient_urgency"] * factors["recipient_urgency"]
     )
     
-    active_weights_sum = sum(WEIGHTS[k] for k in ["hla_mismatch", "donor_risk", "recipient_risk", "distance", "graft_viability", "recipient_urgency"])
+    active_weights_sum = sum(WEIGHTS[k] for k in SCORE_COMPONENTS)
     if active_weights_sum != 0 and active_weights_sum != 1.0 : # Normalize if weights don't sum to 1
          score = score / active_weights_sum
 
 
     return max(0.0, min(score, 1.0))
 
+def explain_match_score(organ_data, recipient_data, graft_survival_prob, estimated_cold_ischemia_hours, max_allowable_cold_ischemia,
+                        recipient_components=None, donor_components=None):
+    """
+    Breakdown of calculate_match_score: the prerequisite checks and, per weighted component, its
+    normalized value, weight and contribution to the score. Contributions sum to the score unless a
+    prerequisite fails (score 0) or the sum is clipped to [0, 1].
+    """
+    blood_compatible = bool(check_blood_compatibility(organ_data['donor_blood_type'], recipient_data['recipient_blood_type']))
+    within_cit_limit = bool(estimated_cold_ischemia_hours <= max_allowable_cold_ischemia)
+    factors = _score_factors(organ_data, recipient_data, graft_survival_prob, recipient_components, donor_components)
+    active_weights_sum = sum(WEIGHTS[k] for k in SCORE_COMPONENTS)
+    normalizer = active_weights_sum if active_weights_sum != 0 and active_weights_sum != 1.0 else 1.0
+    return {
+        "blood_compatible": blood_compatible, "within_cit_limit": within_cit_limit,
+        "components": [
+            {"component": name, "value": float(factors[name]), "weight": WEIGHTS[name],
+             "contribution": float(WEIGHTS[name] * factors[name] / normalizer)}
+            for name in SCORE_COMPONENTS
+        ],
+        "score": float(calculate_match_score(organ_data, recipient_data, graft_survival_prob, estimated_cold_ischemia_hours,
+                                             max_allowable_cold_ischemia, recipient_components, donor_components))
+    }
+
 
 if __name__ == '__main__':
     sample_organ = {
@@ -0,0 +1,207 @@
+# hopeconnect-ai/src/prediction_models/cit_curves.py
+
+import bisect
+import json
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.prediction_models.feature_engineering import get_compiled_viability_transform
+from src.prediction_models.prediction_cache import VIABILITY_CACHE_FEATURES, model_version_key
+
+# Viability-vs-CIT curves. Cold ischemia time is the only viability input that changes while an offer
+# is open. A tree ensemble is piecewise constant along each feature: its output only changes where some
+# tree splits on that feature. The CIT split thresholds are read from the booster, the model is evaluated
+# once per interval between consecutive thresholds (one batched call per set of pairs), and later CIT
+# values are answered by locating their interval with a binary search. The curve is exact, not an
+# interpolation: the query CIT is scaled and rounded to float32 exactly as the model input would be.
+
+CIT_FEATURE = 'cold_ischemia_time_hours'
+CURVE_KEY_FEATURES = [f for f in VIABILITY_CACHE_FEATURES if f != CIT_FEATURE] # A curve covers every CIT
+MAX_CACHED_CURVES = int(os.environ.get('VIABILITY_CURVE_CACHE_MAX_ENTRIES', 20000))
+
+
+class CITSplitGrid:
+    """Sorted float32 CIT split thresholds of one model (in scaled units) and the scaler constants for CIT."""
+
+    def __init__(self, thresholds, mean, scale, column):
+        self.thresholds = thresholds # float32, ascending, unique
+        self.threshold_list = thresholds.astype(np.float64).tolist() # Exact: float32 values fit in float64
+        self.mean = float(mean)
+        self.scale = float(scale)
+        self.column = column # Index of the CIT column in the processed feature matrix
+
+    @property
+    def n_intervals(self):
+        return len(self.thresholds) + 1
+
+    def interval_representatives(self):
+        """One float32 scaled CIT value inside each interval; interval k holds values with k thresholds <= value."""
+        if len(self.thresholds) == 0:
+            return np.zeros(1, dtype=np.float32)
+        below = np.nextafter(self.thresholds[0], np.float32(-np.inf))
+        return np.concatenate([[below], self.thresholds]).astype(np.float32)
+
+    def interval(self, cit_hours):
+        """Interval index of a raw CIT value, computed as the model would see it (float64 scaling, float32 rounding)."""
+        scaled = float(np.float32((float(cit_hours) - self.mean) / self.scale))
+        return bisect.bisect_right(self.threshold_list, scaled) # XGBoost goes left when value < threshold
+
+
+_split_grids = {}
+_split_grids_lock = threading.Lock()
+
+
+def get_cit_split_grid(model, preprocessor):
+    """
+    CITSplitGrid for an XGBoost model and its fitted preprocessor, built once per pair. None if the
+    model is not a plain booster over the preprocessor output (e.g. the distilled "fast" tier model).
+    """
+    key = (id(model), id(preprocessor))
+    with _split_grids_lock:
+        entry = _split_grids.get(key)
+        if entry is not None and entry[0] is model and entry[1] is preprocessor:
+            return entry[2]
+
+    grid = None
+    if hasattr(model, 'get_booster'):
+        compiled = get_compiled_viability_transform(preprocessor)
+        j = compiled.num_features.index(CIT_FEATURE)
+        column = compiled.num_offset + j
+        booster = model.get_booster()
+        if booster.feature_names:
+            column = list(booster.feature_names).index(f"num__{CIT_FEATURE}")
+        trees = json.loads(booster.save_raw(raw_format='json'))['learner']['gradient_booster']['model']['trees']
+        thresholds = [
+            condition for tree in trees
+            for feature, condition, left in zip(tree['split_indices'], tree['split_conditions'], tree['left_children'])
+            if left != -1 and feature == column
+        ]
+        grid = CITSplitGrid(np.unique(np.asarray(thresholds, dtype=np.float32)), compiled.mean[j], compiled.scale[j], column)
+
+    with _split_grids_lock:
+        _split_grids[key] = (model, preprocessor, grid)
+    return grid
+
+
+class ViabilityCurve:
+    """Graft survival probability of one donor/recipient pair for every CIT value."""
+    __slots__ = ('grid', 'probs')
+
+    def __init__(self, grid, probs):
+        self.grid = grid
+        self.probs = probs # One probability per CIT interval
+
+    def predict(self, cit_hours):
+        return self.probs[self.grid.interval(cit_hours)]
+
+    def as_points(self):
+        """[(interval start in raw CIT hours, probability)]; the first interval starts at -inf."""
+        starts = [float('-inf')] + [t * self.grid.scale + self.grid.mean for t in self.grid.threshold_list]
+        return list(zip(starts, self.probs))
+
+
+def build_viability_curves(input_df, model, preprocessor, grid=None):
+    """
+    Curves for every row of input_df (CURVE_KEY_FEATURES columns; a CIT column is ignored). All pairs x
+    intervals are evaluated in one predict_proba call on the processed matrix with the CIT column overwritten.
+    """
+    grid = grid or get_cit_split_grid(model, preprocessor)
+    if grid is None:
+        raise ValueError("CIT curves need an XGBoost model over the viability preprocessor output.")
+    n_rows = len(input_df)
+    if n_rows == 0:
+        return []
+    columns = {f: input_df[f].to_numpy() for f in CURVE_KEY_FEATURES}
+    columns[CIT_FEATURE] = np.zeros(n_rows)
+    base = get_compiled_viability_transform(preprocessor).transform(columns).copy()
+
+    representatives = grid.interval_representatives()
+    X = np.repeat(base, len(representatives), axis=0)
+    X[:, grid.column] = np.tile(representatives, n_rows)
+    probs = model.predict_proba(X)[:, 1].astype(np.float64).reshape(n_rows, len(representatives))
+    return [ViabilityCurve(grid, row) for row in probs.tolist()]
+
+
+class ViabilityCurveCache:
+    """
+    Thread-safe LRU of ViabilityCurves keyed by the non-CIT features and the model version, so a CIT
+    update for a known pair costs a binary search instead of a model call.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_CURVES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.curves_built = 0
+        self.evictions = 0
+        self.build_seconds = 0.0
+
+    def supports(self, model, preprocessor):
+        return bool(model and preprocessor) and get_cit_split_grid(model, preprocessor) is not None
+
+    def curves(self, rows, model, preprocessor):
+        """Curves for a list of viability feature dicts; missing ones are built in one batch."""
+        version = model_version_key(model, preprocessor)
+        keys = [(version,) + tuple(row[f] for f in CURVE_KEY_FEATURES) for row in rows]
+        found = {}
+        with self._lock:
+            for key in keys:
+                curve = self._entries.get(key)
+                if curve is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = curve
+            self.lookups += len(keys)
+            self.hits += sum(1 for key in keys if key in found)
+
+        first_row = {}
+        for key, row in zip(keys, rows):
+            first_row.setdefault(key, row)
+        missing = [key for key in first_row if key not in found]
+        if missing:
+            started = time.perf_counter()
+            fresh = build_viability_curves(pd.DataFrame([first_row[key] for key in missing], columns=CURVE_KEY_FEATURES),
+                                           model, preprocessor)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                for key, curve in zip(missing, fresh):
+                    self._entries[key] = curve
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+                self.curves_built += len(fresh)
+                self.build_seconds += elapsed
+            found.update(zip(missing, fresh))
+        return [found[key] for key in keys]
+
+    def predict(self, row, model, preprocessor):
+        """Graft survival probability for one viability feature dict (identical to predict_graft_survival)."""
+        return self.curves([row], model, preprocessor)[0].predict(row[CIT_FEATURE])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            some_curve = next(iter(self._entries.values()), None)
+            return {
+                "cached_curves": len(self._entries), "max_entries": self.max_entries,
+                "lookups": self.lookups, "hits": self.hits, "hit_rate": (self.hits / self.lookups) if self.lookups else 0.0,
+                "curves_built": self.curves_built, "evictions": self.evictions,
+                "mean_build_ms_per_curve": (self.build_seconds * 1000 / self.curves_built) if self.curves_built else 0.0,
+                "cit_intervals": some_curve.grid.n_intervals if some_curve is not None else None
+            }
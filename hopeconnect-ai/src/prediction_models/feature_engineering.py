@@ -5,6 +5,7 @@ from sklearn.pipeline import Pipeline
 import numpy as np
 import joblib
 import os
+import threading
 
 MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'models')
 VIABILITY_PREPROCESSOR_PATH = os.path.join(MODEL_DIR, 'viability_preprocessor.joblib')
@@ -84,6 +85,17 @@ def preprocess_for_viability_training(df):
     if df_processed.empty:
         raise ValueError("DataFrame became empty after dropping NaNs. Check your data and feature list for viability model.")
 
+    return fit_viability_preprocessor(df_processed)
+
+
+def fit_viability_preprocessor(df_processed, save=True):
+    """
+    Fits the viability ColumnTransformer on engineered features (VIAB_NUM_FEATURES +
+    VIAB_CAT_FEATURES, plus the optional 'graft_survival_1_year' target) and saves it unless save=False.
+    Returns the transformed DataFrame (with the target) and the fitted preprocessor.
+    """
+    all_features_for_model = VIAB_NUM_FEATURES + VIAB_CAT_FEATURES
+
     # Define transformers
     numerical_transformer = StandardScaler()
     categorical_transformer = OneHotEncoder(handle_unknown='ignore', sparse_output=False)
@@ -112,10 +124,11 @@ def preprocess_for_viability_training(df):
     else:
         final_df = X_processed_df
 
-    if not os.path.exists(MODEL_DIR):
-        os.makedirs(MODEL_DIR)
-    joblib.dump(preprocessor, VIABILITY_PREPROCESSOR_PATH)
-    print(f"Viability preprocessor saved to {VIABILITY_PREPROCESSOR_PATH}")
+    if save:
+        if not os.path.exists(MODEL_DIR):
+            os.makedirs(MODEL_DIR)
+        joblib.dump(preprocessor, VIABILITY_PREPROCESSOR_PATH)
+        print(f"Viability preprocessor saved to {VIABILITY_PREPROCESSOR_PATH}")
 
     return final_df, preprocessor
 
@@ -176,6 +189,119 @@ def preprocess_for_viability_prediction(input_data_df, preprocessor=None):
     return pd.DataFrame(X_processed, columns=feature_names_out, index=input_df_processed.index)
 
 
+
+def count_hla_mismatches_columns(columns):
+    """Vectorized calculate_simple_hla_mismatches over column arrays (missing alleles count as mismatches)."""
+    n = len(columns[DONOR_HLA_COLS[0]])
+    mismatches = np.zeros(n, dtype=np.int64)
+    for donor_col, recipient_col in zip(DONOR_HLA_COLS, RECIPIENT_HLA_COLS):
+        donor = pd.Series(columns[donor_col], dtype=object)
+        recipient = pd.Series(columns[recipient_col], dtype=object)
+        missing = donor.isna().to_numpy() | recipient.isna().to_numpy()
+        differs = (donor.astype(str).str.strip().str.upper() != recipient.astype(str).str.strip().str.upper()).to_numpy()
+        mismatches += (missing | differs)
+    return mismatches
+
+
+class CompiledViabilityTransform:
+    """
+    Allocation-conscious equivalent of preprocessor.transform for the fitted viability ColumnTransformer.
+
+    Scaler statistics and one-hot index mappings are extracted once. transform() then writes float32
+    features straight into a reused per-thread buffer: no input copy, no intermediate DataFrames and
+    no float64 feature matrix. Scaling is computed in float64 and rounded once to float32, which is
+    exactly what XGBoost does with the float64 output of the sklearn path, so predictions are identical.
+    """
+
+    def __init__(self, preprocessor):
+        scaler = preprocessor.named_transformers_['num']
+        encoder = preprocessor.named_transformers_['cat']
+        remainder = preprocessor.output_indices_.get('remainder', slice(0, 0))
+        if remainder.stop - remainder.start > 0:
+            raise ValueError("Compiled viability transform does not support passthrough remainder columns.")
+        if getattr(encoder, 'drop_idx_', None) is not None:
+            raise ValueError("Compiled viability transform does not support OneHotEncoder(drop=...).")
+
+        self.num_features = list(preprocessor.transformers_[0][2])
+        self.cat_features = list(preprocessor.transformers_[1][2])
+        self.num_offset = preprocessor.output_indices_['num'].start
+        self.mean = np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(len(self.num_features)), dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_ if scaler.with_std else np.ones(len(self.num_features)), dtype=np.float64)
+
+        # category -> output column index, per categorical feature
+        self.cat_offsets = []
+        self.category_index = []
+        offset = preprocessor.output_indices_['cat'].start
+        for categories in encoder.categories_:
+            self.cat_offsets.append(offset)
+            self.category_index.append({category: i for i, category in enumerate(categories)})
+            offset += len(categories)
+        self.n_features_out = offset
+        self.feature_names_out = preprocessor.get_feature_names_out()
+        self._local = threading.local()
+
+    def _buffer(self, n_rows):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[0] < n_rows:
+            buffer = np.empty((max(n_rows, 1), self.n_features_out), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:n_rows]
+
+    def transform(self, columns, out=None):
+        """
+        columns: DataFrame or {name: array}. An absent hla_mismatches_count is computed from the individual
+        HLA columns when they are all present. A numeric column that is still absent is written as 0 before
+        scaling (preprocess_for_viability_prediction would draw a random hla_mismatches_count instead);
+        values in a present column are not filled, so NaN passes through the scaler as NaN. Absent
+        categorical columns and unseen categories encode as all-zero one-hot.
+        out: optional preallocated float32 array of shape (n_rows, n_features_out). When omitted, a
+        per-thread buffer is reused, so the result is only valid until the next call on the same thread.
+        """
+        if 'hla_mismatches_count' not in columns and all(c in columns for c in DONOR_HLA_COLS + RECIPIENT_HLA_COLS):
+            columns = dict(columns.items()) if not isinstance(columns, dict) else dict(columns)
+            columns['hla_mismatches_count'] = count_hla_mismatches_columns(columns)
+
+        n_rows = len(columns[next(iter(columns.keys()))]) if len(columns) else 0
+        if out is None:
+            out = self._buffer(n_rows)
+        elif out.shape != (n_rows, self.n_features_out) or out.dtype != np.float32:
+            raise ValueError(f"out must be a float32 array of shape {(n_rows, self.n_features_out)}.")
+
+        scratch = np.empty(n_rows, dtype=np.float64)
+        for j, name in enumerate(self.num_features):
+            column = self.num_offset + j
+            if name not in columns:
+                scratch.fill(0.0)
+            else:
+                scratch[:] = np.asarray(columns[name], dtype=np.float64)
+            np.subtract(scratch, self.mean[j], out=scratch)
+            np.divide(scratch, self.scale[j], out=out[:, column], casting='same_kind')
+
+        out[:, self.num_offset + len(self.num_features):] = 0.0
+        rows = np.arange(n_rows)
+        for name, offset, index in zip(self.cat_features, self.cat_offsets, self.category_index):
+            if name not in columns:
+                continue
+            inverse, unique_values = pd.factorize(np.asarray(columns[name], dtype=object), use_na_sentinel=False)
+            codes = np.array([index.get(v, -1) for v in unique_values], dtype=np.int64)[inverse]
+            known = codes >= 0
+            out[rows[known], offset + codes[known]] = 1.0
+        return out
+
+
+_compiled_transforms = {}
+_compiled_transforms_lock = threading.Lock()
+
+
+def get_compiled_viability_transform(preprocessor):
+    """Returns the CompiledViabilityTransform for a fitted preprocessor, building it on first use."""
+    with _compiled_transforms_lock:
+        entry = _compiled_transforms.get(id(preprocessor))
+        if entry is None or entry[0] is not preprocessor:
+            entry = (preprocessor, CompiledViabilityTransform(preprocessor))
+            _compiled_transforms[id(preprocessor)] = entry
+        return entry[1]
+
 if __name__ == '__main__':
     # Create dummy data similar to historical_transplants.csv for testing
     data = {
@@ -0,0 +1,193 @@
+# hopeconnect-ai/src/prediction_models/feature_store.py
+
+import io
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.utils.data_loader import RAW_DATA_PATH, PROCESSED_DATA_DIR
+from src.prediction_models.feature_engineering import (
+    VIAB_NUM_FEATURES, VIAB_CAT_FEATURES, DONOR_HLA_COLS, RECIPIENT_HLA_COLS,
+    count_hla_mismatches_columns, fit_viability_preprocessor
+)
+
+# Feature store for the graft viability model. Engineered (pre-scaling) training features are persisted
+# as Parquet, one partition per ingest batch, so retraining only engineers rows that arrived since the
+# last run. Scaling/encoding is still fitted at training time over all selected partitions, which keeps
+# the preprocessor identical to fitting on the full raw dataset.
+
+FEATURE_STORE_DIR = os.path.join(PROCESSED_DATA_DIR, 'feature_store', 'viability')
+# Bump when engineer_viability_features changes; partitions built by another version must be rebuilt
+FEATURE_SET_VERSION = '1'
+TARGET_COLUMN = 'graft_survival_1_year'
+MANIFEST_FILENAME = '_manifest.json'
+# sync_source checks that a tracked CSV was only appended to by hashing its header and this many bytes
+# before the ingested offset, so a sync reads the appended rows plus a fixed window, not the whole file
+SOURCE_CHECK_BYTES = 64 * 1024
+
+
+class FeatureStoreError(ValueError):
+    """Raised when the store cannot be used as is (version mismatch, rewritten source data)."""
+
+
+def engineer_viability_features(raw_df):
+    """
+    The row-level part of preprocess_for_viability_training: HLA mismatch counts and dropping rows with
+    missing model features. Returns VIAB features (+ target when present), keeping raw_df's index.
+    """
+    features = raw_df.copy()
+    if all(col in features.columns for col in DONOR_HLA_COLS + RECIPIENT_HLA_COLS):
+        features['hla_mismatches_count'] = count_hla_mismatches_columns({c: features[c].to_numpy() for c in
+                                                                         DONOR_HLA_COLS + RECIPIENT_HLA_COLS})
+    else:
+        print("Warning: Missing HLA columns for mismatch calculation; 'hla_mismatches_count' filled with random values.")
+        features['hla_mismatches_count'] = np.random.randint(0, len(DONOR_HLA_COLS) + 1, size=len(features))
+
+    all_features_for_model = VIAB_NUM_FEATURES + VIAB_CAT_FEATURES
+    keep = all_features_for_model + ([TARGET_COLUMN] if TARGET_COLUMN in features.columns else [])
+    return features[keep].dropna(subset=all_features_for_model)
+
+
+class ViabilityFeatureStore:
+    """
+    Directory layout: batch=<batch_id>/features.parquet per ingest batch, plus _manifest.json with the
+    batches in ingest order, the global row numbering and how much of each tracked source file is ingested.
+    """
+
+    def __init__(self, root=FEATURE_STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILENAME)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"feature_set_version": FEATURE_SET_VERSION, "next_row_number": 0, "batches": [], "sources": {}}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("feature_set_version") != FEATURE_SET_VERSION:
+            raise FeatureStoreError(
+                f"Feature store at {self.root} was built with feature set version {manifest.get('feature_set_version')}, "
+                f"current is {FEATURE_SET_VERSION}. Rebuild it (delete the directory and re-ingest).")
+        return manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def batches(self):
+        return [batch["batch_id"] for batch in self.manifest["batches"]]
+
+    def ingest(self, raw_df, batch_id=None, source=None):
+        """
+        Engineers features for raw_df only and writes them as a new partition. Rows are numbered after
+        everything already in the store. Returns the batch id, or None if raw_df is empty.
+        """
+        batch_id = self._write_batch(raw_df, batch_id, source)
+        if batch_id is not None:
+            self._save_manifest()
+        return batch_id
+
+    def _write_batch(self, raw_df, batch_id, source):
+        """ingest() up to the manifest save, so callers can record more state in the same save."""
+        if raw_df.empty:
+            return None
+        batch_id = batch_id or f"{len(self.manifest['batches']):05d}-{time.strftime('%Y%m%dT%H%M%S')}"
+        if batch_id in self.batches():
+            raise FeatureStoreError(f"Batch '{batch_id}' already exists in the feature store.")
+
+        start = self.manifest["next_row_number"]
+        raw_df = raw_df.set_axis(pd.RangeIndex(start, start + len(raw_df), name='row_number'), axis=0)
+        features = engineer_viability_features(raw_df)
+
+        partition_dir = os.path.join(self.root, f'batch={batch_id}')
+        os.makedirs(partition_dir, exist_ok=True)
+        partition_path = os.path.join(partition_dir, 'features.parquet')
+        features.to_parquet(partition_path + '.tmp', index=True)
+        os.replace(partition_path + '.tmp', partition_path)
+
+        self.manifest["batches"].append({
+            "batch_id": batch_id, "source": source, "raw_rows": len(raw_df), "feature_rows": len(features),
+            "first_row_number": start, "ingested_at": time.strftime('%Y-%m-%dT%H:%M:%S')
+        })
+        self.manifest["next_row_number"] = start + len(raw_df)
+        return batch_id
+
+    @staticmethod
+    def _source_check(f, header, consumed):
+        """sha1 of the header and of the SOURCE_CHECK_BYTES before `consumed` in an open source file."""
+        check_from = max(len(header), consumed - SOURCE_CHECK_BYTES)
+        f.seek(check_from)
+        return check_from, hashlib.sha1(header + f.read(consumed - check_from)).hexdigest()
+
+    def sync_source(self, path=RAW_DATA_PATH):
+        """
+        Ingests the rows appended to a tracked raw CSV since the last sync (the whole file the first time).
+        Only the appended bytes are read and parsed, up to the last complete line (a row still being
+        written is left for the next sync). A file that is shorter than the ingested offset or whose header
+        or last SOURCE_CHECK_BYTES before it changed was edited rather than appended to: FeatureStoreError.
+        The new batch and the source offset are recorded in one manifest save, so an interrupted sync
+        never ingests the same rows twice. Returns the new batch id, or None if nothing was appended.
+        """
+        key = os.path.abspath(path)
+        with open(path, 'rb') as f:
+            header = f.readline()
+            if not header.endswith(b'\n'):
+                return None # Header line not complete yet
+            tracked = self.manifest["sources"].get(key)
+            consumed = len(header)
+            if tracked is not None:
+                consumed = tracked["bytes"]
+                if (os.fstat(f.fileno()).st_size < consumed or
+                        self._source_check(f, header, consumed) != (tracked["check_from"], tracked["check_sha1"])):
+                    raise FeatureStoreError(f"{path} no longer starts with the data already ingested "
+                                            "(it was edited, not appended to). Rebuild the feature store.")
+            f.seek(consumed)
+            appended = f.read()
+            appended = appended[:appended.rfind(b'\n') + 1]
+            if not appended:
+                return None
+            check_from, check_sha1 = self._source_check(f, header, consumed + len(appended))
+
+        batch_id = None
+        if appended.strip():
+            batch_id = self._write_batch(pd.read_csv(io.BytesIO(header + appended.lstrip(b'\r\n'))), None, key)
+        self.manifest["sources"][key] = {"bytes": consumed + len(appended), "check_from": check_from, "check_sha1": check_sha1}
+        self._save_manifest()
+        return batch_id
+
+    def read_features(self, batches=None, columns=None):
+        """Engineered features of the selected batches (all by default), in ingest order."""
+        selected = self.batches() if batches is None else list(batches)
+        unknown = [b for b in selected if b not in self.batches()]
+        if unknown:
+            raise FeatureStoreError(f"Unknown feature store batch(es): {', '.join(unknown)}")
+        if not selected:
+            raise FeatureStoreError(f"Feature store at {self.root} is empty.")
+        order = {b: i for i, b in enumerate(self.batches())}
+        frames = [pd.read_parquet(os.path.join(self.root, f'batch={b}', 'features.parquet'), columns=columns)
+                  for b in sorted(selected, key=order.get)]
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+
+def preprocess_for_viability_training_from_store(store=None, batches=None):
+    """
+    preprocess_for_viability_training, reading engineered features from the store instead of
+    recomputing them from raw data. Same output for the same rows.
+    """
+    store = store or ViabilityFeatureStore()
+    features = store.read_features(batches)
+    if features.empty:
+        raise ValueError("Feature store returned no rows. Check the selected batches.")
+    return fit_viability_preprocessor(features)
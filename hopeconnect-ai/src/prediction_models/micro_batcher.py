@@ -0,0 +1,170 @@
+# hopeconnect-ai/src/prediction_models/micro_batcher.py
+
+import threading
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.prediction_models.viability_predictor import predict_graft_survival_batch
+
+# Request coalescing for single-record viability predictions. Concurrent callers enqueue their feature
+# row and block; a worker thread gathers rows for up to MICROBATCH_WINDOW_MS (or MICROBATCH_MAX_SIZE
+# rows), runs one predict_graft_survival_batch call per model, and hands each caller its probability.
+# The per-call fixed cost (DataFrame, transform, booster call) is then paid once per batch.
+
+MICROBATCH_WINDOW_MS = float(os.environ.get('VIABILITY_MICROBATCH_WINDOW_MS', 0)) # 0 = off
+MICROBATCH_MAX_SIZE = int(os.environ.get('VIABILITY_MICROBATCH_MAX_SIZE', 64))
+MICROBATCH_TIMEOUT_MS = float(os.environ.get('VIABILITY_MICROBATCH_TIMEOUT_MS', 1000))
+MAX_RECORDED_WAITS = 10000
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256] # Histogram upper bounds
+
+
+class MicroBatchTimeout(TimeoutError):
+    """The request was not answered within its timeout (the item is dropped from the queue)."""
+
+
+class _PendingPrediction:
+    __slots__ = ('row', 'model', 'preprocessor', 'enqueued_at', 'done', 'result', 'error', 'cancelled')
+
+    def __init__(self, row, model, preprocessor):
+        self.row = row
+        self.model = model
+        self.preprocessor = preprocessor
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+
+class ViabilityMicroBatcher:
+    """Coalesces concurrent predict() calls into batched model evaluations, with batch size metrics."""
+
+    def __init__(self, window_ms=MICROBATCH_WINDOW_MS, max_batch_size=MICROBATCH_MAX_SIZE,
+                 timeout_ms=MICROBATCH_TIMEOUT_MS, predict_batch=predict_graft_survival_batch):
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.timeout_seconds = timeout_ms / 1000.0
+        self.predict_batch = predict_batch # (input_df, model, preprocessor) -> probabilities
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._worker = None
+        self._stats_lock = threading.Lock()
+        self._waits = deque(maxlen=MAX_RECORDED_WAITS) # Enqueue -> result, seconds
+        self._size_histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.requests = 0
+        self.batches = 0
+        self.max_observed_batch = 0
+        self.timeouts = 0
+        self.row_fallbacks = 0 # Batches that failed as a whole and were retried row by row
+
+    @property
+    def enabled(self):
+        return self.window_seconds > 0
+
+    def predict(self, row, model, preprocessor, timeout_ms=None):
+        """
+        Survival probability for one feature dict. Blocks until the batch containing it is evaluated.
+        Raises the row's own error (e.g. ValueError for bad data) or MicroBatchTimeout.
+        """
+        item = _PendingPrediction(row, model, preprocessor)
+        with self._condition:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='viability-microbatcher', daemon=True)
+                self._worker.start()
+            self._queue.append(item)
+            self._condition.notify()
+
+        timeout = self.timeout_seconds if timeout_ms is None else timeout_ms / 1000.0
+        if not item.done.wait(timeout):
+            item.cancelled = True # The worker skips it if it has not been picked up yet
+            with self._stats_lock:
+                self.timeouts += 1
+            raise MicroBatchTimeout(f"Viability prediction not completed within {timeout * 1000:.0f} ms.")
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _next_batch(self):
+        """Waits for a first request, then gathers more until the window closes or the batch is full."""
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            deadline = self._queue[0].enqueued_at + self.window_seconds
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                item = self._queue.popleft()
+                if not item.cancelled:
+                    batch.append(item)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            groups = {} # One model call per (model, preprocessor), e.g. full and fast tier requests
+            for item in batch:
+                groups.setdefault((id(item.model), id(item.preprocessor)), []).append(item)
+            for items in groups.values():
+                self._evaluate(items)
+            self._record(batch)
+
+    def _evaluate(self, items):
+        model, preprocessor = items[0].model, items[0].preprocessor
+        try:
+            probs = self.predict_batch(pd.DataFrame([item.row for item in items]), model, preprocessor)
+            for item, prob in zip(items, probs.tolist()):
+                item.result = prob
+        except Exception:
+            # One malformed row must not fail its neighbours: retry individually so each caller gets its own error
+            with self._stats_lock:
+                self.row_fallbacks += 1
+            for item in items:
+                try:
+                    item.result = float(self.predict_batch(pd.DataFrame([item.row]), model, preprocessor)[0])
+                except Exception as e:
+                    item.error = e
+        for item in items:
+            item.done.set()
+
+    def _record(self, batch):
+        finished = time.perf_counter()
+        size = len(batch)
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound), len(BATCH_SIZE_BUCKETS))
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += size
+            self.max_observed_batch = max(self.max_observed_batch, size)
+            self._size_histogram[bucket] += 1
+            self._waits.extend(finished - item.enqueued_at for item in batch)
+
+    def stats(self):
+        with self._stats_lock:
+            waits_ms = np.array(self._waits) * 1000
+            labels = [f"<={bound}" for bound in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            return {
+                "enabled": self.enabled, "window_ms": self.window_seconds * 1000, "max_batch_size": self.max_batch_size,
+                "timeout_ms": self.timeout_seconds * 1000, "requests": self.requests, "batches": self.batches,
+                "mean_batch_size": (self.requests / self.batches) if self.batches else 0.0,
+                "max_observed_batch_size": self.max_observed_batch,
+                "batch_size_histogram": {label: count for label, count in zip(labels, self._size_histogram) if count},
+                "timeouts": self.timeouts, "row_fallbacks": self.row_fallbacks,
+                "queued": len(self._queue),
+                "latency_ms_p50": float(np.percentile(waits_ms, 50)) if len(waits_ms) else None,
+                "latency_ms_p99": float(np.percentile(waits_ms, 99)) if len(waits_ms) else None
+            }
@@ -0,0 +1,135 @@
+# hopeconnect-ai/src/prediction_models/native_viability.py
+
+import xgboost as xgb
+import pandas as pd
+import numpy as np
+import joblib
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, roc_auc_score, f1_score
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.prediction_models.feature_engineering import VIAB_NUM_FEATURES, VIAB_CAT_FEATURES
+from src.prediction_models.feature_store import engineer_viability_features, TARGET_COLUMN
+from src.prediction_models.viability_predictor import MODEL_DIR, VIABILITY_XGB_PARAMS
+from src.utils.data_loader import load_raw_data
+
+# Alternative graft viability configuration: XGBoost's native categorical splits on the raw
+# organ/blood type columns and the 'hist' tree method, instead of a scaled dense one-hot matrix.
+# Trees are invariant to feature scaling, so the numeric features are fed unscaled and the model
+# input is 10 columns instead of ~30. Serving still uses the one-hot model; this one is trained and
+# compared with scripts/benchmark_viability_models.py (and can be validated through shadow scoring).
+
+NATIVE_VIABILITY_MODEL_PATH = os.path.join(MODEL_DIR, 'graft_viability_native_model.joblib')
+# Explicit thread count for training and inference; defaults to every core
+VIABILITY_NTHREAD = int(os.environ.get('VIABILITY_NTHREAD', os.cpu_count() or 1))
+
+
+class NativeViabilityModel:
+    """
+    The booster plus the category levels seen in training. Inputs are encoded against those fixed
+    levels so codes match training; unseen levels become missing, like OneHotEncoder(handle_unknown='ignore').
+    """
+
+    def __init__(self, booster, categories, nthread=VIABILITY_NTHREAD):
+        self.booster = booster
+        self.categories = categories # {column: [levels, ...]}
+        self.nthread = nthread
+        self.booster.set_param({"nthread": nthread})
+
+    def prepare(self, input_df):
+        """
+        float32 model input: numerics as is (missing columns -> 0, as in the one-hot path) and each
+        categorical as its training category code (NaN when missing/unseen). The booster carries the
+        feature types, so a plain array skips the pandas categorical handling on every call.
+        """
+        X = np.empty((len(input_df), len(VIAB_NUM_FEATURES) + len(VIAB_CAT_FEATURES)), dtype=np.float32)
+        for j, col in enumerate(VIAB_NUM_FEATURES):
+            X[:, j] = pd.to_numeric(input_df[col], errors='coerce') if col in input_df.columns else 0
+        for j, col in enumerate(VIAB_CAT_FEATURES, start=len(VIAB_NUM_FEATURES)):
+            if col not in input_df.columns:
+                X[:, j] = np.nan
+                continue
+            codes = {level: code for code, level in enumerate(self.categories[col])}
+            X[:, j] = input_df[col].astype(str).map(codes) # Missing values ('nan'/'None') are not levels -> NaN
+        return X
+
+    def predict_proba(self, input_df):
+        """Survival probability per row of input_df (float64)."""
+        if len(input_df) == 0:
+            return np.zeros(0, dtype=np.float64)
+        return np.asarray(self.booster.inplace_predict(self.prepare(input_df)), dtype=np.float64)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.booster.set_param({"nthread": self.nthread})
+
+
+def native_training_frame(features):
+    """Engineered viability features -> (X with categorical dtypes, y, category levels)."""
+    X = features[VIAB_NUM_FEATURES + VIAB_CAT_FEATURES].copy()
+    X[VIAB_NUM_FEATURES] = X[VIAB_NUM_FEATURES].astype(np.float32)
+    categories = {}
+    for col in VIAB_CAT_FEATURES:
+        X[col] = X[col].astype(str).astype('category')
+        categories[col] = list(X[col].cat.categories)
+    y = features[TARGET_COLUMN] if TARGET_COLUMN in features.columns else None
+    return X, y, categories
+
+
+def native_xgb_params(nthread=None):
+    params = dict(VIABILITY_XGB_PARAMS)
+    params.pop("use_label_encoder", None)
+    params.update(tree_method='hist', enable_categorical=True, n_jobs=nthread or VIABILITY_NTHREAD)
+    return params
+
+
+def train_native_viability_model(data_df=None, feature_store=None, batches=None, nthread=None, save=True):
+    """
+    Trains the native-categorical viability model on the same engineered features, split and
+    hyperparameters as train_graft_viability_model. Returns the NativeViabilityModel.
+    """
+    if feature_store is not None:
+        features = feature_store.read_features(batches)
+    else:
+        if data_df is None:
+            data_df = load_raw_data()
+        features = engineer_viability_features(data_df)
+
+    X, y, categories = native_training_frame(features)
+    if y is None:
+        raise ValueError(f"Target variable '{TARGET_COLUMN}' not found in processed data.")
+    if X.empty:
+        raise ValueError("Feature set X is empty after preprocessing. Check data and preprocessing steps.")
+
+    try:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    except ValueError as e:
+        print(f"Warning: Stratification failed during train_test_split: {e}. Falling back to non-stratified split.")
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    classifier = xgb.XGBClassifier(**native_xgb_params(nthread))
+    classifier.fit(X_train, y_train)
+    model = NativeViabilityModel(classifier.get_booster(), categories, nthread or VIABILITY_NTHREAD)
+
+    if len(y_test) > 0:
+        y_pred_proba = model.predict_proba(X_test)
+        print("\nNative-categorical Graft Viability Model Evaluation:")
+        print(f"  Accuracy: {accuracy_score(y_test, y_pred_proba > 0.5):.4f}")
+        print(f"  ROC AUC: {roc_auc_score(y_test, y_pred_proba):.4f}")
+        print(f"  F1 Score: {f1_score(y_test, y_pred_proba > 0.5):.4f}")
+    else:
+        print("\nWarning: Test set was empty. Skipping model evaluation.")
+
+    if save:
+        if not os.path.exists(MODEL_DIR):
+            os.makedirs(MODEL_DIR)
+        joblib.dump(model, NATIVE_VIABILITY_MODEL_PATH)
+        print(f"Native-categorical viability model saved to {NATIVE_VIABILITY_MODEL_PATH}")
+    return model
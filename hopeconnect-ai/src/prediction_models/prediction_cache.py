@@ -0,0 +1,198 @@
+# hopeconnect-ai/src/prediction_models/prediction_cache.py
+
+import threading
+from collections import OrderedDict
+import joblib
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.prediction_models.viability_predictor import predict_graft_survival_batch
+from src.prediction_models.viability_explainer import explain_viability_batch
+
+# Memoization of graft viability predictions. Within a waitlist many recipients produce exactly the
+# same model input row (the donor side is constant; blood type, age, comorbidities, HLA mismatches and
+# CIT repeat), so identical rows are predicted once per batch and the results are kept in a bounded
+# LRU shared across requests, keyed by the feature tuple and the model/preprocessor version.
+
+VIABILITY_CACHE_FEATURES = [
+    'donor_age', 'organ_type', 'donor_comorbidities', 'cold_ischemia_time_hours',
+    'distance_km', 'donor_blood_type', 'recipient_blood_type', 'hla_mismatches_count',
+    'recipient_age', 'recipient_comorbidities'
+]
+MAX_CACHED_PREDICTIONS = int(os.environ.get('VIABILITY_CACHE_MAX_ENTRIES', 100000))
+MAX_CACHED_EXPLANATIONS = int(os.environ.get('VIABILITY_EXPLANATION_CACHE_MAX_ENTRIES', 10000))
+
+_model_versions = {}
+_model_versions_lock = threading.Lock()
+
+
+def model_version_key(model, preprocessor):
+    """
+    Content hash of a loaded model/preprocessor pair, computed once per object pair.
+    Retraining (or reloading different files) changes the key, so stale predictions are never reused.
+    """
+    ids = (id(model), id(preprocessor))
+    with _model_versions_lock:
+        cached = _model_versions.get(ids)
+        # Objects are kept alive with their entry, so an id cannot be recycled by another model
+        if cached is not None and cached[0] is model and cached[1] is preprocessor:
+            return cached[2]
+    version = f"{joblib.hash(model)[:12]}-{joblib.hash(preprocessor)[:12]}"
+    with _model_versions_lock:
+        _model_versions[ids] = (model, preprocessor, version)
+    return version
+
+
+class ViabilityPredictionCache:
+    """Thread-safe, bounded LRU of graft survival probabilities with hit-rate metrics."""
+
+    def __init__(self, max_entries=MAX_CACHED_PREDICTIONS, max_explanations=MAX_CACHED_EXPLANATIONS):
+        self.max_entries = max_entries
+        self.max_explanations = max_explanations
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._explanations = OrderedDict() # Same keys as _entries: feature contributions per row
+        self.rows_requested = 0   # Rows asked for, before any deduplication
+        self.batch_duplicates = 0 # Rows served by an identical row earlier in the same batch
+        self.hits = 0             # Distinct rows served from the cache
+        self.misses = 0           # Distinct rows sent to the model
+        self.evictions = 0
+        self.explanation_hits = 0
+        self.explanation_misses = 0
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = value
+        return found
+
+    def _store(self, predictions):
+        with self._lock:
+            for key, value in predictions.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def predict_frame(self, input_df, model, preprocessor):
+        """
+        Graft survival probabilities for the rows of input_df (VIABILITY_CACHE_FEATURES columns),
+        identical to predict_graft_survival_batch but evaluating each distinct row at most once.
+        """
+        n = len(input_df)
+        if n == 0:
+            return np.zeros(0, dtype=np.float64)
+        version = model_version_key(model, preprocessor)
+        row_keys = [(version,) + row for row in zip(*(input_df[f].tolist() for f in VIABILITY_CACHE_FEATURES))]
+
+        first_index = {}
+        for i, key in enumerate(row_keys):
+            first_index.setdefault(key, i)
+        cached = self._lookup(first_index)
+        missing = [key for key in first_index if key not in cached]
+
+        if missing:
+            rows = [first_index[key] for key in missing]
+            probs = predict_graft_survival_batch(input_df.iloc[rows].reset_index(drop=True), model, preprocessor)
+            fresh = dict(zip(missing, probs.tolist()))
+            self._store(fresh)
+            cached.update(fresh)
+
+        with self._lock:
+            self.rows_requested += n
+            self.batch_duplicates += n - len(first_index)
+            self.hits += len(first_index) - len(missing)
+            self.misses += len(missing)
+        return np.array([cached[key] for key in row_keys], dtype=np.float64)
+
+    def predict_rows(self, rows, model, preprocessor, on_error=None):
+        """
+        Probabilities for a list of feature dicts. If the batch cannot be scored as a whole, rows are
+        retried one by one so a single bad row only fails itself: on_error(index, exception) is called
+        and that row gets None.
+        """
+        if not rows:
+            return []
+        try:
+            return self.predict_frame(pd.DataFrame(rows, columns=VIABILITY_CACHE_FEATURES), model, preprocessor).tolist()
+        except Exception:
+            pass
+        results = []
+        for index, row in enumerate(rows):
+            try:
+                results.append(float(self.predict_frame(pd.DataFrame([row], columns=VIABILITY_CACHE_FEATURES),
+                                                        model, preprocessor)[0]))
+            except Exception as e:
+                if on_error:
+                    on_error(index, e)
+                results.append(None)
+        return results
+
+    def explain_frame(self, input_df, model, preprocessor):
+        """
+        explain_viability_batch for the rows of input_df (VIABILITY_CACHE_FEATURES columns), computed
+        in one batch for the rows not explained before. Returned dicts are shared; do not modify them.
+        """
+        if len(input_df) == 0:
+            return []
+        version = model_version_key(model, preprocessor)
+        row_keys = [(version,) + row for row in zip(*(input_df[f].tolist() for f in VIABILITY_CACHE_FEATURES))]
+        first_index = {}
+        for i, key in enumerate(row_keys):
+            first_index.setdefault(key, i)
+
+        found = {}
+        with self._lock:
+            for key in first_index:
+                value = self._explanations.get(key)
+                if value is not None:
+                    self._explanations.move_to_end(key)
+                    found[key] = value
+        missing = [key for key in first_index if key not in found]
+        if missing:
+            rows = [first_index[key] for key in missing]
+            fresh = dict(zip(missing, explain_viability_batch(input_df.iloc[rows].reset_index(drop=True), model, preprocessor)))
+            with self._lock:
+                for key, value in fresh.items():
+                    self._explanations[key] = value
+                    self._explanations.move_to_end(key)
+                while len(self._explanations) > self.max_explanations:
+                    self._explanations.popitem(last=False)
+            found.update(fresh)
+        with self._lock:
+            self.explanation_hits += len(first_index) - len(missing)
+            self.explanation_misses += len(missing)
+        return [found[key] for key in row_keys]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._explanations.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cached_predictions": len(self._entries), "max_entries": self.max_entries,
+                "rows_requested": self.rows_requested, "batch_duplicates": self.batch_duplicates,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                # Share of requested rows that did not need a model evaluation
+                "model_evaluations_saved": ((self.rows_requested - self.misses) / self.rows_requested)
+                                           if self.rows_requested else 0.0,
+                "cached_explanations": len(self._explanations), "explanation_hits": self.explanation_hits,
+                "explanation_misses": self.explanation_misses
+            }
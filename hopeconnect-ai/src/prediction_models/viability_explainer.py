@@ -0,0 +1,77 @@
+# hopeconnect-ai/src/prediction_models/viability_explainer.py
+
+import threading
+import numpy as np
+import xgboost as xgb
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.prediction_models.feature_engineering import get_compiled_viability_transform
+
+# Per-feature explanations of graft viability predictions, in log-odds. For the XGBoost model these are
+# the booster's exact tree contributions (pred_contribs, i.e. TreeSHAP) for a whole batch in one call;
+# the one-hot columns of a categorical feature are summed back into that feature. The distilled "fast"
+# tier model is additive already, so its table entries are its contributions.
+
+_column_features = {}
+_column_features_lock = threading.Lock()
+
+
+def _raw_feature_per_column(preprocessor):
+    """Raw viability feature name for each column of the processed matrix (one-hot columns map to their feature)."""
+    with _column_features_lock:
+        entry = _column_features.get(id(preprocessor))
+        if entry is not None and entry[0] is preprocessor:
+            return entry[1]
+    compiled = get_compiled_viability_transform(preprocessor)
+    names = [None] * compiled.n_features_out
+    for j, name in enumerate(compiled.num_features):
+        names[compiled.num_offset + j] = name
+    for name, offset, index in zip(compiled.cat_features, compiled.cat_offsets, compiled.category_index):
+        for k in range(len(index)):
+            names[offset + k] = name
+    with _column_features_lock:
+        _column_features[id(preprocessor)] = (preprocessor, names)
+    return names
+
+
+def explain_viability_batch(input_df, model, preprocessor):
+    """
+    One explanation per row of input_df (raw viability features):
+    {"base_log_odds", "log_odds", "feature_contributions": [{"feature", "contribution"}, ...]}, with
+    contributions sorted by magnitude. base_log_odds + the contributions = log_odds of the prediction.
+    """
+    if len(input_df) == 0:
+        return []
+    if hasattr(model, 'feature_contributions'): # Distilled "fast" tier model
+        base = np.full(len(input_df), model.intercept)
+        contributions = model.feature_contributions(input_df)
+        names = list(contributions)
+        matrix = np.column_stack([contributions[name] for name in names]) if names else np.zeros((len(input_df), 0))
+    elif hasattr(model, 'get_booster'):
+        booster = model.get_booster()
+        X = get_compiled_viability_transform(preprocessor).transform(input_df)
+        contribs = booster.predict(xgb.DMatrix(X, feature_names=booster.feature_names), pred_contribs=True)
+        base = contribs[:, -1].astype(np.float64)
+        column_features = _raw_feature_per_column(preprocessor)
+        names = list(dict.fromkeys(column_features))
+        matrix = np.zeros((len(input_df), len(names)))
+        for j, name in enumerate(column_features): # Sum one-hot columns into their categorical feature
+            matrix[:, names.index(name)] += contribs[:, j]
+    else:
+        raise ValueError(f"Explanations are not supported for {type(model).__name__} models.")
+
+    explanations = []
+    for row_base, row in zip(base.tolist(), matrix.tolist()):
+        order = sorted(range(len(names)), key=lambda k: -abs(row[k]))
+        explanations.append({
+            "base_log_odds": row_base, "log_odds": row_base + sum(row),
+            "feature_contributions": [{"feature": names[k], "contribution": row[k]} for k in order]
+        })
+    return explanations
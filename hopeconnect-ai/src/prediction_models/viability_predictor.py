@@ -19,7 +19,12 @@ if PROJECT_ROOT not in sys.path:
 
 # Corrected absolute imports from src
 # '.feature_engineering' becomes 'src.prediction_models.feature_engineering' because 'prediction_models' is a sub-package of 'src'
-from src.prediction_models.feature_engineering import preprocess_for_viability_training, preprocess_for_viability_prediction, VIABILITY_PREPROCESSOR_PATH
+from src.prediction_models.feature_engineering import (
+    preprocess_for_viability_training, preprocess_for_viability_prediction, get_compiled_viability_transform,
+    VIABILITY_PREPROCESSOR_PATH
+)
+from src.prediction_models.feature_store import preprocess_for_viability_training_from_store, engineer_viability_features
+from src.prediction_models.viability_surrogate import distill_viability_model
 from src.utils.data_loader import load_raw_data
 
 # Use PROJECT_ROOT to define MODEL_DIR for robustness
@@ -37,19 +42,36 @@ ORGAN_MAX_CIT = {
     "Intestine": 8
 }
 
+# Hyperparameters of the graft viability classifier (shared with the native-categorical variant)
+VIABILITY_XGB_PARAMS = {
+    "objective": 'binary:logistic',
+    "eval_metric": 'logloss', # or 'auc'
+    "use_label_encoder": False, # Suppress warning for newer XGBoost versions
+    "random_state": 42,
+    "n_estimators": 100,
+    "learning_rate": 0.1,
+    "max_depth": 3
+}
+
 def get_max_cold_ischemia_time(organ_type):
     """Returns the maximum allowable cold ischemia time for an organ type."""
     return ORGAN_MAX_CIT.get(str(organ_type).capitalize(), 24) # Default if not found, ensure organ_type is string
 
-def train_graft_viability_model(data_df=None):
+def train_graft_viability_model(data_df=None, feature_store=None, batches=None, distill_surrogate=False):
     """
     Trains an XGBoost model to predict 1-year graft survival.
+    With a ViabilityFeatureStore, engineered features are read from its partitions (optionally only
+    `batches`) instead of being recomputed from raw data.
+    distill_surrogate=True also distills the trained model into the "fast" tier surrogate.
     """
-    if data_df is None:
-        data_df = load_raw_data() # load_raw_data is correctly imported
+    if feature_store is not None:
+        processed_df, preprocessor = preprocess_for_viability_training_from_store(feature_store, batches)
+    else:
+        if data_df is None:
+            data_df = load_raw_data() # load_raw_data is correctly imported
 
-    # preprocess_for_viability_training is correctly imported
-    processed_df, preprocessor = preprocess_for_viability_training(data_df)
+        # preprocess_for_viability_training is correctly imported
+        processed_df, preprocessor = preprocess_for_viability_training(data_df)
 
     if 'graft_survival_1_year' not in processed_df.columns:
         raise ValueError("Target variable 'graft_survival_1_year' not found in processed data.")
@@ -83,15 +105,7 @@ def train_graft_viability_model(data_df=None):
              # For now, let the metrics functions handle it or error out if y_test is empty.
 
 
-    model = xgb.XGBClassifier(
-        objective='binary:logistic',
-        eval_metric='logloss', # or 'auc'
-        use_label_encoder=False, # Suppress warning for newer XGBoost versions
-        random_state=42,
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=3
-    )
+    model = xgb.XGBClassifier(**VIABILITY_XGB_PARAMS)
 
     model.fit(X_train, y_train)
 
@@ -116,6 +130,12 @@ def train_graft_viability_model(data_df=None):
     print(f"Graft viability model saved to {GRAFT_VIABILITY_MODEL_PATH}")
     print(f"Associated preprocessor is at {VIABILITY_PREPROCESSOR_PATH}")
 
+    if distill_surrogate:
+        # The surrogate is fitted on unscaled engineered features, so rebuild them for the same rows
+        features = (feature_store.read_features(batches) if feature_store is not None
+                    else engineer_viability_features(data_df))
+        distill_viability_model(model, preprocessor, features, features.get('graft_survival_1_year'))
+
     return model, preprocessor
 
 
@@ -141,6 +161,9 @@ def predict_graft_survival(input_data, model=None, preprocessor=None):
     else:
         raise ValueError("input_data must be a dictionary or pandas DataFrame.")
 
+    if hasattr(model, 'predict_features'): # Distilled "fast" tier model: scores raw features directly
+        return model.predict_features(input_df)[0]
+
     # preprocess_for_viability_prediction is correctly imported
     processed_input = preprocess_for_viability_prediction(input_df, preprocessor)
 
@@ -153,6 +176,35 @@ def predict_graft_survival(input_data, model=None, preprocessor=None):
         raise
 
 
+def predict_graft_survival_batch(input_df, model=None, preprocessor=None):
+    """
+    Predicts graft survival probabilities for every row of a DataFrame in one model call.
+    Returns a float64 numpy array aligned with the rows of input_df.
+    """
+    if model is None:
+        if not os.path.exists(GRAFT_VIABILITY_MODEL_PATH):
+            raise FileNotFoundError(f"Model not found at {GRAFT_VIABILITY_MODEL_PATH}. Train first.")
+        model = joblib.load(GRAFT_VIABILITY_MODEL_PATH)
+
+    if preprocessor is None:
+        if not os.path.exists(VIABILITY_PREPROCESSOR_PATH):
+            raise FileNotFoundError(f"Preprocessor not found at {VIABILITY_PREPROCESSOR_PATH}. Train first.")
+        preprocessor = joblib.load(VIABILITY_PREPROCESSOR_PATH)
+
+    if len(input_df) == 0:
+        return np.zeros(0, dtype=np.float64)
+    if hasattr(model, 'predict_features'): # Distilled "fast" tier model: no preprocessing, no trees
+        return model.predict_features(input_df)
+
+    try:
+        # float32 features written into a reused buffer; same predictions as the DataFrame path
+        processed_input = get_compiled_viability_transform(preprocessor).transform(input_df)
+    except (KeyError, AttributeError, ValueError) as e:
+        print(f"Warning: compiled viability transform unavailable ({e}); using the DataFrame path.")
+        processed_input = preprocess_for_viability_prediction(input_df, preprocessor)
+    return model.predict_proba(processed_input)[:, 1].astype(np.float64)
+
+
 def predict_organ_cold_survival_duration(organ_features):
     """
     Placeholder/Simplified: Predicts how long an organ can survive in cold storage.
@@ -185,6 +237,22 @@ def predict_organ_cold_survival_duration(organ_features):
     return max(1.0, estimated_survival_duration) # Ensure at least 1 hour, use float for consistency
 
 
+def predict_organ_cold_survival_durations(organ_types, donor_ages, donor_comorbidities):
+    """
+    Vectorized predict_organ_cold_survival_duration over column arrays.
+    Missing (NaN) ages or comorbidity counts contribute no penalty, as in the scalar version.
+    """
+    unique_types, inverse = np.unique(np.asarray(organ_types).astype(str), return_inverse=True)
+    base_max_cit = np.array([get_max_cold_ischemia_time(t) for t in unique_types], dtype=np.float64)[inverse.reshape(-1)]
+    donor_ages = np.asarray(donor_ages, dtype=np.float64)
+    donor_comorbidities = np.asarray(donor_comorbidities, dtype=np.float64)
+
+    age_penalty = np.where(donor_ages > 50, (donor_ages - 50) * 0.1, 0.0)
+    comorbidity_penalty = np.nan_to_num(donor_comorbidities * 0.5, nan=0.0)
+
+    return np.maximum(1.0, base_max_cit - age_penalty - comorbidity_penalty)
+
+
 if __name__ == '__main__':
     # This block will run when the script is executed directly
     print("Running viability_predictor.py directly for training and testing...")
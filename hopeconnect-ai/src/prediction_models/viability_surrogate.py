@@ -0,0 +1,177 @@
+# hopeconnect-ai/src/prediction_models/viability_surrogate.py
+
+import numpy as np
+import pandas as pd
+import joblib
+from scipy import sparse
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import roc_auc_score
+
+# --- Start of Path Handling ---
+import sys
+import os
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')) # Goes up to hopeconnect-ai
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.prediction_models.feature_engineering import (
+    MODEL_DIR, VIAB_NUM_FEATURES, VIAB_CAT_FEATURES, get_compiled_viability_transform
+)
+
+# "fast" quality tier for graft viability: the XGBoost model distilled into an additive logistic
+# model over binned features, i.e. one small lookup table per feature. It is fitted to the teacher's
+# log-odds, so its probabilities sit on the teacher's (calibrated) scale. Scoring reads raw feature
+# columns directly: no scaling, no one-hot matrix and no tree traversal.
+
+SURROGATE_MODEL_PATH = os.path.join(MODEL_DIR, 'graft_viability_surrogate.joblib')
+QUALITY_TIERS = ("full", "fast")
+DEFAULT_QUALITY_TIER = "full"
+SURROGATE_BINS = 16
+# Categorical pairs that get their own joint table (ABO compatibility is a donor/recipient interaction)
+SURROGATE_CROSS_FEATURES = [('donor_blood_type', 'recipient_blood_type')]
+
+
+class DistilledViabilityModel:
+    """
+    Log-odds = intercept + sum of per-feature table entries. Numeric features are looked up by bin
+    (np.searchsorted over the bin edges), categoricals by value and crossed categoricals by value pair;
+    unknown categories, missing values and absent columns contribute 0.
+    """
+
+    def __init__(self, intercept, bin_edges, num_tables, cat_tables, cross_tables=None, agreement=None):
+        self.intercept = float(intercept)
+        self.bin_edges = bin_edges   # {numeric feature: inner bin edges}
+        self.num_tables = num_tables # {numeric feature: log-odds contribution per bin}
+        self.cat_tables = cat_tables # {categorical feature: {value: log-odds contribution}}
+        self.cross_tables = cross_tables or {} # {(feature, feature): {(value, value): log-odds contribution}}
+        self.agreement = agreement or {}
+
+    def feature_contributions(self, columns):
+        """{feature (or "a x b" for crossed tables): log-odds contribution per row}; they sum to decision_function - intercept."""
+        contributions = {}
+        for name, edges in self.bin_edges.items():
+            if name not in columns:
+                continue
+            values = np.asarray(columns[name], dtype=np.float64)
+            contribution = self.num_tables[name][np.searchsorted(edges, values, side='right')]
+            contributions[name] = np.where(np.isnan(values), 0.0, contribution)
+        for name, table in self.cat_tables.items():
+            if name not in columns:
+                continue
+            inverse, unique_values = pd.factorize(np.asarray(columns[name], dtype=object), use_na_sentinel=False)
+            contributions[name] = np.array([table.get(v, 0.0) for v in unique_values], dtype=np.float64)[inverse]
+        for (first, second), table in self.cross_tables.items():
+            if first not in columns or second not in columns:
+                continue
+            inverse_a, values_a = pd.factorize(np.asarray(columns[first], dtype=object), use_na_sentinel=False)
+            inverse_b, values_b = pd.factorize(np.asarray(columns[second], dtype=object), use_na_sentinel=False)
+            joint = np.array([[table.get((a, b), 0.0) for b in values_b] for a in values_a], dtype=np.float64)
+            contributions[f"{first} x {second}"] = joint[inverse_a, inverse_b]
+        return contributions
+
+    def decision_function(self, columns):
+        """Survival log-odds for raw viability features (DataFrame or {name: array})."""
+        n_rows = len(columns[next(iter(columns.keys()))]) if len(columns) else 0
+        logits = np.full(n_rows, self.intercept)
+        for contribution in self.feature_contributions(columns).values():
+            logits += contribution
+        return logits
+
+    def predict_features(self, columns):
+        """Survival probabilities for raw viability features (float64), the surrogate of predict_graft_survival_batch."""
+        return 1.0 / (1.0 + np.exp(-self.decision_function(columns)))
+
+
+def _binned_design(features, bin_edges, categories, crosses):
+    """Sparse one-hot design matrix: one column per numeric bin, category level and crossed level pair."""
+    blocks = []
+    n_rows = len(features)
+    for name, edges in bin_edges.items():
+        bins = np.searchsorted(edges, features[name].to_numpy(dtype=np.float64), side='right')
+        blocks.append(sparse.csr_matrix((np.ones(n_rows), (np.arange(n_rows), bins)), shape=(n_rows, len(edges) + 1)))
+    for name, levels in categories.items():
+        codes = pd.Categorical(features[name].astype(object), categories=levels).codes
+        known = codes >= 0
+        blocks.append(sparse.csr_matrix((np.ones(int(known.sum())), (np.flatnonzero(known), codes[known])),
+                                        shape=(n_rows, len(levels))))
+    for (first, second) in crosses:
+        codes_a = pd.Categorical(features[first].astype(object), categories=categories[first]).codes
+        codes_b = pd.Categorical(features[second].astype(object), categories=categories[second]).codes
+        known = (codes_a >= 0) & (codes_b >= 0)
+        codes = codes_a[known].astype(np.int64) * len(categories[second]) + codes_b[known]
+        blocks.append(sparse.csr_matrix((np.ones(int(known.sum())), (np.flatnonzero(known), codes)),
+                                        shape=(n_rows, len(categories[first]) * len(categories[second]))))
+    return sparse.hstack(blocks, format='csr')
+
+
+def distill_viability_model(model, preprocessor, features, y=None, n_bins=SURROGATE_BINS, alpha=1.0, save=True):
+    """
+    Fits a DistilledViabilityModel to the teacher's log-odds on engineered (unscaled) viability
+    features, e.g. engineer_viability_features output. Numeric bins are training quantiles.
+    Agreement with the teacher is measured on a 20% holdout, printed and stored on the model;
+    y (true outcomes) adds the holdout AUC of both models.
+    """
+    features = features.reset_index(drop=True)
+    if len(features) < 10:
+        raise ValueError("Too few rows to distill the viability model.")
+    X_teacher = get_compiled_viability_transform(preprocessor).transform(features[VIAB_NUM_FEATURES + VIAB_CAT_FEATURES])
+    teacher_logits = np.asarray(model.predict(X_teacher, output_margin=True), dtype=np.float64)
+
+    train_idx, test_idx = train_test_split(np.arange(len(features)), test_size=0.2, random_state=42)
+    train = features.iloc[train_idx]
+    bin_edges = {}
+    for name in VIAB_NUM_FEATURES:
+        quantiles = np.quantile(train[name].to_numpy(dtype=np.float64), np.linspace(0, 1, n_bins + 1)[1:-1])
+        bin_edges[name] = np.unique(quantiles)
+    categories = {name: sorted(train[name].astype(str).unique()) for name in VIAB_CAT_FEATURES}
+
+    crosses = [pair for pair in SURROGATE_CROSS_FEATURES if all(f in categories for f in pair)]
+    ridge = Ridge(alpha=alpha).fit(_binned_design(train, bin_edges, categories, crosses), teacher_logits[train_idx])
+    num_tables, cat_tables, offset = {}, {}, 0
+    for name, edges in bin_edges.items():
+        num_tables[name] = ridge.coef_[offset:offset + len(edges) + 1].copy()
+        offset += len(edges) + 1
+    for name, levels in categories.items():
+        cat_tables[name] = dict(zip(levels, ridge.coef_[offset:offset + len(levels)].tolist()))
+        offset += len(levels)
+    cross_tables = {}
+    for (first, second) in crosses:
+        pairs = [(a, b) for a in categories[first] for b in categories[second]]
+        cross_tables[(first, second)] = dict(zip(pairs, ridge.coef_[offset:offset + len(pairs)].tolist()))
+        offset += len(pairs)
+    surrogate = DistilledViabilityModel(ridge.intercept_, bin_edges, num_tables, cat_tables, cross_tables)
+
+    test = features.iloc[test_idx]
+    teacher_probs = 1.0 / (1.0 + np.exp(-teacher_logits[test_idx]))
+    surrogate_probs = surrogate.predict_features(test)
+    abs_diff = np.abs(surrogate_probs - teacher_probs)
+    agreement = {
+        "holdout_rows": int(len(test_idx)),
+        "mean_abs_prob_diff": float(abs_diff.mean()),
+        "p95_abs_prob_diff": float(np.percentile(abs_diff, 95)),
+        "max_abs_prob_diff": float(abs_diff.max()),
+        "spearman": float(pd.Series(surrogate_probs).corr(pd.Series(teacher_probs), method='spearman')),
+        "decision_agreement": float(np.mean((surrogate_probs > 0.5) == (teacher_probs > 0.5))),
+        "mean_prob_teacher": float(teacher_probs.mean()),
+        "mean_prob_surrogate": float(surrogate_probs.mean())
+    }
+    if y is not None:
+        y_test = np.asarray(y)[test_idx]
+        if len(np.unique(y_test)) == 2:
+            agreement["auc_teacher"] = float(roc_auc_score(y_test, teacher_probs))
+            agreement["auc_surrogate"] = float(roc_auc_score(y_test, surrogate_probs))
+    surrogate.agreement = agreement
+
+    print("\nDistilled (fast tier) Viability Model agreement with the full model (holdout):")
+    for key, value in agreement.items():
+        print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    if save:
+        if not os.path.exists(MODEL_DIR):
+            os.makedirs(MODEL_DIR)
+        joblib.dump(surrogate, SURROGATE_MODEL_PATH)
+        print(f"Distilled viability model saved to {SURROGATE_MODEL_PATH} "
+              f"({os.path.getsize(SURROGATE_MODEL_PATH) / 1024:.1f} KB)")
+    return surrogate
@@ -0,0 +1,161 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+import joblib
+from src.utils.data_loader import RAW_DATA_PATH, PROCESSED_DATA_DIR
+from src.matching_engine.match_pipeline import score_pair_frame
+from src.matching_engine.weighted_scorer import WEIGHTS
+from src.prediction_models.viability_predictor import GRAFT_VIABILITY_MODEL_PATH
+from src.prediction_models.feature_engineering import VIABILITY_PREPROCESSOR_PATH
+from src.prediction_models.prediction_cache import ViabilityPredictionCache, model_version_key
+
+# Retro-scores every donor x recipient pair of a historical transplant file under the current WEIGHTS
+# and viability model. The CSV is streamed in chunks, chunks are scored in parallel worker processes
+# with the /api/match_organs engine (match_pipeline.score_pair_frame), and each chunk is written as
+# its own Parquet part. A checkpoint lists finished chunks, so an interrupted run resumes where it stopped.
+
+CHECKPOINT_FILENAME = '_checkpoint.json'
+PART_FILE_PATTERN = 'part-*.parquet'
+PASSTHROUGH_COLUMNS = ['transplant_id', 'donor_id', 'recipient_id', 'organ_type', 'graft_survival_1_year']
+
+_worker_state = {}
+
+
+def _init_worker(model_path, preprocessor_path):
+    _worker_state['model'] = joblib.load(model_path)
+    _worker_state['preprocessor'] = joblib.load(preprocessor_path)
+    _worker_state['cache'] = ViabilityPredictionCache() # Repeated pairs within a worker are predicted once
+
+
+def _score_chunk(chunk_index, chunk, first_row, output_dir, passthrough):
+    start = time.perf_counter()
+    scored = score_pair_frame(chunk, _worker_state['model'], _worker_state['preprocessor'], _worker_state['cache'])
+    scored.insert(0, 'row_number', range(first_row, first_row + len(chunk)))
+    for column in reversed([c for c in passthrough if c in chunk.columns]):
+        scored.insert(1, column, chunk[column].to_numpy())
+
+    part_path = os.path.join(output_dir, f'part-{chunk_index:05d}.parquet')
+    scored.to_parquet(part_path + '.tmp', index=False)
+    os.replace(part_path + '.tmp', part_path) # A part file exists only once it is complete
+    return chunk_index, len(chunk), time.perf_counter() - start
+
+
+def _run_signature(args, model_version):
+    """What the output depends on; a checkpoint from a different signature cannot be resumed."""
+    stat = os.stat(args.input)
+    return {
+        "input": os.path.abspath(args.input), "input_size": stat.st_size, "input_mtime": stat.st_mtime,
+        "chunk_size": args.chunk_size, "model_version": model_version, "weights": WEIGHTS
+    }
+
+
+def _load_checkpoint(path, signature):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("signature") != signature:
+        raise SystemExit(f"Checkpoint at {path} was written for a different input, chunk size, model or WEIGHTS. "
+                         "Use --restart to discard it.")
+    return set(checkpoint.get("completed_chunks", []))
+
+
+def _discard_previous_run(output_dir):
+    """Deletes the parts and checkpoint of an earlier run (only files this tool writes). Returns the part count."""
+    parts = glob.glob(os.path.join(output_dir, PART_FILE_PATTERN)) + \
+        glob.glob(os.path.join(output_dir, PART_FILE_PATTERN + '.tmp'))
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILENAME)
+    for path in parts + [checkpoint_path, checkpoint_path + '.tmp']:
+        if os.path.exists(path):
+            os.remove(path)
+    return len(parts)
+
+
+def _save_checkpoint(path, signature, completed, rows_scored):
+    with open(path + '.tmp', 'w') as f:
+        json.dump({"signature": signature, "completed_chunks": sorted(completed), "rows_scored": rows_scored,
+                   "updated_at": time.strftime('%Y-%m-%dT%H:%M:%S')}, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retro-score historical donor x recipient pairs to Parquet.")
+    parser.add_argument('--input', default=RAW_DATA_PATH, help="Historical transplants CSV.")
+    parser.add_argument('--output', default=os.path.join(PROCESSED_DATA_DIR, 'retro_scores'),
+                        help="Output directory for Parquet parts and the checkpoint.")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--model', default=GRAFT_VIABILITY_MODEL_PATH)
+    parser.add_argument('--preprocessor', default=VIABILITY_PREPROCESSOR_PATH)
+    parser.add_argument('--restart', action='store_true',
+                        help="Delete the parts and checkpoint of an earlier run and rescore everything.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        raise SystemExit(f"Input file not found: {args.input}")
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = os.path.join(args.output, CHECKPOINT_FILENAME)
+
+    model_version = model_version_key(joblib.load(args.model), joblib.load(args.preprocessor))
+    signature = _run_signature(args, model_version)
+    if args.restart:
+        # Parts of the earlier run (possibly another --chunk-size) would otherwise mix into this output
+        discarded = _discard_previous_run(args.output)
+        if discarded:
+            print(f"Restart: deleted {discarded} part file(s) and the checkpoint of the earlier run.")
+    completed = set() if args.restart else _load_checkpoint(checkpoint_path, signature)
+    if completed:
+        print(f"Resuming: {len(completed)} chunk(s) already scored.")
+
+    start = time.perf_counter()
+    rows_scored = 0
+    rows_skipped = 0
+    max_in_flight = max(1, args.workers) * 2 # Bounds memory: only this many chunks are held at once
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                             initargs=(args.model, args.preprocessor)) as executor:
+        in_flight = set()
+
+        def collect(done):
+            nonlocal rows_scored
+            for future in done:
+                chunk_index, n_rows, seconds = future.result()
+                completed.add(chunk_index)
+                rows_scored += n_rows
+                _save_checkpoint(checkpoint_path, signature, completed, rows_scored)
+                elapsed = time.perf_counter() - start
+                print(f"chunk {chunk_index:>5}: {n_rows} rows in {seconds:.2f}s | "
+                      f"total {rows_scored} rows, {rows_scored / elapsed:,.0f} rows/s")
+
+        first_row = 0
+        for chunk_index, chunk in enumerate(pd.read_csv(args.input, chunksize=args.chunk_size)):
+            if chunk_index in completed:
+                rows_skipped += len(chunk)
+            else:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(_score_chunk, chunk_index, chunk, first_row, args.output,
+                                              PASSTHROUGH_COLUMNS))
+            first_row += len(chunk)
+        collect(wait(in_flight).done)
+
+    elapsed = time.perf_counter() - start
+    print(f"\nScored {rows_scored} rows in {elapsed:.1f}s ({rows_scored / elapsed if elapsed else 0:,.0f} rows/s) "
+          f"with {args.workers} worker(s); {rows_skipped} rows were already done.")
+    print(f"Output: {args.output} (read with pandas.read_parquet on the directory). Model version {model_version}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.columnar_scorer import calculate_match_scores, RECIPIENT_HLA_KEYS
+from src.matching_engine.fused_scorer import fused_match_scores, numba
+from src.scripts.benchmark_viability_transform import measure
+from src.scripts.load_test import BLOOD_TYPE_FREQUENCIES, HLA_A_FREQUENCIES, HLA_B_FREQUENCIES, PayloadFactory
+
+# Compares calculate_match_scores with the fused kernel (Numba and NumPy fallback) on synthetic
+# waitlists: time per organ and peak allocation while scoring (tracemalloc sees NumPy buffers), and
+# checks that the scores are identical. Viability, CIT and distances are inputs of the scorer, so
+# they are drawn once per waitlist size.
+#
+#   python src/scripts/benchmark_fused_scorer.py --rows 10000 100000 1000000
+
+
+def _choice(rng, frequencies, size):
+    weights = np.array(list(frequencies.values()), dtype=np.float64)
+    return rng.choice(np.array(list(frequencies), dtype=object), size=size, p=weights / weights.sum())
+
+
+def make_waitlist(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    recipients = {
+        'recipient_blood_type': _choice(rng, BLOOD_TYPE_FREQUENCIES, n_rows),
+        'recipient_age': np.clip(np.round(rng.normal(50, 15, n_rows)), 5, 80),
+        'recipient_comorbidities': np.minimum(6, np.floor(rng.exponential(1 / 0.9, n_rows))),
+        'urgency_score': np.round(rng.beta(2, 3, n_rows), 3),
+    }
+    for key in RECIPIENT_HLA_KEYS:
+        recipients[key] = _choice(rng, HLA_A_FREQUENCIES if '_a' in key else HLA_B_FREQUENCIES, n_rows)
+    scoring_inputs = (rng.random(n_rows), rng.uniform(1, 30, n_rows), rng.uniform(0, 2000, n_rows))
+    return recipients, scoring_inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fused match scoring kernel against calculate_match_scores.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    organ = PayloadFactory(0).organ('Kidney')
+    max_cit = 24.0
+    paths = [('reference', lambda r, p, c, d: calculate_match_scores(organ, r, p, c, max_cit, d)),
+             ('fused-numpy', lambda r, p, c, d: fused_match_scores(organ, r, p, c, max_cit, d, backend='numpy'))]
+    if numba is not None:
+        paths.append(('fused-numba', lambda r, p, c, d: fused_match_scores(organ, r, p, c, max_cit, d, backend='numba')))
+    else:
+        print("Numba is not installed: only the NumPy fallback of the fused kernel is measured.")
+
+    print(f"{'rows':>8} | {'path':<12} | {'time/organ (ms)':>15} | {'peak alloc (MB)':>15} | {'speedup':>7} | identical")
+    for n_rows in args.rows:
+        recipients, (probs, cit, distances) = make_waitlist(n_rows)
+        reference = calculate_match_scores(organ, recipients, probs, cit, max_cit, distances)
+        baseline = None
+        for name, score in paths:
+            identical = np.array_equal(reference, score(recipients, probs, cit, distances))
+            elapsed, peak = measure(lambda: score(recipients, probs, cit, distances), args.repeats)
+            baseline = baseline or elapsed
+            print(f"{n_rows:>8} | {name:<12} | {elapsed * 1000:>15.2f} | {peak / 1e6:>15.2f} | "
+                  f"{baseline / elapsed:>6.1f}x | {identical}")
+
+
+if __name__ == '__main__':
+    main()
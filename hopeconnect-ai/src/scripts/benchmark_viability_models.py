@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+import xgboost as xgb
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import roc_auc_score
+from src.prediction_models.feature_engineering import (
+    VIAB_NUM_FEATURES, VIAB_CAT_FEATURES, fit_viability_preprocessor, get_compiled_viability_transform
+)
+from src.prediction_models.feature_store import engineer_viability_features, TARGET_COLUMN
+from src.prediction_models.viability_predictor import VIABILITY_XGB_PARAMS
+from src.prediction_models.native_viability import (
+    NativeViabilityModel, native_training_frame, native_xgb_params, VIABILITY_NTHREAD
+)
+from src.scripts.benchmark_viability_transform import make_batch
+
+# Side-by-side comparison of three graft viability configurations on the same rows and split:
+#   onehot-dense   - the current pipeline (scaled numerics + dense one-hot, default tree method)
+#   onehot-sparse  - the same encoding as a CSR matrix, 'hist' tree method, explicit nthread
+#   native-cat     - raw categoricals with XGBoost native categorical splits, 'hist', explicit nthread
+# Reports training time, serialized model size, test ROC AUC and inference latency per batch size.
+# Nothing is written to models/.
+
+
+def synthetic_training_rows(n_rows, seed=0):
+    """make_batch rows with a target that depends on the features, so AUC comparisons mean something."""
+    df = make_batch(n_rows, seed)
+    rng = np.random.default_rng(seed + 1)
+    logit = (2.0 - 0.03 * (df['donor_age'] - 45) - 0.08 * df['cold_ischemia_time_hours'] - 0.3 * df['hla_mismatches_count']
+             - 0.2 * df['recipient_comorbidities'] + np.where(df['organ_type'] == 'Kidney', 0.5, 0.0)
+             + np.where(df['donor_blood_type'] == df['recipient_blood_type'], 0.4, 0.0))
+    df[TARGET_COLUMN] = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(int)
+    return df
+
+
+def sparse_preprocessor():
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), VIAB_NUM_FEATURES),
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=True), VIAB_CAT_FEATURES)
+        ],
+        sparse_threshold=1.0 # Always return CSR
+    )
+
+
+def model_size_bytes(booster):
+    return len(booster.save_raw(raw_format='ubj'))
+
+
+def time_call(fn, repeats):
+    fn() # Warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def build_configs(features, nthread):
+    """Fits each configuration on the same 80% split. Returns [(name, fit_seconds, booster, predict_fn, auc)]."""
+    train_idx, test_idx = train_test_split(features.index, test_size=0.2, random_state=42,
+                                           stratify=features[TARGET_COLUMN])
+    train, test = features.loc[train_idx], features.loc[test_idx]
+    y_train, y_test = train[TARGET_COLUMN], test[TARGET_COLUMN]
+    configs = []
+
+    # Current pipeline
+    start = time.perf_counter()
+    processed, preprocessor = fit_viability_preprocessor(train, save=False)
+    dense = xgb.XGBClassifier(**VIABILITY_XGB_PARAMS)
+    dense.fit(processed.drop(TARGET_COLUMN, axis=1), y_train)
+    fit_seconds = time.perf_counter() - start
+    compiled = get_compiled_viability_transform(preprocessor)
+    dense_predict = lambda df: dense.predict_proba(compiled.transform(df))[:, 1]
+    configs.append(('onehot-dense', fit_seconds, dense.get_booster(), dense_predict,
+                    roc_auc_score(y_test, dense_predict(test))))
+
+    # Sparse one-hot + hist
+    start = time.perf_counter()
+    csr_preprocessor = sparse_preprocessor()
+    X_train_csr = csr_preprocessor.fit_transform(train[VIAB_NUM_FEATURES + VIAB_CAT_FEATURES])
+    sparse_params = dict(VIABILITY_XGB_PARAMS, tree_method='hist', n_jobs=nthread)
+    sparse_params.pop("use_label_encoder", None)
+    sparse = xgb.XGBClassifier(**sparse_params)
+    sparse.fit(X_train_csr, y_train)
+    fit_seconds = time.perf_counter() - start
+    sparse_booster = sparse.get_booster()
+    sparse_predict = lambda df: sparse_booster.inplace_predict(
+        csr_preprocessor.transform(df[VIAB_NUM_FEATURES + VIAB_CAT_FEATURES]))
+    configs.append(('onehot-sparse', fit_seconds, sparse_booster, sparse_predict,
+                    roc_auc_score(y_test, sparse_predict(test))))
+
+    # Native categorical + hist
+    start = time.perf_counter()
+    X_train_native, _, categories = native_training_frame(train)
+    native = xgb.XGBClassifier(**native_xgb_params(nthread))
+    native.fit(X_train_native, y_train)
+    fit_seconds = time.perf_counter() - start
+    native_model = NativeViabilityModel(native.get_booster(), categories, nthread)
+    configs.append(('native-cat', fit_seconds, native_model.booster, native_model.predict_proba,
+                    roc_auc_score(y_test, native_model.predict_proba(test))))
+    return configs, test
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark one-hot vs native categorical viability model configurations.")
+    parser.add_argument('--input', help="Historical transplants CSV (default: synthetic rows).")
+    parser.add_argument('--rows', type=int, default=50000, help="Synthetic training rows when --input is not given.")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--nthread', type=int, default=VIABILITY_NTHREAD)
+    args = parser.parse_args()
+
+    raw = pd.read_csv(args.input) if args.input else synthetic_training_rows(args.rows)
+    features = engineer_viability_features(raw)
+    if TARGET_COLUMN not in features.columns:
+        raise SystemExit(f"Input has no '{TARGET_COLUMN}' column.")
+    print(f"{len(features)} training rows, nthread={args.nthread}\n")
+
+    configs, test = build_configs(features, args.nthread)
+    reference = configs[0][3](test)
+    header = f"{'config':<14} | {'fit (s)':>8} | {'model (KB)':>10} | {'test AUC':>8} | {'max |dp| vs dense':>17}"
+    header += "".join(f" | {f'p@{b} (ms)':>12}" for b in args.batch_sizes)
+    print(header)
+    for name, fit_seconds, booster, predict, auc in configs:
+        diff = float(np.max(np.abs(np.asarray(predict(test)) - reference)))
+        row = f"{name:<14} | {fit_seconds:>8.2f} | {model_size_bytes(booster) / 1024:>10.1f} | {auc:>8.4f} | {diff:>17.4f}"
+        for batch_size in args.batch_sizes:
+            batch = test.sample(n=batch_size, replace=batch_size > len(test), random_state=0)
+            row += f" | {time_call(lambda: predict(batch), args.repeats) * 1000:>12.3f}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import tracemalloc
+import argparse
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+import joblib
+from src.prediction_models.feature_engineering import (
+    preprocess_for_viability_prediction, get_compiled_viability_transform, VIABILITY_PREPROCESSOR_PATH
+)
+
+BLOOD_TYPES = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
+
+
+def make_batch(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'donor_age': rng.integers(18, 80, n_rows).astype(float),
+        'organ_type': rng.choice(['Kidney', 'Liver', 'Heart'], n_rows),
+        'donor_comorbidities': rng.integers(0, 4, n_rows),
+        'cold_ischemia_time_hours': rng.uniform(1, 26, n_rows),
+        'distance_km': rng.uniform(0, 2000, n_rows),
+        'donor_blood_type': rng.choice(BLOOD_TYPES, n_rows),
+        'recipient_blood_type': rng.choice(BLOOD_TYPES, n_rows),
+        'hla_mismatches_count': rng.integers(0, 5, n_rows),
+        'recipient_age': rng.uniform(5, 80, n_rows),
+        'recipient_comorbidities': rng.integers(0, 5, n_rows),
+    })
+
+
+def measure(transform, repeats):
+    transform() # Warm-up (also builds the compiled mappings / thread buffer)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        transform()
+    elapsed = (time.perf_counter() - start) / repeats
+
+    tracemalloc.start()
+    transform()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the DataFrame and compiled float32 viability transforms.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    preprocessor = joblib.load(VIABILITY_PREPROCESSOR_PATH)
+    compiled = get_compiled_viability_transform(preprocessor)
+
+    print(f"{'rows':>8} | {'path':<10} | {'time/batch (ms)':>15} | {'peak alloc (MB)':>15}")
+    for n_rows in args.rows:
+        batch = make_batch(n_rows)
+        reference = preprocess_for_viability_prediction(batch, preprocessor).to_numpy().astype(np.float32)
+        if not np.array_equal(reference, compiled.transform(batch)):
+            print(f"!! Compiled transform output differs from the DataFrame path at {n_rows} rows.")
+
+        for name, transform in [('dataframe', lambda: preprocess_for_viability_prediction(batch, preprocessor)),
+                                ('compiled', lambda: compiled.transform(batch))]:
+            elapsed, peak = measure(transform, args.repeats)
+            print(f"{n_rows:>8} | {name:<10} | {elapsed * 1000:>15.2f} | {peak / 1e6:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
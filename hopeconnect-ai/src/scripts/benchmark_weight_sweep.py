@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.columnar_scorer import calculate_match_scores, calculate_score_components
+from src.matching_engine.weight_sweep import component_matrix, perturbed_weight_vectors, sweep_weights, REFERENCE_VECTOR_NAME
+from src.matching_engine.weighted_scorer import WEIGHTS
+from src.scripts.benchmark_fused_scorer import make_waitlist
+from src.scripts.load_test import PayloadFactory
+
+# Compares a weight sweep (component matrix once, one matrix product per chunk of vectors) with scoring
+# the waitlist once per weight vector through calculate_match_scores, as one /api/match_organs call per
+# vector would (without the per-call viability and distance work, which the sweep also does only once).
+# Checks that both give the same top-K for every vector.
+#
+#   python src/scripts/benchmark_weight_sweep.py --rows 1000 10000 100000 --vectors 100 500
+
+TOP_K = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the weight sweep against per-vector scoring.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--vectors', type=int, nargs='+', default=[100, 500])
+    args = parser.parse_args()
+
+    organ = PayloadFactory(0).organ('Kidney')
+    max_cit = 24.0
+    print(f"{'rows':>7} | {'vectors':>7} | {'components ms':>13} | {'sweep ms':>9} | {'per-vector ms':>13} | "
+          f"{'speedup':>7} | same top-K")
+    for n_rows in args.rows:
+        recipients, (probs, cit, distances) = make_waitlist(n_rows)
+        ids = [f"R{i}" for i in range(n_rows)]
+        for n_vectors in args.vectors:
+            vectors = [(REFERENCE_VECTOR_NAME, dict(WEIGHTS))] + perturbed_weight_vectors(n_vectors)
+
+            started = time.perf_counter()
+            terms, eligible = calculate_score_components(organ, recipients, probs, cit, max_cit, distances)
+            components = component_matrix(terms, n_rows)[eligible]
+            candidate_ids = [ids[i] for i in np.flatnonzero(eligible).tolist()]
+            components_done = time.perf_counter()
+            result = sweep_weights(components, candidate_ids, vectors, TOP_K)
+            swept = time.perf_counter()
+
+            same = True
+            for name_weights, swept_vector in zip(vectors, result["vectors"]):
+                scores = calculate_match_scores(organ, recipients, probs, cit, max_cit, distances, weights=name_weights[1])
+                top = np.argsort(-scores, kind='stable')[:TOP_K]
+                same &= [ids[i] for i in top.tolist()] == [e["recipient_id"] for e in swept_vector["top_k"]]
+            looped = time.perf_counter()
+
+            sweep_ms = (swept - started) * 1000
+            loop_ms = (looped - swept) * 1000
+            print(f"{n_rows:>7} | {n_vectors:>7} | {(components_done - started) * 1000:>13.1f} | {sweep_ms:>9.1f} | "
+                  f"{loop_ms:>13.1f} | {loop_ms / sweep_ms:>6.1f}x | {same}")
+
+
+if __name__ == '__main__':
+    main()
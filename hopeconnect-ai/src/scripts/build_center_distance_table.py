@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.distance_calculator import calculate_distance_km
+from src.matching_engine.center_distances import CENTER_DISTANCE_TABLE_DIR, CENTERS_FILENAME, DISTANCES_FILENAME
+
+
+def load_centers(path):
+    """
+    Reads transplant centers from a CSV (center_id, lat, lon) or a JSON list. JSON entries may also be
+    Hospital documents exported from the backend: '_id' or 'did' as the id and GeoJSON
+    'location.coordinates' ([longitude, latitude]) as the position.
+    """
+    if path.endswith('.csv'):
+        records = pd.read_csv(path).to_dict('records')
+    else:
+        with open(path) as f:
+            records = json.load(f)
+        if isinstance(records, dict):
+            records = records.get('centers', [])
+
+    centers, skipped = [], 0
+    for record in records:
+        center_id = record.get('center_id', record.get('_id', record.get('did')))
+        if isinstance(center_id, dict): # Mongo extended JSON: {"$oid": "..."}
+            center_id = center_id.get('$oid')
+        if 'lat' in record and 'lon' in record:
+            lat, lon = record['lat'], record['lon']
+        else:
+            coordinates = (record.get('location') or {}).get('coordinates') or []
+            lon, lat = coordinates if len(coordinates) == 2 else (None, None)
+        if center_id is None or lat is None or lon is None:
+            skipped += 1
+            continue
+        centers.append({'center_id': str(center_id), 'name': record.get('name'), 'lat': float(lat), 'lon': float(lon)})
+    if skipped:
+        print(f"Skipped {skipped} center(s) without an id or coordinates.")
+    ids = [c['center_id'] for c in centers]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate center ids in the centers file.")
+    return centers
+
+
+def build_table(centers):
+    """Full donor x recipient matrix, computed with the same call the live path makes."""
+    n = len(centers)
+    distances = np.empty((n, n), dtype=np.float64)
+    for i, donor in enumerate(centers):
+        for j, recipient in enumerate(centers):
+            distances[i, j] = calculate_distance_km(donor['lat'], donor['lon'], recipient['lat'], recipient['lon'])
+    return distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the center-to-center distance table used by matching.")
+    parser.add_argument('--centers', required=True, help="CSV (center_id, lat, lon) or JSON list of centers.")
+    parser.add_argument('--out', default=CENTER_DISTANCE_TABLE_DIR, help="Output directory.")
+    parser.add_argument('--version', default=time.strftime('%Y%m%d%H%M%S'), help="Table version label.")
+    args = parser.parse_args()
+
+    centers = load_centers(args.centers)
+    if not centers:
+        print("No centers to tabulate.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    distances = build_table(centers)
+    print(f"Computed {len(centers) ** 2} distances for {len(centers)} centers in {time.perf_counter() - start:.1f}s.")
+
+    os.makedirs(args.out, exist_ok=True)
+    # Write under temporary names and swap in, so a running service never maps a half-written file
+    matrix_tmp = os.path.join(args.out, DISTANCES_FILENAME + '.tmp')
+    centers_tmp = os.path.join(args.out, CENTERS_FILENAME + '.tmp')
+    with open(matrix_tmp, 'wb') as f:
+        np.save(f, distances)
+    with open(centers_tmp, 'w') as f:
+        json.dump({'version': args.version, 'centers': centers}, f, indent=2)
+    os.replace(matrix_tmp, os.path.join(args.out, DISTANCES_FILENAME))
+    os.replace(centers_tmp, os.path.join(args.out, CENTERS_FILENAME))
+    print(f"Center distance table version {args.version} written to {args.out}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import copy
+import json
+import argparse
+import warnings
+import logging
+import pandas as pd
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.scripts.load_test import PayloadFactory
+from src.utils.arrow_io import ARROW_STREAM_MIMETYPE, arrow_available, columns_to_arrow_bytes, read_arrow_table
+
+# Checks that /api/match_organs ranks identically over its three input/output paths: JSON (per-pair
+# scorer), NDJSON streaming and Arrow IPC (columnar scorer). Synthetic payloads from the load test
+# generator, with fractional comorbidity counts on some recipients, missing logistics and a recipient
+# with missing fields. Every result entry must match exactly (id, score, viability, CIT, error).
+# Exits with status 1 on any difference, so it can gate a change to either scorer.
+#
+#   python src/scripts/check_match_paths.py --payloads 20 --recipients 300
+
+FRACTIONAL_COMORBIDITY_RATE = 0.2
+
+
+def make_payload(factory, n_recipients):
+    payload = factory.match(n_recipients)
+    for recipient in payload["recipients"]:
+        if factory.rng.random() < FRACTIONAL_COMORBIDITY_RATE:
+            recipient['recipient_comorbidities'] = round(factory.rng.uniform(0, 4), 1)
+    incomplete = factory.recipient("R_incomplete")
+    del incomplete['urgency_score']
+    payload["recipients"].append(incomplete)
+    return payload
+
+
+def _arrow_body(payload):
+    frame = pd.DataFrame(payload["recipients"])
+    frame['estimated_cold_ischemia_hours'] = [
+        payload["logistics"].get(rid, {}).get("estimated_cold_ischemia_hours") for rid in frame['recipient_id']]
+    return columns_to_arrow_bytes({c: frame[c].to_numpy() for c in frame.columns}, metadata={"organ": payload["organ"]})
+
+
+def _entry(match):
+    """Comparable form of a result entry from any path (Arrow rows are flat, nulls for N/A)."""
+    details = match.get("details", match)
+    cit = details.get("estimated_cold_ischemia_hours")
+    prob = details.get("predicted_graft_survival_prob")
+    return (str(match["recipient_id"]), float(match["score"]), None if match.get("error") else prob,
+            None if cit in (None, "N/A") or cit != cit else float(cit), match.get("error") or None)
+
+
+def ranked_by_path(client, payload):
+    rankings = {"json": client.post('/api/match_organs', json=copy.deepcopy(payload)).get_json()}
+    ndjson = client.post('/api/match_organs', json=copy.deepcopy(payload), headers={'Accept': 'application/x-ndjson'})
+    rankings["ndjson"] = [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines() if line]
+    if arrow_available():
+        response = client.post('/api/match_organs', data=_arrow_body(payload), content_type=ARROW_STREAM_MIMETYPE)
+        rankings["arrow"] = read_arrow_table(response.get_data()).to_pylist()
+    return {path: [_entry(m) for m in ranking] for path, ranking in rankings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that JSON, NDJSON and Arrow /api/match_organs rankings are identical.")
+    parser.add_argument('--payloads', type=int, default=10)
+    parser.add_argument('--recipients', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from src.app import app
+    app.logger.setLevel(logging.ERROR) # Default-viability warnings for unknown CIT are expected here
+    client = app.test_client()
+    factory = PayloadFactory(args.seed)
+
+    failures = 0
+    for i in range(args.payloads):
+        payload = make_payload(factory, args.recipients)
+        rankings = ranked_by_path(client, payload)
+        reference = rankings.pop("json")
+        for path, ranking in rankings.items():
+            differing = [k for k, (a, b) in enumerate(zip(reference, ranking)) if a != b]
+            if differing or len(reference) != len(ranking):
+                failures += 1
+                first = differing[0] if differing else min(len(reference), len(ranking))
+                print(f"payload {i}: {path} differs from json at rank {first + 1}: "
+                      f"{reference[first] if first < len(reference) else None} vs "
+                      f"{ranking[first] if first < len(ranking) else None}")
+    paths = "json, ndjson" + (", arrow" if arrow_available() else " (pyarrow not installed: arrow skipped)")
+    print(f"{args.payloads} payloads x {args.recipients} recipients over {paths}: "
+          f"{'all identical' if not failures else f'{failures} differing rankings'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
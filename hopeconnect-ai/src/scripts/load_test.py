@@ -0,0 +1,427 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+# Open-loop load generator for the AI service, standing in for the Node backend
+# (hospitalController.js -> aiService). Requests are synthesized with realistic blood type, HLA,
+# location and CIT distributions and sent on a Poisson arrival schedule that does not slow down
+# when the service does, so latency is measured from the scheduled send time (queueing included).
+#
+#   python src/scripts/load_test.py --rate 20 --duration 30
+#   python src/scripts/load_test.py --find-max --slo-p99-ms 500
+#   python src/scripts/load_test.py --leak-check --mix match=1 --waitlist-size 2000
+#
+# The 'backend' scenario replays hospitalController.findMatches: one find-matches operation is a
+# sequential loop of /api/match_organs calls, one per compatible donor, each with a single recipient.
+#
+# --leak-check replays one fixed round of requests many times and fails (exit status 1) when the
+# service's memory keeps growing once its caches are warm (see /api/memory/stats; start the service
+# with MEMORY_DIAGNOSTICS=trace to measure traced allocations instead of the noisier RSS).
+
+DEFAULT_URL = os.environ.get('AI_SERVICE_URL', 'http://127.0.0.1:5050')
+ENDPOINTS = {
+    "match": "/api/match_organs",
+    "viability": "/api/predict_viability",
+    "donor_health": "/api/assess_donor_health",
+    "backend": "/api/match_organs",
+}
+
+# Approximate population frequencies
+BLOOD_TYPE_FREQUENCIES = {'O+': 0.374, 'A+': 0.357, 'B+': 0.085, 'AB+': 0.034,
+                          'O-': 0.066, 'A-': 0.063, 'B-': 0.015, 'AB-': 0.006}
+ORGAN_TYPE_FREQUENCIES = {'Kidney': 0.60, 'Liver': 0.25, 'Heart': 0.08, 'Lung': 0.05, 'Pancreas': 0.02}
+HLA_A_FREQUENCIES = {'A2': 0.27, 'A1': 0.14, 'A3': 0.12, 'A24': 0.10, 'A11': 0.09, 'A26': 0.05,
+                     'A68': 0.05, 'A31': 0.04, 'A33': 0.04, 'A30': 0.04, 'A29': 0.03, 'A32': 0.03}
+HLA_B_FREQUENCIES = {'B7': 0.11, 'B8': 0.09, 'B44': 0.09, 'B35': 0.09, 'B15': 0.08, 'B51': 0.07,
+                     'B40': 0.06, 'B18': 0.05, 'B27': 0.05, 'B57': 0.05, 'B13': 0.04, 'B52': 0.04,
+                     'B49': 0.04, 'B14': 0.04, 'B37': 0.03, 'B38': 0.03}
+# Transplant centers (name, lat, lon); most parties sit at a center, some at ad-hoc locations
+TRANSPLANT_CENTERS = [
+    ('Delhi', 28.6139, 77.2090), ('Mumbai', 19.0760, 72.8777), ('Chennai', 13.0827, 80.2707),
+    ('Bengaluru', 12.9716, 77.5946), ('Hyderabad', 17.3850, 78.4867), ('Kolkata', 22.5726, 88.3639),
+    ('Ahmedabad', 23.0225, 72.5714), ('Pune', 18.5204, 73.8567), ('Lucknow', 26.8467, 80.9462),
+    ('Jaipur', 26.9124, 75.7873), ('Kochi', 9.9312, 76.2673), ('Chandigarh', 30.7333, 76.7794),
+]
+
+
+class PayloadFactory:
+    """Synthesizes request bodies. Seeded, so runs are reproducible."""
+
+    def __init__(self, seed=0, waitlist_size=50):
+        self.rng = random.Random(seed)
+        self.waitlist_size = waitlist_size
+
+    def _pick(self, frequencies):
+        return self.rng.choices(list(frequencies), weights=list(frequencies.values()))[0]
+
+    def _age(self, mean, sd, low, high):
+        return int(min(high, max(low, round(self.rng.gauss(mean, sd)))))
+
+    def _location(self):
+        center_index = self.rng.randrange(len(TRANSPLANT_CENTERS))
+        _, lat, lon = TRANSPLANT_CENTERS[center_index]
+        if self.rng.random() < 0.85:
+            return f"center-{center_index}", lat, lon
+        return None, lat + self.rng.uniform(-0.5, 0.5), lon + self.rng.uniform(-0.5, 0.5)
+
+    def _hla(self, prefix):
+        return {f'{prefix}_hla_a1': self._pick(HLA_A_FREQUENCIES), f'{prefix}_hla_a2': self._pick(HLA_A_FREQUENCIES),
+                f'{prefix}_hla_b1': self._pick(HLA_B_FREQUENCIES), f'{prefix}_hla_b2': self._pick(HLA_B_FREQUENCIES)}
+
+    def _cit(self, distance_km):
+        """Retrieval and transport time: ground transport up to ~300 km, flights beyond, log-normal delays."""
+        transport_hours = distance_km / 60.0 if distance_km < 300 else 2.0 + distance_km / 650.0
+        return round(1.5 + transport_hours + self.rng.lognormvariate(0.0, 0.6), 2)
+
+    def organ(self, organ_type=None):
+        center_id, lat, lon = self._location()
+        organ = {'organ_type': organ_type or self._pick(ORGAN_TYPE_FREQUENCIES),
+                 'donor_age': self._age(45, 15, 18, 75), 'donor_blood_type': self._pick(BLOOD_TYPE_FREQUENCIES),
+                 'donor_location_lat': lat, 'donor_location_lon': lon,
+                 'donor_comorbidities': min(5, int(self.rng.expovariate(1.2)))}
+        organ.update(self._hla('donor'))
+        if center_id:
+            organ['donor_center_id'] = center_id
+        return organ
+
+    def recipient(self, recipient_id):
+        center_id, lat, lon = self._location()
+        recipient = {'recipient_id': recipient_id, 'recipient_age': self._age(50, 15, 5, 80),
+                     'recipient_blood_type': self._pick(BLOOD_TYPE_FREQUENCIES),
+                     'recipient_location_lat': lat, 'recipient_location_lon': lon,
+                     'urgency_score': round(self.rng.betavariate(2, 3), 3),
+                     'recipient_comorbidities': min(6, int(self.rng.expovariate(0.9)))}
+        recipient.update(self._hla('recipient'))
+        if center_id:
+            recipient['recipient_center_id'] = center_id
+        return recipient
+
+    def match(self, n_recipients=None):
+        n = n_recipients or max(1, int(self.rng.expovariate(1.0 / self.waitlist_size)))
+        organ = self.organ()
+        recipients = [self.recipient(f"R{self.rng.randrange(10 ** 8)}") for _ in range(n)]
+        logistics = {}
+        for recipient in recipients:
+            if self.rng.random() < 0.9: # Logistics are not always known yet
+                distance_km = _haversine_km(organ['donor_location_lat'], organ['donor_location_lon'],
+                                            recipient['recipient_location_lat'], recipient['recipient_location_lon'])
+                logistics[recipient['recipient_id']] = {"estimated_cold_ischemia_hours": self._cit(distance_km)}
+        return {"organ": organ, "recipients": recipients, "logistics": logistics}
+
+    def viability(self):
+        organ = self.organ()
+        recipient = self.recipient("R0")
+        distance_km = _haversine_km(organ['donor_location_lat'], organ['donor_location_lon'],
+                                    recipient['recipient_location_lat'], recipient['recipient_location_lon'])
+        return {'donor_age': organ['donor_age'], 'organ_type': organ['organ_type'],
+                'donor_comorbidities': organ['donor_comorbidities'], 'cold_ischemia_time_hours': self._cit(distance_km),
+                'distance_km': round(distance_km, 1), 'donor_blood_type': organ['donor_blood_type'],
+                'recipient_blood_type': recipient['recipient_blood_type'],
+                'hla_mismatches_count': self.rng.randint(0, 4), 'recipient_age': recipient['recipient_age'],
+                'recipient_comorbidities': recipient['recipient_comorbidities']}
+
+    def donor_health(self):
+        return {'donor_age': self._age(40, 13, 18, 75), 'organ_type': self._pick(ORGAN_TYPE_FREQUENCIES),
+                'comorbidities_count': min(5, int(self.rng.expovariate(1.2))),
+                'lifestyle_factors': {'smoker': self.rng.random() < 0.2,
+                                      'alcohol_consumption': self.rng.choices(['none', 'moderate', 'high'], [0.6, 0.3, 0.1])[0],
+                                      'bmi': round(self.rng.gauss(24.5, 4.0), 1)},
+                'lab_results': {'creatinine': round(self.rng.lognormvariate(0.0, 0.25), 2),
+                                'gfr': round(min(130.0, max(15.0, self.rng.gauss(90, 20))), 1)}}
+
+    def backend_find_matches(self):
+        """One hospitalController.findMatches call: the same patient against each compatible donor."""
+        recipient = self.recipient(f"REQ{self.rng.randrange(10 ** 8)}")
+        organ_type = self._pick(ORGAN_TYPE_FREQUENCIES)
+        payloads = []
+        for _ in range(max(1, int(self.rng.expovariate(1.0 / 8)))):
+            payloads.append({"organ": self.organ(organ_type), "recipients": [recipient],
+                             "logistics": {recipient['recipient_id']: {"estimated_cold_ischemia_hours": 4}}})
+        return payloads
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def _post_json(url, body, timeout):
+    data = json.dumps(body).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def parse_mix(mix):
+    """'match=0.6,viability=0.3,donor_health=0.1' -> normalized {endpoint: weight}."""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}'. Expected one of: {', '.join(ENDPOINTS)}.")
+        weights[name] = float(weight or 1.0)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Endpoint mix weights must sum to a positive number.")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def run_open_loop(base_url, rate, duration, mix, factory, max_concurrency=256, timeout=30.0, seed=0):
+    """
+    Sends Poisson arrivals at `rate` req/s for `duration` seconds. Payloads are built before the run so
+    generation cost does not skew the schedule. Returns {endpoint: [(latency_s, ok), ...]} and the wall time.
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    schedule, offset = [], 0.0
+    while True:
+        offset += rng.expovariate(rate)
+        if offset >= duration:
+            break
+        name = rng.choices(names, weights)[0]
+        body = {"match": factory.match, "viability": factory.viability, "donor_health": factory.donor_health,
+                "backend": factory.backend_find_matches}[name]()
+        schedule.append((offset, name, body))
+
+    results = {name: [] for name in names}
+    lock = threading.Lock()
+
+    def send(scheduled_at, name, body):
+        ok = True
+        try:
+            for payload in (body if name == "backend" else [body]): # backend: sequential calls, like the controller loop
+                status = _post_json(base_url + ENDPOINTS[name], payload, timeout)
+                ok = ok and 200 <= status < 300
+        except Exception:
+            ok = False
+        latency = time.perf_counter() - scheduled_at # From the scheduled time: queueing delay counts
+        with lock:
+            results[name].append((latency, ok))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for offset, name, body in schedule:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, start + offset, name, body)
+    return results, time.perf_counter() - start
+
+
+def _get_json(url, timeout):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def run_leak_check(args, mix, factory):
+    """
+    Sends the same round of requests sequentially, warm-up rounds first (caches fill there), then samples
+    the service's memory after a full GC following every measured round. Identical requests should leave
+    memory flat, so the least-squares growth over the measured rounds is compared to --leak-tolerance-mb.
+    Returns the report and whether the check passed.
+    """
+    rng = random.Random(args.seed)
+    names, weights = list(mix), list(mix.values())
+    round_payloads = []
+    for _ in range(args.leak_round_size):
+        name = rng.choices(names, weights)[0]
+        body = {"match": factory.match, "viability": factory.viability, "donor_health": factory.donor_health,
+                "backend": factory.backend_find_matches}[name]()
+        round_payloads.extend((name, payload) for payload in (body if name == "backend" else [body]))
+
+    def sample_memory():
+        stats = _get_json(args.url + '/api/memory/stats?collect=1&resident=0', args.timeout)
+        if stats.get("traced_current_bytes") is not None:
+            return "traced_current_bytes", stats["traced_current_bytes"]
+        if stats.get("rss_bytes") is None:
+            raise SystemExit("The service reports neither traced memory nor RSS; run it with MEMORY_DIAGNOSTICS=trace.")
+        return "rss_bytes", stats["rss_bytes"]
+
+    errors, samples, metric = 0, [], None
+    for round_index in range(args.leak_warmup + args.leak_rounds):
+        for name, payload in round_payloads:
+            status = _post_json(args.url + ENDPOINTS[name], payload, args.timeout)
+            errors += not 200 <= status < 300
+        if round_index < args.leak_warmup:
+            continue
+        metric, value = sample_memory()
+        samples.append(value)
+        print(f"  round {len(samples):>3}: {metric} {value / 1e6:10.2f} MB ({(value - samples[0]) / 1e6:+.2f} MB)")
+
+    slope = float(np.polyfit(np.arange(len(samples)), samples, 1)[0]) if len(samples) > 1 else 0.0
+    growth = slope * (len(samples) - 1)
+    passed = growth <= args.leak_tolerance_mb * 1e6
+    report = {"metric": metric, "requests_per_round": len(round_payloads), "warmup_rounds": args.leak_warmup,
+              "samples_bytes": samples, "growth_per_round_bytes": slope, "fitted_growth_bytes": growth,
+              "tolerance_bytes": args.leak_tolerance_mb * 1e6, "errors": errors, "passed": passed}
+    print(f"\n{metric}: fitted growth {growth / 1e6:+.2f} MB over {len(samples)} rounds of {len(round_payloads)} "
+          f"requests ({slope / 1e3:+.1f} KB/round), tolerance {args.leak_tolerance_mb:.1f} MB: "
+          f"{'PASSED' if passed else 'FAILED'}")
+    if errors:
+        print(f"Warning: {errors} requests failed during the leak check.")
+    return report, passed
+
+
+def summarize(results, offered_rate, duration, wall_seconds):
+    summary = {"offered_rate": offered_rate, "endpoints": {}}
+    all_latencies, all_errors, total = [], 0, 0
+    for name, samples in results.items():
+        if not samples:
+            continue
+        latencies = np.array([s[0] for s in samples]) * 1000
+        errors = sum(1 for s in samples if not s[1])
+        summary["endpoints"][name] = {
+            "requests": len(samples), "errors": errors, "error_rate": errors / len(samples),
+            "p50_ms": float(np.percentile(latencies, 50)), "p90_ms": float(np.percentile(latencies, 90)),
+            "p99_ms": float(np.percentile(latencies, 99)), "max_ms": float(latencies.max())
+        }
+        all_latencies.extend(latencies.tolist())
+        all_errors += errors
+        total += len(samples)
+    summary.update({
+        # Poisson arrivals: compare against what was actually sent, not the nominal rate
+        "requests": total, "sent_rate": total / duration, "achieved_rate": total / wall_seconds if wall_seconds else 0.0,
+        "error_rate": all_errors / total if total else 0.0,
+        "p50_ms": float(np.percentile(all_latencies, 50)) if all_latencies else None,
+        "p99_ms": float(np.percentile(all_latencies, 99)) if all_latencies else None
+    })
+    return summary
+
+
+def print_summary(summary):
+    print(f"\nOffered {summary['offered_rate']:.1f} req/s, completed {summary['requests']} "
+          f"({summary['achieved_rate']:.1f} req/s), error rate {summary['error_rate']:.2%}")
+    print(f"{'endpoint':<13} | {'requests':>8} | {'errors':>6} | {'p50 ms':>8} | {'p90 ms':>8} | {'p99 ms':>8} | {'max ms':>8}")
+    for name, s in summary["endpoints"].items():
+        print(f"{name:<13} | {s['requests']:>8} | {s['errors']:>6} | {s['p50_ms']:>8.1f} | {s['p90_ms']:>8.1f} | "
+              f"{s['p99_ms']:>8.1f} | {s['max_ms']:>8.1f}")
+
+
+def is_sustainable(summary, slo_p99_ms, max_error_rate):
+    """The service keeps up: p99 within the SLO, few errors, and it completed what was offered."""
+    return (summary["requests"] > 0 and summary["p99_ms"] <= slo_p99_ms
+            and summary["error_rate"] <= max_error_rate
+            and summary["achieved_rate"] >= 0.9 * summary["sent_rate"])
+
+
+def find_max_throughput(args, mix, factory):
+    """Doubles the rate until the SLO breaks, then bisects between the last good and first bad rate."""
+    runs = []
+
+    def trial(rate):
+        results, wall = run_open_loop(args.url, rate, args.duration, mix, factory, args.max_concurrency, args.timeout)
+        summary = summarize(results, rate, args.duration, wall)
+        ok = is_sustainable(summary, args.slo_p99_ms, args.max_error_rate)
+        runs.append((rate, ok, summary))
+        print(f"  {rate:8.1f} req/s -> p99 {summary['p99_ms'] or 0:8.1f} ms, errors {summary['error_rate']:.2%}, "
+              f"achieved {summary['achieved_rate']:.1f} req/s: {'OK' if ok else 'SATURATED'}")
+        time.sleep(args.cooldown) # Let queues drain between steps
+        return ok
+
+    good, bad, rate = 0.0, None, args.rate
+    while bad is None and rate <= args.max_rate:
+        if trial(rate):
+            good, rate = rate, rate * 2
+        else:
+            bad = rate
+    if bad is None:
+        print(f"Still sustainable at --max-rate {args.max_rate}; raise it to search further.")
+        return good, runs
+    for _ in range(args.search_steps):
+        if bad - good <= max(0.5, 0.05 * bad):
+            break
+        middle = (good + bad) / 2
+        if trial(middle):
+            good = middle
+        else:
+            bad = middle
+    return good, runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for the HopeConnect AI service.")
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--rate', type=float, default=10.0, help="Requests/s (starting rate with --find-max).")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds per run.")
+    parser.add_argument('--mix', default='match=0.6,viability=0.3,donor_health=0.1',
+                        help=f"Endpoint weights over: {', '.join(ENDPOINTS)} ('backend' replays findMatches loops).")
+    parser.add_argument('--waitlist-size', type=int, default=50, help="Mean recipients per match request.")
+    parser.add_argument('--max-concurrency', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--find-max', action='store_true', help="Search for the max sustainable rate.")
+    parser.add_argument('--slo-p99-ms', type=float, default=1000.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--max-rate', type=float, default=5000.0)
+    parser.add_argument('--search-steps', type=int, default=6)
+    parser.add_argument('--cooldown', type=float, default=2.0)
+    parser.add_argument('--leak-check', action='store_true',
+                        help="Replay a fixed round of requests and fail if service memory keeps growing.")
+    parser.add_argument('--leak-rounds', type=int, default=10, help="Measured rounds in --leak-check.")
+    parser.add_argument('--leak-warmup', type=int, default=3, help="Unmeasured rounds first (caches fill).")
+    parser.add_argument('--leak-round-size', type=int, default=20, help="Requests per --leak-check round.")
+    parser.add_argument('--leak-tolerance-mb', type=float, default=5.0,
+                        help="Maximum fitted memory growth over the measured rounds.")
+    parser.add_argument('--json', help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+    factory = PayloadFactory(args.seed, args.waitlist_size)
+    try:
+        urllib.request.urlopen(args.url + '/api/health', timeout=5).read()
+    except (urllib.error.URLError, OSError) as e:
+        raise SystemExit(f"AI service not reachable at {args.url}: {e}")
+
+    passed = True
+    if args.leak_check:
+        print(f"Leak check: {args.leak_warmup} warm-up + {args.leak_rounds} measured rounds "
+              f"of {args.leak_round_size} requests:")
+        report, passed = run_leak_check(args, mix, factory)
+    elif args.find_max:
+        print(f"Searching for max sustainable throughput (p99 <= {args.slo_p99_ms:.0f} ms, "
+              f"errors <= {args.max_error_rate:.1%}), {args.duration:.0f}s per step:")
+        max_rate, runs = find_max_throughput(args, mix, factory)
+        print(f"\nMax sustainable throughput: {max_rate:.1f} req/s")
+        report = {"max_sustainable_rate": max_rate, "runs": [summary for _, _, summary in runs]}
+        saturated = [summary for _, ok, summary in runs if not ok]
+        if saturated:
+            print_summary(min(saturated, key=lambda s: s["offered_rate"])) # First saturation point
+    else:
+        results, wall = run_open_loop(args.url, args.rate, args.duration, mix, factory, args.max_concurrency, args.timeout, args.seed)
+        report = summarize(results, args.rate, args.duration, wall)
+        print_summary(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.request
+import urllib.error
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+from src.matching_engine.scatter_gather import ScatterGatherCoordinator, SHARD_STRATEGIES
+from src.scripts.load_test import PayloadFactory
+
+# Runs the coordinator mode on one machine: starts N AI worker processes on consecutive ports, ranks
+# a synthetic waitlist through the coordinator and checks the merged top-K against a single node
+# ranking the whole waitlist. --kill-one then stops one worker and repeats, to show retries on another
+# node and the health state. Workers are stopped on exit. Prints the AI_WORKER_NODES value to use
+# when running app.py as a coordinator against workers started with --keep-running.
+
+WORKER_LAUNCH = "import sys; from src.app import app; app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"
+
+
+def start_workers(n_nodes, base_port):
+    env = dict(os.environ)
+    env.pop('AI_WORKER_NODES', None) # Workers are plain nodes
+    workers = []
+    for k in range(n_nodes):
+        port = base_port + k
+        process = subprocess.Popen([sys.executable, '-c', WORKER_LAUNCH, str(port)], cwd=PROJECT_ROOT, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        workers.append((f"http://127.0.0.1:{port}", process))
+    return workers
+
+
+def wait_until_healthy(url, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url + '/api/health', timeout=2).read()
+            return True
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    return False
+
+
+def single_node_ranking(url, payload, top_k):
+    body = dict(payload, top_k=top_k)
+    req = urllib.request.Request(url + '/api/match_organs', data=json.dumps(body).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(req, timeout=120) as response:
+        return json.loads(response.read())
+
+
+def report(label, response, reference):
+    same = [(r["recipient_id"], r["score"]) for r in response["results"]] == \
+           [(r["recipient_id"], r["score"]) for r in reference]
+    print(f"\n{label}: {response['elapsed_ms']:.0f} ms, partial={response['partial']}, "
+          f"ranked {response['recipients_ranked']}/{response['recipients_total']}, top-K equals single node: {same}")
+    for shard in response["shards"]:
+        attempts = ", ".join(f"{a['node']} {a['status']}" for a in shard["attempts"]) or "-"
+        print(f"  shard {shard['shard']}: {shard['recipients']} recipients, {shard['status']} ({attempts})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scatter-gather matching over local AI worker processes.")
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--base-port', type=int, default=5101)
+    parser.add_argument('--recipients', type=int, default=3000)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--strategy', choices=SHARD_STRATEGIES, default='hash')
+    parser.add_argument('--deadline-ms', type=float, default=30000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--kill-one', action='store_true', help="Stop one worker and rank again.")
+    parser.add_argument('--keep-running', action='store_true', help="Leave the workers running after the checks.")
+    args = parser.parse_args()
+
+    workers = start_workers(args.nodes, args.base_port)
+    try:
+        for url, _ in workers:
+            if not wait_until_healthy(url):
+                raise SystemExit(f"Worker {url} did not become healthy.")
+        urls = [url for url, _ in workers]
+        print(f"{len(urls)} workers up. AI_WORKER_NODES={','.join(urls)}")
+
+        payload = PayloadFactory(args.seed).match(args.recipients)
+        coordinator = ScatterGatherCoordinator(urls, strategy=args.strategy, deadline_ms=args.deadline_ms,
+                                               failure_threshold=1)
+        reference = single_node_ranking(urls[0], payload, args.top_k)
+        report("All nodes", coordinator.match(payload["organ"], payload["recipients"], payload["logistics"],
+                                              top_k=args.top_k), reference)
+
+        if args.kill_one and len(workers) > 1:
+            url, process = workers[-1]
+            process.terminate()
+            process.wait()
+            print(f"\nStopped {url}.")
+            report("One node down", coordinator.match(payload["organ"], payload["recipients"], payload["logistics"],
+                                                      top_k=args.top_k), reference)
+            print("\nNode health:")
+            for node in coordinator.stats()["nodes"]:
+                print(f"  {node['url']}: {node['status']} (failures {node['failures']}/{node['requests']})")
+
+        if args.keep_running:
+            print("\nWorkers keep running; press Ctrl+C to stop them.")
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, process in workers:
+            process.terminate()
+        for _, process in workers:
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
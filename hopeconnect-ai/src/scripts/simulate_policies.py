@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+# --- Start of Path Handling ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+# --- End of Path Handling ---
+
+import joblib
+from src.utils.data_loader import PROCESSED_DATA_DIR
+from src.matching_engine.columnar_scorer import DONOR_HLA_KEYS, RECIPIENT_HLA_KEYS
+from src.matching_engine.policy_simulator import (
+    SimulationWorld, normalize_policy, simulate_policy, summarize_replicas, OUTCOME_COLUMNS
+)
+from src.prediction_models.viability_predictor import GRAFT_VIABILITY_MODEL_PATH
+from src.prediction_models.feature_engineering import VIABILITY_PREPROCESSOR_PATH
+from src.prediction_models.prediction_cache import model_version_key
+from src.scripts.load_test import (
+    BLOOD_TYPE_FREQUENCIES, ORGAN_TYPE_FREQUENCIES, HLA_A_FREQUENCIES, HLA_B_FREQUENCIES, TRANSPLANT_CENTERS
+)
+
+# Monte Carlo comparison of allocation policies. Every (policy, seed) pair is one replica: the seed
+# draws a world of recipient arrivals and organ offers over --years (synthetic, or resampled from the
+# historical transplants file), and the policy is replayed on it with the matching engine
+# (matching_engine.policy_simulator). Replicas run in parallel worker processes; a worker builds each
+# world once and replays every policy it gets for that seed on it, reusing the world's viability
+# predictions. Outputs replicas.csv (one row per replica) and summary.csv (per policy: mean, 95% CI and the
+# paired difference to the first policy), and resumes an interrupted sweep from replicas.csv (replicas of a
+# policy whose definition changed since are run again).
+#
+#   python src/scripts/simulate_policies.py --seeds 10 --grid distance=0.05,0.15,0.3 --grid max_cit.Kidney=24,30
+#   python src/scripts/simulate_policies.py --policies policies.json --years 5 --workers 8
+#
+# A policies file is a JSON list of {"name", "weights": {...}, "max_cit": {...}, "min_score"}; missing
+# keys keep the current WEIGHTS / ORGAN_MAX_CIT. The current policy is always simulated as "current".
+
+REPLICAS_FILENAME = 'replicas.csv'
+SUMMARY_FILENAME = 'summary.csv'
+SIGNATURE_FILENAME = '_signature.json'
+WORLDS_PER_WORKER = 2 # Worlds kept per worker process; tasks are sent seed by seed
+
+HISTORICAL_RECIPIENT_COLUMNS = ['organ_type', 'recipient_age', 'recipient_blood_type', 'recipient_comorbidities'] + RECIPIENT_HLA_KEYS
+HISTORICAL_DONOR_COLUMNS = ['organ_type', 'donor_age', 'donor_blood_type', 'donor_comorbidities'] + DONOR_HLA_KEYS
+
+
+def _choice(rng, frequencies, size):
+    values = list(frequencies)
+    weights = np.array(list(frequencies.values()), dtype=np.float64)
+    return rng.choice(np.array(values, dtype=object), size=size, p=weights / weights.sum())
+
+
+def _ages(rng, mean, sd, low, high, size):
+    return np.clip(np.round(rng.normal(mean, sd, size)), low, high)
+
+
+def _synthetic_recipient_attributes(rng, n):
+    frame = pd.DataFrame({
+        'organ_type': _choice(rng, ORGAN_TYPE_FREQUENCIES, n), 'recipient_age': _ages(rng, 50, 15, 5, 80, n),
+        'recipient_blood_type': _choice(rng, BLOOD_TYPE_FREQUENCIES, n),
+        'recipient_comorbidities': np.minimum(6, np.floor(rng.exponential(1 / 0.9, n))).astype(np.int64)})
+    for key in RECIPIENT_HLA_KEYS:
+        frame[key] = _choice(rng, HLA_A_FREQUENCIES if '_a' in key else HLA_B_FREQUENCIES, n)
+    return frame
+
+
+def _synthetic_donor_attributes(rng, n):
+    frame = pd.DataFrame({
+        'organ_type': _choice(rng, ORGAN_TYPE_FREQUENCIES, n), 'donor_age': _ages(rng, 45, 15, 18, 75, n),
+        'donor_blood_type': _choice(rng, BLOOD_TYPE_FREQUENCIES, n),
+        'donor_comorbidities': np.minimum(5, np.floor(rng.exponential(1 / 1.2, n))).astype(np.int64)})
+    for key in DONOR_HLA_KEYS:
+        frame[key] = _choice(rng, HLA_A_FREQUENCIES if '_a' in key else HLA_B_FREQUENCIES, n)
+    return frame
+
+
+def _resample(rng, source, n):
+    return source.iloc[rng.integers(0, len(source), n)].reset_index(drop=True)
+
+
+def build_world(seed, params, historical=None):
+    """
+    World for one seed. Arrivals and offers are Poisson processes; the initial waitlist joined during
+    the year before day 0. Death/delisting times are exponential with a hazard that grows with urgency
+    (memoryless, so the initial waitlist draws them from day 0). With `historical`, patient and donor
+    attributes are resampled from its rows instead of drawn from the synthetic distributions.
+    """
+    rng = np.random.default_rng(seed)
+    horizon = params["years"] * 365.0
+    n_initial = params["initial_waitlist"]
+    n_arrivals = rng.poisson(params["arrivals_per_day"] * horizon)
+    n_offers = rng.poisson(params["offers_per_day"] * horizon)
+
+    if historical is not None:
+        recipients = _resample(rng, historical[HISTORICAL_RECIPIENT_COLUMNS], n_initial + n_arrivals)
+        offers = _resample(rng, historical[HISTORICAL_DONOR_COLUMNS], n_offers)
+    else:
+        recipients = _synthetic_recipient_attributes(rng, n_initial + n_arrivals)
+        offers = _synthetic_donor_attributes(rng, n_offers)
+
+    arrival = np.concatenate([rng.uniform(-365.0, 0.0, n_initial), rng.uniform(0.0, horizon, n_arrivals)])
+    urgency = np.round(rng.beta(2, 3, len(recipients)), 3)
+    daily_hazard = params["annual_mortality"] * (0.5 + 1.5 * urgency) / 365.0
+    recipients['recipient_id'] = [f"S{seed}-R{i}" for i in range(len(recipients))]
+    recipients['arrival_day'] = arrival
+    recipients['death_day'] = np.maximum(arrival, 0.0) + rng.exponential(1.0 / daily_hazard)
+    recipients['urgency_score'] = urgency
+    recipients['center'] = rng.integers(0, len(TRANSPLANT_CENTERS), len(recipients))
+
+    offers['day'] = np.sort(rng.uniform(0.0, horizon, n_offers))
+    offers['center'] = rng.integers(0, len(TRANSPLANT_CENTERS), n_offers)
+    offers['logistics_delay_hours'] = rng.lognormal(0.0, 0.6, n_offers)
+    centers = [(f"center-{i}", lat, lon) for i, (_, lat, lon) in enumerate(TRANSPLANT_CENTERS)]
+    return SimulationWorld(recipients, offers, centers, horizon)
+
+
+_worker_state = {}
+
+
+def _init_worker(model_path, preprocessor_path, params, historical_path):
+    _worker_state['model'] = joblib.load(model_path) if model_path else None
+    _worker_state['preprocessor'] = joblib.load(preprocessor_path) if preprocessor_path else None
+    _worker_state['params'] = params
+    _worker_state['historical'] = pd.read_csv(historical_path) if historical_path else None
+    _worker_state['worlds'] = OrderedDict()
+
+
+def _world(seed):
+    worlds = _worker_state['worlds']
+    if seed not in worlds:
+        worlds[seed] = build_world(seed, _worker_state['params'], _worker_state['historical'])
+        while len(worlds) > WORLDS_PER_WORKER:
+            worlds.popitem(last=False)
+    worlds.move_to_end(seed)
+    return worlds[seed]
+
+
+def policy_hash(policy):
+    """Short hash of a normalized policy, stored with each replica so a resume only reuses unchanged policies."""
+    return hashlib.sha1(json.dumps(policy, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _run_replicas(seed, policies):
+    started = time.perf_counter()
+    world = _world(seed)
+    world_seconds = time.perf_counter() - started
+    rows = []
+    for policy in policies:
+        outcome = simulate_policy(world, policy, _worker_state['model'], _worker_state['preprocessor'])
+        rows.append(dict({"policy": policy["name"], "policy_hash": policy_hash(policy), "seed": seed}, **outcome))
+    return rows, world_seconds
+
+
+def _parse_grid_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        raise SystemExit(f"Grid values must be numbers, got '{text}'.")
+
+
+def grid_policies(grid_args):
+    """
+    Policies for the cartesian product of --grid axes. An axis is 'weight=v1,v2', 'max_cit.Organ=h1,h2'
+    or 'min_score=s1,s2'; each policy is named after its settings.
+    """
+    if not grid_args:
+        return []
+    axes = []
+    for arg in grid_args:
+        key, _, values = arg.partition('=')
+        if not values:
+            raise SystemExit(f"Invalid --grid '{arg}'. Expected key=value1,value2,...")
+        axes.append((key.strip(), [_parse_grid_value(v) for v in values.split(',') if v.strip()]))
+    policies = []
+    for combination in itertools.product(*(values for _, values in axes)):
+        policy = {"name": ",".join(f"{key}={value:g}" for (key, _), value in zip(axes, combination)),
+                  "weights": {}, "max_cit": {}}
+        for (key, _), value in zip(axes, combination):
+            if key == 'min_score':
+                policy['min_score'] = value
+            elif key.startswith('max_cit.'):
+                policy['max_cit'][key.split('.', 1)[1]] = value
+            else:
+                policy['weights'][key] = value
+        policies.append(policy)
+    return policies
+
+
+def load_policies(args):
+    specs = [{"name": "current"}]
+    if args.policies:
+        with open(args.policies) as f:
+            specs.extend(json.load(f))
+    specs.extend(grid_policies(args.grid))
+    policies, names = [], set()
+    for spec in specs:
+        try:
+            policy = normalize_policy(spec)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if policy["name"] in names:
+            raise SystemExit(f"Duplicate policy name '{policy['name']}'.")
+        names.add(policy["name"])
+        policies.append(policy)
+    return policies
+
+
+def _load_finished(output_dir, signature, restart):
+    """Replica rows of an earlier run with the same signature (resume), else nothing."""
+    replicas_path = os.path.join(output_dir, REPLICAS_FILENAME)
+    signature_path = os.path.join(output_dir, SIGNATURE_FILENAME)
+    if restart or not os.path.exists(replicas_path) or not os.path.exists(signature_path):
+        return pd.DataFrame()
+    with open(signature_path) as f:
+        if json.load(f) != signature:
+            raise SystemExit(f"{output_dir} holds results for different world parameters or model. "
+                             "Use --restart to discard them or choose another --output.")
+    return pd.read_csv(replicas_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare allocation policies by Monte Carlo replay of organ offers.")
+    parser.add_argument('--policies', help="JSON file with a list of policies.")
+    parser.add_argument('--grid', action='append', default=[], help="Policy grid axis, e.g. distance=0.1,0.2 (repeatable).")
+    parser.add_argument('--seeds', type=int, default=5, help="Replicas per policy (worlds).")
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--years', type=float, default=3.0)
+    parser.add_argument('--initial-waitlist', type=int, default=1500)
+    parser.add_argument('--arrivals-per-day', type=float, default=6.0)
+    parser.add_argument('--offers-per-day', type=float, default=4.0)
+    parser.add_argument('--annual-mortality', type=float, default=0.08, help="Waitlist death/delisting rate at average urgency.")
+    parser.add_argument('--historical', help="Transplants CSV to resample patient and donor attributes from.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--model', default=GRAFT_VIABILITY_MODEL_PATH)
+    parser.add_argument('--preprocessor', default=VIABILITY_PREPROCESSOR_PATH)
+    parser.add_argument('--no-model', action='store_true', help="Score with the default viability (0.5), e.g. for quick checks.")
+    parser.add_argument('--output', default=os.path.join(PROCESSED_DATA_DIR, 'policy_simulations'))
+    parser.add_argument('--restart', action='store_true', help="Ignore results of an earlier run in --output.")
+    args = parser.parse_args()
+
+    policies = load_policies(args)
+    seeds = list(range(args.first_seed, args.first_seed + args.seeds))
+    params = {"years": args.years, "initial_waitlist": args.initial_waitlist, "arrivals_per_day": args.arrivals_per_day,
+              "offers_per_day": args.offers_per_day, "annual_mortality": args.annual_mortality}
+    model_path = None if args.no_model else args.model
+    preprocessor_path = None if args.no_model else args.preprocessor
+    model_version = model_version_key(joblib.load(model_path), joblib.load(preprocessor_path)) if model_path else None
+    signature = {"world": params, "historical": os.path.abspath(args.historical) if args.historical else None,
+                 "model_version": model_version}
+
+    os.makedirs(args.output, exist_ok=True)
+    finished = _load_finished(args.output, signature, args.restart)
+    if len(finished):
+        hashes = {p["name"]: policy_hash(p) for p in policies}
+        changed = finished['policy'].isin(hashes) & (finished['policy_hash'] != finished['policy'].map(hashes))
+        if changed.any():
+            print(f"Policy definition changed since the earlier run, running again: "
+                  f"{', '.join(sorted(set(finished.loc[changed, 'policy'])))}.")
+            finished = finished[~changed]
+    done = set(zip(finished['policy'], finished['seed'])) if len(finished) else set()
+    with open(os.path.join(args.output, SIGNATURE_FILENAME), 'w') as f:
+        json.dump(signature, f, indent=2)
+    with open(os.path.join(args.output, 'policies.json'), 'w') as f:
+        json.dump(policies, f, indent=2)
+
+    # One task per seed and group of policies: the world is built once per task and policies split
+    # over workers only as far as needed to keep every worker busy
+    groups_per_seed = max(1, min(len(policies), -(-max(1, args.workers) // len(seeds))))
+    tasks = []
+    for seed in seeds:
+        todo = [p for p in policies if (p["name"], seed) not in done]
+        for g in range(groups_per_seed):
+            group = todo[g::groups_per_seed]
+            if group:
+                tasks.append((seed, group))
+    n_replicas = sum(len(group) for _, group in tasks)
+    print(f"{len(policies)} policies x {len(seeds)} seeds: {n_replicas} replicas to run"
+          f"{f', {len(done)} already done' if done else ''}, {args.workers} worker(s).")
+
+    replicas_path = os.path.join(args.output, REPLICAS_FILENAME)
+    rows = finished.to_dict('records') if len(finished) else []
+    started = time.perf_counter()
+    completed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker,
+                             initargs=(model_path, preprocessor_path, params, args.historical)) as executor:
+        futures = [executor.submit(_run_replicas, seed, group) for seed, group in tasks]
+        for future in as_completed(futures):
+            new_rows, world_seconds = future.result()
+            rows.extend(new_rows)
+            completed += len(new_rows)
+            pd.DataFrame(rows).to_csv(replicas_path + '.tmp', index=False)
+            os.replace(replicas_path + '.tmp', replicas_path) # Progress survives an interruption
+            for row in new_rows:
+                print(f"seed {row['seed']:>4} {row['policy']:<40} {row['transplants']:>6} transplants, "
+                      f"graft survival {row['mean_predicted_graft_survival']:.3f}, wait {row['median_wait_days']:.0f} d "
+                      f"({row['elapsed_seconds']:.1f}s) [{completed}/{n_replicas}, {time.perf_counter() - started:.0f}s]")
+
+    replicas = pd.DataFrame(rows)
+    order = {p["name"]: i for i, p in enumerate(policies)}
+    replicas = replicas[replicas['policy'].isin(order)].sort_values(['policy', 'seed'], key=lambda c: c.map(order) if c.name == 'policy' else c)
+    summary = summarize_replicas(replicas, baseline="current")
+    summary.to_csv(os.path.join(args.output, SUMMARY_FILENAME), index=False)
+
+    shown = ['policy', 'replicas', 'transplants', 'discard_rate', 'waitlist_deaths', 'mean_predicted_graft_survival',
+             'median_wait_days', 'mean_distance_km']
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.3f}'.format):
+        print("\n" + summary[shown].to_string(index=False))
+    print(f"\n{n_replicas} replicas in {time.perf_counter() - started:.1f}s. Outcome columns: {', '.join(OUTCOME_COLUMNS)}.")
+    print(f"Output: {args.output} ({REPLICAS_FILENAME}, {SUMMARY_FILENAME}).")
+
+
+if __name__ == '__main__':
+    main()
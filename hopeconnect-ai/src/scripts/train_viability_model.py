@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import pandas as pd
 import numpy as np
 
@@ -18,12 +19,34 @@ if PROJECT_ROOT not in sys.path:
 
 # Now you can import modules starting from the 'src' package
 # (because 'hopeconnect-ai' is on sys.path and 'src' is a directory within it)
-from src.utils.data_loader import load_raw_data
+from src.utils.data_loader import load_raw_data, RAW_DATA_PATH
 from src.prediction_models.viability_predictor import train_graft_viability_model
+from src.prediction_models.feature_store import ViabilityFeatureStore, FeatureStoreError
 # If you had other modules in src, e.g., src.matching_engine.some_module, you'd import them similarly.
 
+def train_from_feature_store():
+    """Engineers features only for rows appended since the last run, then trains from the stored partitions."""
+    store = ViabilityFeatureStore()
+    start = time.perf_counter()
+    new_batch = store.sync_source(RAW_DATA_PATH)
+    if new_batch:
+        print(f"Feature store: ingested new rows as batch {new_batch} in {time.perf_counter() - start:.2f}s.")
+    else:
+        print("Feature store: no new rows since the last run.")
+    print(f"Training graft viability model from {len(store.batches())} feature store batch(es)...")
+    train_graft_viability_model(feature_store=store, distill_surrogate='--distill' in sys.argv[1:])
+    print(f"Graft Viability Model training completed successfully in {time.perf_counter() - start:.1f}s.")
+
+
 def main():
+    # Flags: --feature-store (incremental features), --distill (also train the "fast" tier surrogate)
     print("Starting Graft Viability Model Training Script...")
+    if '--feature-store' in sys.argv[1:]:
+        try:
+            train_from_feature_store()
+        except (FileNotFoundError, FeatureStoreError) as e:
+            print(f"Error: {e}")
+        return
     try:
         print("Loading raw data...")
         raw_df = load_raw_data()
@@ -40,7 +63,7 @@ def main():
 
         print("Training graft viability model...")
         # Assuming train_graft_viability_model is designed to take data_df as argument
-        train_graft_viability_model(data_df=raw_df)
+        train_graft_viability_model(data_df=raw_df, distill_surrogate='--distill' in sys.argv[1:])
         print("Graft Viability Model training completed successfully.")
 
     except FileNotFoundError as e:
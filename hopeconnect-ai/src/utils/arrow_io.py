@@ -0,0 +1,98 @@
+import json
+import numpy as np
+import pandas as pd
+
+# pyarrow is optional: without it the service keeps serving JSON and rejects Arrow payloads with 415.
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+    pa_ipc = None
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+JSON_MIMETYPE = 'application/json'
+
+
+class ArrowFormatError(ValueError):
+    """Raised when a request body is not a readable Arrow IPC stream."""
+
+
+def arrow_available():
+    return pa is not None
+
+
+def is_arrow_request(req):
+    """True if the request body is declared as an Arrow IPC stream."""
+    return req.mimetype == ARROW_STREAM_MIMETYPE
+
+
+def wants_arrow_response(req):
+    """
+    Content negotiation for the response format.
+    Arrow is returned when the client lists it in Accept, or when it sent Arrow and did not ask for JSON.
+    """
+    if not arrow_available():
+        return False
+    accepted = [mimetype for mimetype, quality in req.accept_mimetypes if quality > 0]
+    if ARROW_STREAM_MIMETYPE in accepted:
+        return True
+    return is_arrow_request(req) and JSON_MIMETYPE not in accepted
+
+
+def read_arrow_table(body):
+    """Reads an Arrow IPC stream (bytes) into a pyarrow Table."""
+    if not arrow_available():
+        raise ArrowFormatError("pyarrow is not installed on this AI node.")
+    try:
+        return pa_ipc.open_stream(pa.py_buffer(body)).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise ArrowFormatError(f"Body is not a valid Arrow IPC stream: {e}")
+
+
+def table_metadata_json(table, key):
+    """Decodes a JSON document stored in the schema metadata under `key`, or None if absent."""
+    metadata = table.schema.metadata or {}
+    raw = metadata.get(key.encode('utf-8'))
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        raise ArrowFormatError(f"Schema metadata '{key}' is not valid JSON: {e}")
+
+
+def table_to_columns(table):
+    """
+    Returns {column_name: numpy array}. Numeric columns without nulls are zero-copy views of
+    the Arrow buffers; nulls become NaN (numeric) or None (string) columns.
+    """
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+
+def columns_to_arrow_bytes(columns, metadata=None):
+    """Serializes {column_name: array-like} to Arrow IPC stream bytes (NaN/None become nulls)."""
+    table = pa.table({name: pa.array(values, from_pandas=True) for name, values in columns.items()})
+    if metadata:
+        table = table.replace_schema_metadata({k: json.dumps(v) for k, v in metadata.items()})
+    sink = pa.BufferOutputStream()
+    with pa_ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def records_to_arrow_bytes(records):
+    """Serializes a list of flat dicts (the JSON response shape) to Arrow IPC stream bytes."""
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pylist(records)
+    with pa_ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def null_mask(values):
+    """Boolean mask of missing entries (None or NaN) in a column."""
+    return np.asarray(pd.isna(values), dtype=bool)
@@ -0,0 +1,292 @@
+# hopeconnect-ai/src/utils/memory_diagnostics.py
+
+import gc
+import os
+import sys
+import time
+import types
+import logging
+import threading
+import tracemalloc
+from collections import deque
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+# Opt-in memory visibility for the AI service, selected with MEMORY_DIAGNOSTICS:
+#   off   - no per-request accounting (default). /api/memory/stats still reports RSS and resident sizes;
+#           tracing cannot be switched on at runtime (POST /api/memory/tracing is refused).
+#   rss   - RSS growth of every request, aggregated per endpoint (one /proc read before and after).
+#   trace - rss plus tracemalloc: peak Python/NumPy allocation per request and top allocation sites.
+#           Every allocation is traced, so float-heavy Python code (the geodesic distance loop) runs about
+#           10x slower with one frame per trace and far slower with deep stacks: diagnose, then turn it off.
+# tracemalloc's peak is process-wide, so a request's peak is only attributed to its endpoint when no other
+# request ran at the same time; overlapping requests are counted but their peaks are left out.
+
+MEMORY_DIAGNOSTICS = os.environ.get('MEMORY_DIAGNOSTICS', 'off').strip().lower()
+MEMORY_MODES = ('off', 'rss', 'trace')
+MEMORY_TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', 1)) # Stack depth per trace (raise for group_by=traceback)
+MEMORY_RECENT_REQUESTS = int(os.environ.get('MEMORY_RECENT_REQUESTS', 100))
+DEFAULT_TOP_SITES = 20
+TOP_SITE_GROUPINGS = ('lineno', 'filename', 'traceback')
+# Allocations made by the import system and by tracemalloc itself are noise in every snapshot
+IGNORED_TRACE_FILES = (tracemalloc.__file__, '<frozen importlib._bootstrap>',
+                       '<frozen importlib._bootstrap_external>', '<unknown>')
+# Not followed when sizing resident objects: shared interpreter state, not owned by the object
+_NOT_OWNED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                    logging.Logger, threading.Thread)
+
+
+class MemoryDiagnosticsError(ValueError):
+    """The requested diagnostic is not available in the current mode (e.g. snapshots without tracing)."""
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def max_rss_bytes():
+    """High-water mark of the resident set size since the process started (None if unknown)."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024 # Linux reports KiB
+
+
+def resident_size(obj):
+    """
+    Approximate bytes held by `obj` and everything it references, each object counted once.
+    NumPy buffers count their nbytes, DataFrames/Series their deep memory_usage, and XGBoost boosters
+    their serialized size (the trees live in native memory that sys.getsizeof cannot see).
+    Memory-mapped arrays are file-backed and shared through the page cache, so they count as zero.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _NOT_OWNED_TYPES):
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.memmap):
+            continue
+        if isinstance(item, (pd.DataFrame, pd.Series, pd.Index)):
+            total += int(np.sum(item.memory_usage(deep=True)))
+            continue
+        if isinstance(item, np.ndarray):
+            if item.base is not None:
+                stack.append(item.base) # A view: the buffer belongs to its base
+            else:
+                total += sys.getsizeof(item)
+            if item.dtype == object:
+                stack.extend(item.ravel().tolist())
+            continue
+
+        total += sys.getsizeof(item)
+        if hasattr(item, 'save_raw'):
+            try:
+                total += len(item.save_raw())
+            except Exception:
+                pass
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        if hasattr(item, '__dict__'):
+            stack.append(item.__dict__)
+        for slot in getattr(type(item), '__slots__', ()):
+            if hasattr(item, slot):
+                stack.append(getattr(item, slot))
+    return total
+
+
+class _EndpointMemory:
+    __slots__ = ('requests', 'overlapped', 'peak_samples', 'peak_bytes_total', 'peak_bytes_max',
+                 'last_peak_bytes', 'rss_growth_bytes')
+
+    def __init__(self):
+        self.requests = 0
+        self.overlapped = 0
+        self.peak_samples = 0
+        self.peak_bytes_total = 0
+        self.peak_bytes_max = 0
+        self.last_peak_bytes = None
+        self.rss_growth_bytes = 0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "overlapped_requests": self.overlapped,
+            "peak_alloc_bytes_max": self.peak_bytes_max if self.peak_samples else None,
+            "peak_alloc_bytes_mean": self.peak_bytes_total / self.peak_samples if self.peak_samples else None,
+            "last_peak_alloc_bytes": self.last_peak_bytes,
+            "rss_growth_bytes": self.rss_growth_bytes,
+        }
+
+
+class MemoryDiagnostics:
+    """Per-request memory accounting aggregated per endpoint, and tracemalloc snapshots for the admin endpoints."""
+
+    def __init__(self, mode=MEMORY_DIAGNOSTICS, trace_frames=MEMORY_TRACE_FRAMES, recent_size=MEMORY_RECENT_REQUESTS):
+        if mode not in MEMORY_MODES:
+            print(f"Warning: unknown MEMORY_DIAGNOSTICS '{mode}' (expected {', '.join(MEMORY_MODES)}); using 'off'.")
+            mode = 'off'
+        self.mode = mode
+        self.enabled = mode != 'off' # Fixed at startup: runtime switches only apply to an opted-in service
+        self.trace_frames = trace_frames
+        self._lock = threading.Lock()
+        self._active = 0
+        self._started = 0 # Requests begun so far: tells whether another request started during this one
+        self._endpoints = {}
+        self._recent = deque(maxlen=recent_size)
+        self._baseline = None
+        self._baseline_taken_at = None
+        if mode == 'trace':
+            self.start_tracing()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self):
+        if not self.enabled:
+            raise MemoryDiagnosticsError("Memory diagnostics are disabled (MEMORY_DIAGNOSTICS=off).")
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+        self.mode = 'trace'
+
+    def stop_tracing(self):
+        """Stops tracemalloc (its traces and the baseline snapshot are dropped); RSS accounting continues."""
+        tracemalloc.stop()
+        with self._lock:
+            self._baseline = None
+            self._baseline_taken_at = None
+        self.mode = 'rss'
+
+    def begin_request(self):
+        """Opens the accounting of one request. Returns the token for end_request (None when off)."""
+        if self.mode == 'off':
+            return None
+        tracing = tracemalloc.is_tracing()
+        with self._lock:
+            self._active += 1
+            self._started += 1
+            alone = self._active == 1
+            if tracing and alone:
+                tracemalloc.reset_peak()
+            token = {"sequence": self._started, "alone": alone, "rss": current_rss_bytes(),
+                     "traced": tracemalloc.get_traced_memory()[0] if tracing else None}
+        return token
+
+    def end_request(self, token, endpoint):
+        """Closes the accounting opened by begin_request. Returns the request's peak allocation in bytes, if known."""
+        if token is None:
+            return None
+        traced_peak = tracemalloc.get_traced_memory()[1] if token["traced"] is not None and tracemalloc.is_tracing() else None
+        rss = current_rss_bytes()
+        with self._lock:
+            self._active -= 1
+            overlapped = not token["alone"] or self._started != token["sequence"] or self._active > 0
+            peak = None if overlapped or traced_peak is None else max(0, traced_peak - token["traced"])
+            rss_delta = rss - token["rss"] if rss is not None and token["rss"] is not None else None
+
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = _EndpointMemory()
+            entry.requests += 1
+            entry.overlapped += overlapped
+            if peak is not None:
+                entry.peak_samples += 1
+                entry.peak_bytes_total += peak
+                entry.peak_bytes_max = max(entry.peak_bytes_max, peak)
+                entry.last_peak_bytes = peak
+            if rss_delta is not None:
+                entry.rss_growth_bytes += rss_delta
+            self._recent.append({"endpoint": endpoint, "finished_at": time.time(), "peak_alloc_bytes": peak,
+                                 "rss_delta_bytes": rss_delta, "overlapped": overlapped})
+        return peak
+
+    def take_baseline(self):
+        """Snapshot that later top_allocations(compare=True) calls are diffed against."""
+        if not tracemalloc.is_tracing():
+            raise MemoryDiagnosticsError("tracemalloc is not running (MEMORY_DIAGNOSTICS=trace or enable tracing first).")
+        snapshot = self._snapshot()
+        with self._lock:
+            self._baseline = snapshot
+            self._baseline_taken_at = time.time()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in IGNORED_TRACE_FILES])
+
+    def top_allocations(self, limit=DEFAULT_TOP_SITES, group_by='lineno', compare=False):
+        """
+        Largest live allocation sites from a tracemalloc snapshot. compare=True ranks sites by growth since
+        take_baseline() instead, which is what points at a leak after a few repeated requests.
+        """
+        if group_by not in TOP_SITE_GROUPINGS:
+            raise MemoryDiagnosticsError(f"'group_by' must be one of: {', '.join(TOP_SITE_GROUPINGS)}.")
+        if not tracemalloc.is_tracing():
+            raise MemoryDiagnosticsError("tracemalloc is not running (MEMORY_DIAGNOSTICS=trace or enable tracing first).")
+        baseline, baseline_taken_at = self._baseline, self._baseline_taken_at
+        if compare and baseline is None:
+            raise MemoryDiagnosticsError("No baseline snapshot taken yet.")
+
+        snapshot = self._snapshot()
+        statistics = snapshot.compare_to(baseline, group_by) if compare else snapshot.statistics(group_by)
+        sites = []
+        for stat in statistics[:limit]:
+            site = {"size_bytes": stat.size, "count": stat.count,
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]}
+            if compare:
+                site.update({"size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff})
+            sites.append(site)
+        return {
+            "group_by": group_by,
+            "compared_to_baseline": compare,
+            "baseline_age_seconds": time.time() - baseline_taken_at if baseline_taken_at else None,
+            "traced_current_bytes": tracemalloc.get_traced_memory()[0],
+            "sites": sites,
+        }
+
+    def stats(self, resident_objects=None, collect=False):
+        """
+        Process memory, per-endpoint request accounting and, for `resident_objects` ({name: object}), the
+        resident size of each. collect=True runs a full garbage collection first (leak checks).
+        """
+        if collect:
+            gc.collect()
+        traced_current, traced_peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        with self._lock:
+            endpoints = {name: entry.as_dict() for name, entry in self._endpoints.items()}
+            recent = list(self._recent)
+            has_baseline = self._baseline is not None
+        stats = {
+            "mode": self.mode,
+            "tracing": tracemalloc.is_tracing(),
+            "rss_bytes": current_rss_bytes(),
+            "max_rss_bytes": max_rss_bytes(),
+            "traced_current_bytes": traced_current,
+            "traced_peak_bytes": traced_peak,
+            "baseline_snapshot": has_baseline,
+            "endpoints": endpoints,
+            "recent_requests": recent,
+        }
+        if resident_objects is not None:
+            stats["resident_bytes"] = {name: resident_size(obj) for name, obj in resident_objects.items() if obj is not None}
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._recent.clear()